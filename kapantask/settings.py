@@ -34,6 +34,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Сторонние приложения
     "django_bootstrap5",
     # Локальные приложения
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время ответа включало остальные middleware
+    "tasks.middleware.MetricsMiddleware",
+    "tasks.middleware.QueryCommentMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -54,7 +58,8 @@ ROOT_URLCONF = "kapantask.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates с учётом времени рендеринга в метриках запроса
+        "BACKEND": "tasks.metrics.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -84,6 +89,23 @@ DATABASES = {
     }
 }
 
+# Кэш
+# В разработке достаточно LocMemCache или FileBasedCache; при нескольких воркерах
+# gunicorn нужен общий бэкенд, например
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и
+# CACHE_LOCATION=redis://redis:6379/1.
+CACHES = {
+    "default": {
+        "BACKEND": env("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": env("CACHE_LOCATION", "kapantask"),
+    }
+}
+TASKS_CACHE_TIMEOUT = env.int("TASKS_CACHE_TIMEOUT", 300)
+
+# Пагинация списка задач
+TASK_LIST_PAGE_SIZE = env.int("TASK_LIST_PAGE_SIZE", 20)
+TASK_LIST_MAX_PAGE_SIZE = env.int("TASK_LIST_MAX_PAGE_SIZE", 100)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -142,8 +164,31 @@ EMAIL_HOST_USER = env("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", "")
 EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", True)
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", "noreply@kapangok.kz")
+# Простой (в секундах), после которого SMTP-соединение воркера открывается заново
+EMAIL_CONNECTION_IDLE_TIMEOUT = env.int("EMAIL_CONNECTION_IDLE_TIMEOUT", 60)
+# Ограничение отправки на SMTP-сервер (писем в секунду, 0 — без ограничения), общее для воркеров
+EMAIL_RATE_LIMIT_PER_SECOND = env.float("EMAIL_RATE_LIMIT_PER_SECOND", 10.0)
+EMAIL_RATE_LIMIT_BURST = env.int("EMAIL_RATE_LIMIT_BURST", 50)
+# Дольше этого (в секундах) воркер не ждёт токен, а откладывает задачу повтором
+EMAIL_RATE_LIMIT_MAX_WAIT = env.float("EMAIL_RATE_LIMIT_MAX_WAIT", 5.0)
+# Пул SMTP-серверов: после SMTP_FAILURE_THRESHOLD ошибок (или отправок медленнее
+# SMTP_SLOW_SEND_MS мс на письмо) подряд сервер исключается на SMTP_CIRCUIT_COOLDOWN секунд
+SMTP_FAILURE_THRESHOLD = env.int("SMTP_FAILURE_THRESHOLD", 3)
+SMTP_CIRCUIT_COOLDOWN = env.float("SMTP_CIRCUIT_COOLDOWN", 60.0)
+SMTP_SLOW_SEND_MS = env.float("SMTP_SLOW_SEND_MS", 5000.0)
+# Повторы отправки уведомлений: число попыток и предельная задержка (в секундах)
+NOTIFICATION_MAX_RETRIES = env.int("NOTIFICATION_MAX_RETRIES", 6)
+NOTIFICATION_RETRY_BACKOFF_MAX = env.int("NOTIFICATION_RETRY_BACKOFF_MAX", 600)
+# Сводки комментариев передаются задаче send_notification_batch, которая отправляет
+# письма параллельно по EMAIL_ASYNC_CONCURRENCY SMTP-соединениям (aiosmtplib)
+EMAIL_ASYNC_DELIVERY = env.bool("EMAIL_ASYNC_DELIVERY", False)
+EMAIL_ASYNC_CONCURRENCY = env.int("EMAIL_ASYNC_CONCURRENCY", 8)
 
 # Настройки Celery
+# Адрес и порт HTTP-сервера метрик задач в основном процессе воркера
+# (порт 0 — не запускать); в контейнере адрес задаётся 0.0.0.0
+CELERY_METRICS_HOST = env("CELERY_METRICS_HOST", "127.0.0.1")
+CELERY_METRICS_PORT = env.int("CELERY_METRICS_PORT", 9808)
 _rabbit_user = env("RABBITMQ_USER", "guest")
 _rabbit_password = env("RABBITMQ_PASSWORD", "guest")
 _rabbit_host = env("RABBITMQ_HOST", "localhost")
@@ -156,4 +201,47 @@ CELERY_RESULT_BACKEND = "rpc://"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "refresh-overdue-task-stats": {
+        "task": "tasks.tasks.refresh_overdue_task_stats",
+        "schedule": env.float("TASK_STATS_OVERDUE_REFRESH_SECONDS", 60.0),
+    },
+    "relay-outbox": {
+        "task": "tasks.tasks.relay_outbox",
+        "schedule": env.float("OUTBOX_RELAY_INTERVAL_SECONDS", 2.0),
+    },
+    "send-comment-digests": {
+        "task": "tasks.tasks.send_comment_digests",
+        "schedule": env.float("COMMENT_DIGEST_WINDOW_SECONDS", 300.0),
+    },
+}
+
+# Уведомления о комментариях копятся и уходят одной сводкой на получателя
+COMMENT_NOTIFICATION_DIGEST = env.bool("COMMENT_NOTIFICATION_DIGEST", True)
+COMMENT_DIGEST_BATCH_SIZE = env.int("COMMENT_DIGEST_BATCH_SIZE", 1000)
+
+# Выгрузка списка задач читает строки серверным курсором пачками по столько строк
+TASK_EXPORT_CHUNK_SIZE = env.int("TASK_EXPORT_CHUNK_SIZE", 2000)
+
+# Метрики Prometheus на /metrics; при заданном METRICS_TOKEN нужен заголовок
+# Authorization: Bearer <токен>, без токена метрики отдаются только прямым
+# запросам (не через Nginx) из сетей METRICS_ALLOWED_NETWORKS
+METRICS_ENABLED = env.bool("METRICS_ENABLED", True)
+METRICS_TOKEN = env("METRICS_TOKEN", "")
+METRICS_ALLOWED_NETWORKS = env.list(
+    "METRICS_ALLOWED_NETWORKS",
+    ["127.0.0.0/8", "::1/128", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"],
+)
+# Запросы к этим представлениям (имена URL) в метриках не учитываются
+METRICS_EXCLUDED_VIEWS = env.list("METRICS_EXCLUDED_VIEWS", ["metrics"])
+
+# Комментарий с именем представления или задачи Celery в каждом SQL-запросе
+# (виден в pg_stat_statements и отчёте slow_queries)
+SQL_COMMENTS_ENABLED = env.bool("SQL_COMMENTS_ENABLED", True)
+# Ограничение времени EXPLAIN ANALYZE из отчёта о медленных запросах, секунды
+SLOW_QUERY_EXPLAIN_TIMEOUT = env.int("SLOW_QUERY_EXPLAIN_TIMEOUT", 30)
+
+# Transactional outbox: размер пачки релея и срок хранения опубликованных сообщений
+OUTBOX_BATCH_SIZE = env.int("OUTBOX_BATCH_SIZE", 500)
+OUTBOX_RETENTION_HOURS = env.int("OUTBOX_RETENTION_HOURS", 24)
@@ -3,7 +3,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from tasks.admin import slow_queries_view
+
 urlpatterns = [
+    path(
+        "admin/slow-queries/",
+        admin.site.admin_view(slow_queries_view),
+        name="admin_slow_queries",
+    ),
     path("admin/", admin.site.urls),
     path("", include("tasks.urls")),
     path("accounts/", include("django.contrib.auth.urls")),
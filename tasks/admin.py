@@ -1,13 +1,83 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import Http404
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.http import urlencode
+
+from . import bulk, importer, outbox, slow_queries
+from .models import (
+    SEARCH_CONFIG,
+    Comment,
+    DeadLetter,
+    DeliveryAttempt,
+    Department,
+    DepartmentTaskStats,
+    EmailConfiguration,
+    Task,
+    User,
+)
+
+
+class AutocompleteListFilter(admin.RelatedFieldListFilter):
+    """Фильтр по связи с автодополнением вместо полного списка объектов."""
+    template = 'admin/tasks/autocomplete_list_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def has_output(self):
+        return True
+
+    def field_choices(self, field, request, model_admin):
+        # Варианты подгружаются через admin:autocomplete, в HTML только выбранный
+        return []
+
+    @property
+    def autocomplete_id(self):
+        return f'autocomplete_filter_{self.lookup_kwarg}'
 
-from .models import Comment, Department, EmailConfiguration, Task, User
+    def autocomplete_widget(self):
+        formfield = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.admin_site),
+            required=False,
+        )
+        value = self.lookup_val[0] if self.lookup_val else None
+        return formfield.widget.render(
+            self.lookup_kwarg, value, attrs={'id': self.autocomplete_id}
+        )
+
+
+class AutocompleteFilterMixin:
+    """Подключает скрипты Select2 для фильтров AutocompleteListFilter."""
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
+
+def is_autocomplete_request(request):
+    """Запрос пришёл от виджета автодополнения админки."""
+    return bool(request.resolver_match and request.resolver_match.url_name == 'autocomplete')
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(AutocompleteFilterMixin, UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_admin', 'department')
-    list_filter = ('is_admin', 'department')
+    list_filter = ('is_admin', ('department', AutocompleteListFilter))
+    list_select_related = ('department',)
+    autocomplete_fields = ('department',)
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Персональная информация', {'fields': ('first_name', 'last_name', 'email')}),
@@ -41,25 +111,289 @@ class CustomUserAdmin(UserAdmin):
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ('name', 'email')
     search_fields = ('name', 'email')
+    actions = ('assign_task',)
+
+    @admin.action(description='Назначить задачу выбранным службам')
+    def assign_task(self, request, queryset):
+        query = urlencode({'departments': list(queryset.values_list('id', flat=True))}, doseq=True)
+        return redirect(f"{reverse('task_bulk_create')}?{query}")
+
+
+@admin.register(DepartmentTaskStats)
+class DepartmentTaskStatsAdmin(admin.ModelAdmin):
+    list_display = ('department', 'status', 'count', 'refreshed_at')
+    list_filter = ('status',)
+    list_select_related = ('department',)
+    readonly_fields = ('department', 'status', 'count', 'refreshed_at')
+
+
+class OverdueListFilter(admin.SimpleListFilter):
+    title = 'Просрочена'
+    parameter_name = 'overdue'
+
+    def lookups(self, request, model_admin):
+        return (('1', 'Да'), ('0', 'Нет'))
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            return queryset.overdue()
+        if self.value() == '0':
+            return queryset.filter(overdue=False)
+        return queryset
+
+
+class TaskActionForm(ActionForm):
+    """Параметры массовых действий над задачами."""
+    status = forms.ChoiceField(
+        label='Статус', choices=[('', '---------')] + Task.Status.choices, required=False
+    )
+    assigned_to = forms.ModelChoiceField(
+        label='Служба',
+        queryset=Department.objects.all(),
+        required=False,
+        widget=AutocompleteSelect(Task._meta.get_field('assigned_to'), admin.site),
+    )
+    days = forms.IntegerField(
+        label='Сдвиг срока, дней',
+        required=False,
+        min_value=-bulk.MAX_DUE_DATE_SHIFT_DAYS,
+        max_value=bulk.MAX_DUE_DATE_SHIFT_DAYS,
+    )
+
+
+class TaskImportForm(forms.Form):
+    file = forms.FileField(
+        label='Файл CSV или XLSX',
+        help_text='Столбцы: Название, Описание, Служба (email), Автор (логин), '
+        'Крайний срок, Статус. Без столбца «Автор» задачи ставятся от вашего имени.',
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError('Поддерживаются только файлы .csv и .xlsx')
+        return file
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
-    list_display = ('title', 'status', 'assigned_to', 'assigned_by', 'due_date', 'is_overdue')
-    list_filter = ('status', 'assigned_to', 'assigned_by')
+class TaskAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ('title', 'status', 'assigned_to', 'assigned_by', 'due_date', 'overdue')
+    list_filter = (
+        'status',
+        OverdueListFilter,
+        ('assigned_to', AutocompleteListFilter),
+        ('assigned_by', AutocompleteListFilter),
+    )
+    list_select_related = ('assigned_to', 'assigned_by__department')
+    autocomplete_fields = ('assigned_to', 'assigned_by')
     search_fields = ('title', 'description')
     date_hierarchy = 'created_at'
+    action_form = TaskActionForm
+    actions = ('set_status', 'postpone', 'reassign', 'shift_due_date')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_overdue()
+
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='tasks_task_import',
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = TaskImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                created = importer.import_tasks(
+                    importer.read_rows(upload, upload.name), default_author=request.user
+                )
+            except importer.TaskImportError as exc:
+                for error in exc.errors:
+                    form.add_error(None, error)
+            else:
+                self.message_user(request, f'Импортировано задач: {len(created)}')
+                return redirect('admin:tasks_task_changelist')
+        return TemplateResponse(
+            request,
+            'admin/tasks/task/import_form.html',
+            {
+                **self.admin_site.each_context(request),
+                'opts': self.opts,
+                'title': 'Импорт задач',
+                'form': form,
+            },
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый поиск по индексу вместо icontains по search_fields
+        if not search_term:
+            return queryset, False
+        if is_autocomplete_request(request):
+            # Автодополнение ищет по префиксу/подстроке названия (триграммный индекс)
+            return queryset.filter(title__icontains=search_term), False
+        queryset = queryset.search(search_term)
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('-rank', '-id')
+        return queryset, False
+
+    def _action_value(self, request, name):
+        """Параметр действия из формы над списком; None, если он не указан."""
+        field = self.action_form.base_fields[name]
+        try:
+            value = field.clean(request.POST.get(name))
+        except ValidationError as exc:
+            self.message_user(
+                request, f'«{field.label}»: {" ".join(exc.messages)}', messages.WARNING
+            )
+            return None
+        if value in (None, ''):
+            self.message_user(
+                request, f'Укажите «{field.label}» для этого действия.', messages.WARNING
+            )
+            return None
+        return value
+
+    def _update(self, request, queryset, **changes):
+        count = bulk.update_tasks(queryset, **changes)
+        self.message_user(request, f'Изменено задач: {count}')
+
+    @admin.action(description='Изменить статус')
+    def set_status(self, request, queryset):
+        status = self._action_value(request, 'status')
+        if status:
+            self._update(request, queryset, status=status)
+
+    @admin.action(description='Отложить')
+    def postpone(self, request, queryset):
+        self._update(request, queryset, status=Task.Status.POSTPONED)
+
+    @admin.action(description='Передать службе')
+    def reassign(self, request, queryset):
+        department = self._action_value(request, 'assigned_to')
+        if department:
+            self._update(request, queryset, assigned_to=department)
+
+    @admin.action(description='Сдвинуть срок')
+    def shift_due_date(self, request, queryset):
+        days = self._action_value(request, 'days')
+        if days:
+            self._update(request, queryset, due_date_shift=timedelta(days=days))
+
+    @admin.display(description='Просрочена', boolean=True, ordering='overdue')
+    def overdue(self, obj):
+        return obj.overdue
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('task', 'user', 'created_at')
-    list_filter = ('task', 'user')
+    list_filter = (('task', AutocompleteListFilter), ('user', AutocompleteListFilter))
+    list_select_related = ('task', 'user__department')
+    autocomplete_fields = ('task', 'user')
     search_fields = ('content',)
     date_hierarchy = 'created_at'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Выражение совпадает с индексом comment_search_idx
+        if not search_term:
+            return queryset, False
+        search_query = SearchQuery(search_term, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.annotate(
+            search=SearchVector('content', config=SEARCH_CONFIG)
+        ).filter(search=search_query), False
+
 
 @admin.register(EmailConfiguration)
 class EmailConfigurationAdmin(admin.ModelAdmin):
-    list_display = ('smtp_host', 'smtp_port', 'smtp_user', 'from_email', 'is_active')
-    list_filter = ('is_active', 'use_tls')
\ No newline at end of file
+    list_display = ('smtp_host', 'smtp_port', 'smtp_user', 'from_email', 'weight', 'is_active')
+    list_editable = ('weight', 'is_active')
+    list_filter = ('is_active', 'use_tls')
+
+
+@admin.register(DeliveryAttempt)
+class DeliveryAttemptAdmin(admin.ModelAdmin):
+    list_display = ('task_name', 'task_id', 'attempt', 'outcome', 'duration_ms', 'created_at')
+    list_filter = ('outcome', 'task_name')
+    date_hierarchy = 'created_at'
+    readonly_fields = (
+        'task_name', 'task_id', 'attempt', 'outcome', 'duration_ms', 'queue_wait_ms', 'db_ms',
+        'render_ms', 'smtp_ms', 'error', 'created_at',
+    )
+
+
+@admin.register(DeadLetter)
+class DeadLetterAdmin(admin.ModelAdmin):
+    list_display = ('task_name', 'args', 'attempts', 'error', 'created_at', 'replayed_at')
+    list_filter = ('task_name', ('replayed_at', admin.EmptyFieldListFilter))
+    readonly_fields = (
+        'task_name', 'task_id', 'args', 'error', 'attempts', 'created_at', 'replayed_at'
+    )
+    actions = ('replay',)
+
+    @admin.action(description='Отправить повторно')
+    def replay(self, request, queryset):
+        count = outbox.replay_dead_letters(queryset)
+        self.message_user(request, f'Поставлено в очередь повторно: {count}')
+
+
+class ExplainForm(forms.Form):
+    """Значения параметров $1, $2, ... запроса для EXPLAIN ANALYZE."""
+
+    def __init__(self, *args, parameter_count=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        for number in range(1, parameter_count + 1):
+            self.fields[f'p{number}'] = forms.CharField(
+                label=f'${number}', required=False, strip=False
+            )
+
+    def values(self):
+        return [self.cleaned_data[name] for name in self.fields]
+
+
+SLOW_QUERY_LIMIT = 50
+
+
+def slow_queries_view(request):
+    """Тяжёлые запросы из pg_stat_statements и EXPLAIN выбранного запроса."""
+    # Страница показывает SQL всех пользователей БД и выполняет запросы
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    order = request.GET.get('order')
+    if order not in slow_queries.ORDERINGS:
+        order = 'total'
+    source = request.GET.get('source', '').strip()
+    queryid = request.GET.get('queryid', '')
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Медленные запросы',
+        'order': order,
+        'source': source,
+    }
+    try:
+        if queryid.lstrip('-').isdigit():
+            statement = slow_queries.get_statement(int(queryid))
+            if statement is None:
+                raise Http404('Запрос не найден в pg_stat_statements')
+            form = ExplainForm(
+                request.POST if request.method == 'POST' else None,
+                parameter_count=statement.parameter_count,
+            )
+            if form.is_valid():
+                try:
+                    context['plan'] = slow_queries.explain(statement.query, form.values())
+                except slow_queries.SlowQueryError as exc:
+                    form.add_error(None, str(exc))
+            context.update(statement=statement, form=form)
+        else:
+            context['statements'] = slow_queries.top_statements(
+                order, SLOW_QUERY_LIMIT, source or None
+            )
+    except slow_queries.SlowQueryError as exc:
+        context['error'] = str(exc)
+    return TemplateResponse(request, 'admin/slow_queries.html', context)
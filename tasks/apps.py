@@ -6,4 +6,6 @@ class TasksConfig(AppConfig):
     name = "tasks"
 
     def ready(self):
-        import tasks.signals  # noqa
\ No newline at end of file
+        import tasks.signals  # noqa
+        # Комментарии с именем задачи в SQL-запросах воркера Celery
+        import tasks.sqlcomments  # noqa
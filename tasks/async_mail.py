@@ -0,0 +1,136 @@
+"""Параллельная отправка пачки писем через asyncio внутри одного воркера.
+
+Пачка уже отрендеренных писем раскладывается по небольшому пулу SMTP-соединений
+(aiosmtplib) к серверу из пула mail.connections: пока одно соединение ждёт
+ответа сервера, остальные передают следующие письма. Лимит TokenBucket
+действует на всю пачку. Письма, которые сервер не принял, передаются
+следующему серверу пула.
+"""
+import asyncio
+import logging
+import time
+
+import aiosmtplib
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+
+from . import mail
+
+logger = logging.getLogger(__name__)
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+def _client(smtp_settings, timeout):
+    return aiosmtplib.SMTP(
+        hostname=smtp_settings.host,
+        port=smtp_settings.port,
+        username=smtp_settings.username or None,
+        password=smtp_settings.password or None,
+        start_tls=smtp_settings.use_tls,
+        timeout=timeout,
+    )
+
+
+async def deliver_async(messages, smtp_settings, concurrency, timeout=30):
+    """Отправляет письма по concurrency соединениям; возвращает неотправленные письма."""
+    queue = asyncio.Queue()
+    for message in messages:
+        queue.put_nowait(message)
+    failed = []
+
+    async def worker():
+        client = _client(smtp_settings, timeout)
+        try:
+            await client.connect()
+        except (aiosmtplib.SMTPException, OSError):
+            # Соединение не открылось: письма заберут остальные соединения
+            return
+        try:
+            while not queue.empty():
+                message = queue.get_nowait()
+                try:
+                    await client.send_message(
+                        message.message(),
+                        sender=message.from_email,
+                        recipients=message.recipients(),
+                    )
+                except aiosmtplib.SMTPRecipientsRefused as exc:
+                    # Адрес отклонён сервером: повтор не поможет
+                    logger.warning('Адрес отклонён: %s (%r)', message.recipients(), exc)
+                except aiosmtplib.SMTPServerDisconnected:
+                    failed.append(message)
+                    return
+                except aiosmtplib.SMTPException:
+                    failed.append(message)
+        finally:
+            if client.is_connected:
+                try:
+                    await client.quit()
+                except aiosmtplib.SMTPException:
+                    client.close()
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(messages)))))
+    # Письма, оставшиеся в очереди после отказа всех соединений
+    while not queue.empty():
+        failed.append(queue.get_nowait())
+    return failed
+
+
+def _deliver_to(smtp_settings, datatuple, concurrency, bucket):
+    """Отправляет письма через один сервер; возвращает (отклонённые, не начатые из-за лимита)."""
+    messages = {}
+    for subject, message, html_message, recipient_list in datatuple:
+        email = EmailMultiAlternatives(subject, message, smtp_settings.from_email, recipient_list)
+        if html_message:
+            email.attach_alternative(html_message, 'text/html')
+        messages[id(email)] = email, (subject, message, html_message, recipient_list)
+    pending = [email for email, _ in messages.values()]
+    failed = []
+    while pending:
+        count = len(pending)
+        if bucket:
+            try:
+                count = bucket.acquire(smtp_settings.host, count)
+            except mail.RateLimitExceeded:
+                # Лимит сервера исчерпан надолго: остаток уйдёт через другой сервер
+                break
+        failed += asyncio.run(deliver_async(pending[:count], smtp_settings, concurrency))
+        pending = pending[count:]
+    return (
+        [messages[id(email)][1] for email in failed],
+        [messages[id(email)][1] for email in pending],
+    )
+
+
+def deliver(datatuple, concurrency=None, rate_limit=True):
+    """Отправляет письма (subject, message, html_message, recipient_list) параллельно.
+
+    Серверы выбираются пулом mail.connections с учётом весов и circuit breaker;
+    неотправленные письма передаются следующему серверу. Возвращает письма,
+    которые не принял ни один сервер, в том же формате, чтобы задача повторила
+    только их. Если в настройках не SMTP-backend (тесты, консоль), письма
+    уходят через пул mail.connections.
+    """
+    datatuple = [tuple(item) for item in datatuple]
+    if settings.EMAIL_BACKEND != SMTP_BACKEND:
+        try:
+            mail.connections.send_mass_mail(datatuple)
+        except mail.PartialDeliveryError as exc:
+            return exc.unsent
+        return []
+    concurrency = concurrency or settings.EMAIL_ASYNC_CONCURRENCY
+    bucket = mail.TokenBucket.from_settings() if rate_limit else None
+    pending = datatuple
+    for smtp_settings, breaker in mail.connections.servers():
+        started = time.perf_counter()
+        failed, limited = _deliver_to(smtp_settings, pending, concurrency, bucket)
+        attempted = len(pending) - len(limited)
+        if failed:
+            breaker.record_failure()
+        elif attempted:
+            breaker.record_success((time.perf_counter() - started) * 1000 / attempted)
+        pending = failed + limited
+        if not pending:
+            break
+    return pending
@@ -0,0 +1,64 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+from .models import Department, Task, User
+
+AUTOCOMPLETE_LIMIT = 20
+
+
+def _departments(user):
+    return Department.objects.all() if user.is_admin else None
+
+
+def _users(user):
+    return User.objects.select_related('department') if user.is_admin else None
+
+
+def _tasks(user):
+    tasks = Task.objects.only('id', 'title')
+    if user.is_admin:
+        return tasks
+    if not user.department_id:
+        return None
+    return tasks.filter(assigned_to_id=user.department_id)
+
+
+def _best(expressions):
+    expressions = list(expressions)
+    return Greatest(*expressions) if len(expressions) > 1 else expressions[0]
+
+
+# Источник: (queryset с учётом прав, поля для поиска, порядок без строки поиска, подпись)
+SOURCES = {
+    'departments': (_departments, ('name', 'email'), ('name', 'id'), str),
+    'users': (_users, ('username', 'first_name', 'last_name', 'email'), ('username',), str),
+    'tasks': (_tasks, ('title',), ('-created_at', '-id'), lambda task: task.title),
+}
+
+
+def lookup(kind, user, term='', limit=AUTOCOMPLETE_LIMIT):
+    """Варианты автодополнения [{'id', 'text'}] или None, если источник недоступен."""
+    if kind not in SOURCES:
+        return None
+    get_queryset, fields, ordering, label = SOURCES[kind]
+    queryset = get_queryset(user)
+    if queryset is None:
+        return None
+    term = term.strip()
+    if term:
+        # icontains строится как UPPER(...) LIKE UPPER(...) и использует триграммные индексы
+        queryset = queryset.filter(
+            reduce(or_, (Q(**{f'{field}__icontains': term}) for field in fields))
+        )
+        # Сначала совпадение со словом, затем близость строки целиком
+        queryset = queryset.annotate(
+            word_similarity=_best(TrigramWordSimilarity(term, field) for field in fields),
+            similarity=_best(TrigramSimilarity(field, term) for field in fields),
+        ).order_by('-word_similarity', '-similarity', *ordering)
+    else:
+        queryset = queryset.order_by(*ordering)
+    return [{'id': obj.pk, 'text': label(obj)} for obj in queryset[:limit]]
@@ -0,0 +1,85 @@
+"""Массовые операции с задачами за постоянное число запросов к БД.
+
+bulk_create и update не вызывают сигналы, поэтому счётчики DepartmentTaskStats,
+кэш и уведомления обновляются здесь одной пачкой на всю операцию.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import cache, outbox
+from .models import DepartmentTaskStats, Task
+
+# Одно событие на массовое изменение: task_ids, changes, department_ids
+tasks_updated = Signal()
+# Предел сдвига срока в днях: больший timedelta переполняется
+MAX_DUE_DATE_SHIFT_DAYS = 3650
+
+
+def assign_to_departments(departments, assigned_by, **fields):
+    """Создаёт по задаче для каждой службы и ставит одно пакетное уведомление."""
+    with transaction.atomic():
+        tasks = Task.objects.bulk_create(
+            [
+                Task(assigned_to=department, assigned_by=assigned_by, **fields)
+                for department in departments
+            ]
+        )
+        if not tasks:
+            return tasks
+        DepartmentTaskStats.objects.apply_changes(
+            (None, (task.assigned_to_id, task.status, task.due_date)) for task in tasks
+        )
+        outbox.enqueue(
+            'tasks.tasks.send_task_notifications',
+            [task.pk for task in tasks],
+            key=f'tasks:{tasks[0].pk}:{tasks[-1].pk}',
+        )
+    # Задачи появились у многих служб: сбрасываем кэш одним счётчиком
+    cache.bump_all()
+    return tasks
+
+
+def update_tasks(tasks, status=None, assigned_to=None, due_date_shift=None):
+    """Меняет статус, службу или срок задач выборки одним UPDATE.
+
+    Возвращает число изменённых задач. due_date_shift — timedelta, на которую
+    сдвигается срок каждой задачи.
+    """
+    changes = {}
+    if status:
+        changes['status'] = status
+    if assigned_to is not None:
+        changes['assigned_to'] = assigned_to
+    if due_date_shift:
+        changes['due_date'] = F('due_date') + due_date_shift
+    if not changes:
+        return 0
+    with transaction.atomic():
+        # Прежние значения нужны для переноса задач между счётчиками
+        previous = list(
+            tasks.order_by()
+            .select_for_update(of=('self',))
+            .values_list('id', 'assigned_to_id', 'status', 'due_date')
+        )
+        if not previous:
+            return 0
+        task_ids = [task_id for task_id, *_ in previous]
+        # update() не обновляет auto_now-поля: updated_at задаётся явно
+        Task.objects.filter(id__in=task_ids).update(updated_at=timezone.now(), **changes)
+        department_ids = set()
+        stats_changes = []
+        for _, department_id, old_status, due_date in previous:
+            new = (
+                assigned_to.pk if assigned_to is not None else department_id,
+                status or old_status,
+                due_date + due_date_shift if due_date_shift else due_date,
+            )
+            department_ids.update((department_id, new[0]))
+            stats_changes.append(((department_id, old_status, due_date), new))
+        DepartmentTaskStats.objects.apply_changes(stats_changes)
+    tasks_updated.send(
+        sender=Task, task_ids=task_ids, changes=changes, department_ids=department_ids
+    )
+    return len(task_ids)
@@ -0,0 +1,94 @@
+"""Кэширование страниц задач с версионированием по службам.
+
+Каждой службе соответствует счётчик поколения в кэше. Сигналы увеличивают
+счётчик при изменении задач и комментариев службы, поэтому старые записи
+просто перестают читаться и вытесняются по таймауту.
+"""
+import hashlib
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+ALL_DEPARTMENTS = 'all'
+_EPOCH_KEY = 'tasks:epoch'
+
+
+def _cache():
+    return caches[getattr(settings, 'TASKS_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(department_id):
+    return f'tasks:generation:{department_id}'
+
+
+def _incr(key):
+    cache = _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключа нет: заводим новый счетчик; add не затрет параллельную запись
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def _bump(department_ids):
+    for department_id in {*department_ids, ALL_DEPARTMENTS}:
+        if department_id is not None:
+            _incr(_generation_key(department_id))
+
+
+def bump(*department_ids):
+    """Инвалидирует кэш указанных служб и общие страницы администратора.
+
+    Поколение меняется после коммита: иначе параллельный запрос успел бы
+    закэшировать ещё не изменённые данные под новым поколением.
+    """
+    transaction.on_commit(partial(_bump, department_ids))
+
+
+def bump_all():
+    """Инвалидирует кэш всех служб разом (после коммита, как bump)."""
+    transaction.on_commit(partial(_incr, _EPOCH_KEY))
+
+
+def make_key(scope, department_id, params=None):
+    """Ключ кэша с учетом текущего поколения службы."""
+    generation_key = _generation_key(department_id or ALL_DEPARTMENTS)
+    versions = _cache().get_many([_EPOCH_KEY, generation_key])
+    query = urlencode(sorted((params or {}).items()))
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return (
+        f'tasks:{scope}:{department_id or ALL_DEPARTMENTS}:'
+        f'{versions.get(_EPOCH_KEY, 0)}.{versions.get(generation_key, 0)}:{digest}'
+    )
+
+
+def get_or_compute(scope, department_id, compute, params=None):
+    """Возвращает значение из кэша или вычисляет и сохраняет его."""
+    cache = _cache()
+    key = make_key(scope, department_id, params)
+    value = cache.get(key)
+    if value is None:
+        _incr(f'tasks:cache:misses:{scope}')
+        value = compute()
+        cache.set(key, value, getattr(settings, 'TASKS_CACHE_TIMEOUT', 300))
+    else:
+        _incr(f'tasks:cache:hits:{scope}')
+    return value
+
+
+def cache_stats(scopes=('dashboard', 'task_list')):
+    """Счетчики попаданий и промахов по областям кэша."""
+    cache = _cache()
+    stats = {}
+    for scope in scopes:
+        values = cache.get_many([f'tasks:cache:hits:{scope}', f'tasks:cache:misses:{scope}'])
+        stats[scope] = {
+            'hits': values.get(f'tasks:cache:hits:{scope}', 0),
+            'misses': values.get(f'tasks:cache:misses:{scope}', 0),
+        }
+    return stats
@@ -0,0 +1,305 @@
+"""Генерация данных промышленного объёма для проверки производительности.
+
+Службы и пользователи создаются bulk_create, задачи и комментарии — пачками
+через COPY. Генератор детерминирован (random.Random с фиксированным seed),
+а распределения приближены к рабочим: несколько крупных служб получают
+большую часть задач, старые задачи в основном выполнены, число комментариев
+к задаче имеет длинный хвост. Пароль хэшируется один раз на всех пользователей.
+"""
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from itertools import accumulate
+from typing import NamedTuple
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import cache, pgcopy
+from .models import Department, DepartmentTaskStats, Task, User
+
+PASSWORD = 'servicepass'
+EMAIL_DOMAIN = 'scale.kgok.ru'
+DAY = 24 * 60 * 60
+
+DEPARTMENT_KINDS = (
+    'Геологическая служба', 'Геомеханический отдел', 'Маркшейдерская служба',
+    'Буровзрывной отдел', 'Горный участок', 'Обогатительная фабрика', 'Энергослужба',
+    'Механическая служба', 'Служба водоотлива', 'Автотранспортный цех', 'Лаборатория',
+    'Отдел охраны труда',
+)
+ACTIONS = (
+    'Подготовить', 'Проверить', 'Согласовать', 'Провести', 'Обновить', 'Разработать',
+    'Выполнить', 'Устранить', 'Заменить', 'Обследовать', 'Рассчитать', 'Утвердить',
+)
+SUBJECTS = (
+    'отчёт по скважинам', 'план буровзрывных работ', 'съёмку борта карьера',
+    'анализ керновых проб', 'ремонт конвейера', 'замер водопритока', 'паспорт забоя',
+    'цифровую модель месторождения', 'график ППР', 'акт обследования', 'замену футеровки',
+    'расчёт устойчивости уступа', 'поверку весов', 'ревизию насосов', 'заявку на материалы',
+)
+WORDS = (
+    'карьер', 'уступ', 'борт', 'скважина', 'порода', 'руда', 'керн', 'проба', 'взрыв',
+    'заряд', 'конвейер', 'дробилка', 'мельница', 'насос', 'водоотлив', 'отвал', 'участок',
+    'горизонт', 'съёмка', 'отметка', 'график', 'смена', 'бригада', 'мастер', 'ремонт',
+    'замена', 'проверка', 'акт', 'отчёт', 'план', 'срок', 'согласование', 'данные',
+    'результаты', 'анализ', 'расчёт', 'модель', 'необходимо', 'выполнено', 'требуется',
+    'уточнить', 'передать', 'подготовлено', 'северный', 'южный', 'восточный', 'западный',
+    'очистной', 'буровой', 'экскаватор', 'самосвал', 'футеровка', 'подшипник', 'датчик',
+)
+# Доли статусов для задач со сроком в прошлом и в будущем
+PAST_STATUSES = (
+    (Task.Status.COMPLETED, 0.86), (Task.Status.IN_PROGRESS, 0.06),
+    (Task.Status.NEW, 0.04), (Task.Status.POSTPONED, 0.04),
+)
+FUTURE_STATUSES = (
+    (Task.Status.NEW, 0.40), (Task.Status.IN_PROGRESS, 0.35),
+    (Task.Status.POSTPONED, 0.10), (Task.Status.COMPLETED, 0.15),
+)
+TASK_COLUMNS = (
+    'id', 'title', 'description', 'status', 'assigned_to_id', 'assigned_by_id',
+    'created_at', 'updated_at', 'due_date',
+)
+COMMENT_COLUMNS = ('task_id', 'user_id', 'content', 'created_at')
+
+
+class Volume(NamedTuple):
+    departments: int = 200
+    users: int = 5000
+    tasks: int = 2_000_000
+    comments: int = 10_000_000
+    # Глубина истории задач в днях
+    days: int = 3 * 365
+
+
+def _zipf_weights(count, exponent=1.0):
+    """Накопленные веса «закона Ципфа»: первые элементы встречаются намного чаще."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, UTC).isoformat()
+
+
+def _text(rng, low, high):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def create_departments(count):
+    """Службы scale-набора; уже созданные прежним запуском переиспользуются."""
+    departments = [
+        Department(
+            name=f'{DEPARTMENT_KINDS[index % len(DEPARTMENT_KINDS)]} №{index + 1}',
+            email=f'service{index + 1:04d}@{EMAIL_DOMAIN}',
+        )
+        for index in range(count)
+    ]
+    Department.objects.bulk_create(departments, batch_size=1000, ignore_conflicts=True)
+    return list(
+        Department.objects.filter(email__in=[department.email for department in departments])
+        .order_by('email')
+        .values_list('id', flat=True)
+    )
+
+
+def create_users(count, department_ids):
+    """Пользователи служб и администраторы (2 %) с одним общим хэшем пароля."""
+    password = make_password(PASSWORD)
+    admins = max(1, count // 50)
+    users = [
+        User(
+            username=f'user{index + 1:05d}',
+            email=f'user{index + 1:05d}@{EMAIL_DOMAIN}',
+            password=password,
+            first_name='Пользователь',
+            last_name=f'№{index + 1}',
+            is_admin=index < admins,
+            department_id=None if index < admins else department_ids[index % len(department_ids)],
+        )
+        for index in range(count)
+    ]
+    User.objects.bulk_create(users, batch_size=1000, ignore_conflicts=True)
+    rows = User.objects.filter(
+        username__in=[user.username for user in users]
+    ).values_list('id', 'is_admin', 'department_id')
+    admin_ids = []
+    members = {}
+    for pk, is_admin, department_id in rows:
+        if is_admin:
+            admin_ids.append(pk)
+        else:
+            members.setdefault(department_id, []).append(pk)
+    return sorted(admin_ids), members
+
+
+class Generator:
+    """Строки задач и комментариев для пачки; пачка с данным номером всегда одинакова."""
+
+    def __init__(self, seed, volume, department_ids, admin_ids, members, now):
+        self.seed = seed
+        self.volume = volume
+        self.department_ids = department_ids
+        self.department_weights = _zipf_weights(len(department_ids))
+        self.admin_ids = admin_ids
+        self.admin_weights = _zipf_weights(len(admin_ids), exponent=0.7)
+        self.members = members
+        self.now = now
+        self.past = list(accumulate(share for _, share in PAST_STATUSES))
+        self.future = list(accumulate(share for _, share in FUTURE_STATUSES))
+
+    def comment_count(self, start, size):
+        """Доля комментариев для задач [start, start + size); в сумме ровно volume.comments."""
+        comments, tasks = self.volume.comments, self.volume.tasks
+        return comments * (start + size) // tasks - comments * start // tasks
+
+    def batch(self, index, task_ids, comment_count):
+        """Возвращает (строки задач, строки комментариев) для task_ids."""
+        # Своё зерно у каждой пачки: результат не зависит от порядка их выполнения
+        rng = random.Random(f'{self.seed}:{index}')
+        now = self.now
+        history = self.volume.days * DAY
+        departments = rng.choices(
+            self.department_ids, cum_weights=self.department_weights, k=len(task_ids)
+        )
+        authors = rng.choices(self.admin_ids, cum_weights=self.admin_weights, k=len(task_ids))
+        tasks = []
+        activity = []
+        weights = []
+        for task_id, department_id, author_id in zip(task_ids, departments, authors):
+            # Задач становится больше со временем: недавние даты вероятнее
+            created = now - history * (1 - math.sqrt(rng.random()))
+            # Срок — от нескольких дней до пары месяцев, медиана две недели
+            due = created + rng.lognormvariate(math.log(14), 0.8) * DAY
+            if due < now:
+                status = rng.choices(PAST_STATUSES, cum_weights=self.past)[0][0]
+            else:
+                status = rng.choices(FUTURE_STATUSES, cum_weights=self.future)[0][0]
+            window = max(min(due, now) - created, 60)
+            tasks.append((
+                task_id,
+                f'{rng.choice(ACTIONS)} {rng.choice(SUBJECTS)}, участок №{rng.randint(1, 40)}',
+                _text(rng, 10, 40),
+                status,
+                department_id,
+                author_id,
+                _timestamp(created),
+                _timestamp(created + rng.random() * window),
+                _timestamp(due),
+            ))
+            activity.append((task_id, department_id, author_id, created, window))
+            # Распределение Парето: у большинства задач мало комментариев, у немногих —
+            # десятки; к новым задачам пишут реже
+            weights.append(
+                rng.paretovariate(2.0) * (0.3 if status == Task.Status.NEW else 1.0)
+            )
+
+        comments = []
+        for task_id, department_id, author_id, created, window in rng.choices(
+            activity, weights=weights, k=comment_count
+        ):
+            users = self.members.get(department_id) or self.admin_ids
+            comments.append((
+                task_id,
+                author_id if rng.random() < 0.3 else rng.choice(users),
+                _text(rng, 5, 25),
+                _timestamp(created + rng.random() * window),
+            ))
+        return tasks, comments
+
+
+def _reserve_task_ids(cursor, count):
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence('tasks_task', 'id'))"
+        ' FROM generate_series(1, %s)',
+        [count],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+_generator = None
+
+
+def _init_worker(generator):
+    global _generator
+    _generator = generator
+
+
+def _load_batch(index, start, size):
+    """Загружает одну пачку в отдельной транзакции; возвращает (задач, комментариев)."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        tasks, comments = _generator.batch(
+            index, _reserve_task_ids(cursor, size), _generator.comment_count(start, size)
+        )
+        # Внешние ключи в Django отложенные (DEFERRABLE INITIALLY DEFERRED), поэтому
+        # комментарии загружаются раньше задач. Тогда триггер вставки задачи один раз
+        # строит её поисковый вектор вместе с комментариями, а триггер комментариев
+        # не пересчитывает задачи повторно.
+        pgcopy.copy_rows(cursor, 'tasks_comment', COMMENT_COLUMNS, comments)
+        pgcopy.copy_rows(cursor, 'tasks_task', TASK_COLUMNS, tasks)
+    return len(tasks), len(comments)
+
+
+def generate(volume, seed=42, batch_size=50_000, workers=1, log=None):
+    """Создаёт данные объёма volume; возвращает (задач, комментариев).
+
+    Каждая пачка задач загружается вместе со своими комментариями в отдельной
+    транзакции, поэтому прерванный запуск оставляет согласованные данные.
+    При workers > 1 пачки загружаются параллельно отдельными процессами:
+    основная работа — построение поисковых векторов в PostgreSQL — упирается
+    в процессор одного серверного процесса на соединение.
+    """
+    log = log or (lambda message: None)
+    started = time.perf_counter()
+    department_ids = create_departments(volume.departments)
+    admin_ids, members = create_users(volume.users, department_ids)
+    log(f'Служб: {len(department_ids)}, пользователей: {volume.users}')
+
+    generator = Generator(
+        seed, volume, department_ids, admin_ids, members, timezone.now().timestamp()
+    )
+    starts = range(0, volume.tasks, batch_size)
+    batches = (
+        list(range(len(starts))),
+        list(starts),
+        [min(batch_size, volume.tasks - start) for start in starts],
+    )
+    if workers > 1:
+        # Дочерние процессы открывают собственные соединения
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=(generator,),
+        )
+        results = executor.map(_load_batch, *batches)
+    else:
+        executor = None
+        _init_worker(generator)
+        results = map(_load_batch, *batches)
+
+    tasks_created = comments_created = 0
+    try:
+        for tasks, comments in results:
+            tasks_created += tasks
+            comments_created += comments
+            elapsed = time.perf_counter() - started
+            log(
+                f'Задач: {tasks_created}, комментариев: {comments_created} '
+                f'({(tasks_created + comments_created) / elapsed:,.0f} строк/с)'
+            )
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    DepartmentTaskStats.objects.rebuild()
+    cache.bump_all()
+    with connection.cursor() as cursor:
+        # Статистика планировщика для только что загруженных таблиц
+        cursor.execute('ANALYZE tasks_task, tasks_comment, tasks_user, tasks_department')
+    return tasks_created, comments_created
@@ -0,0 +1,184 @@
+"""Потоковая выгрузка списка задач в CSV и XLSX.
+
+Строки читаются серверным курсором пачками (QuerySet.iterator) и сразу
+отдаются клиенту, поэтому память не зависит от числа задач. XLSX собирается
+zipfile в поток без временного файла: лист пишется строками inlineStr.
+"""
+import csv
+import re
+import zipfile
+from itertools import chain
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Task
+
+HEADER = (
+    '№', 'Название', 'Статус', 'Служба', 'Автор', 'Создана', 'Крайний срок', 'Просрочена',
+    'Комментариев',
+)
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def export_rows(tasks, now=None):
+    """Строки выгрузки: только нужные столбцы, чтение серверным курсором."""
+    comment_count = (
+        Comment.objects.filter(task=OuterRef('pk'))
+        .order_by()
+        .values('task')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    rows = (
+        tasks.with_overdue(now)
+        .annotate(comment_count=Coalesce(Subquery(comment_count), 0, output_field=IntegerField()))
+        .values_list(
+            'id', 'title', 'status', 'assigned_to__name', 'assigned_by__username',
+            'created_at', 'due_date', 'overdue', 'comment_count',
+        )
+        .iterator(chunk_size=settings.TASK_EXPORT_CHUNK_SIZE)
+    )
+    # Подписи статусов и часовой пояс вычисляются один раз, а не на каждую строку
+    statuses = {value: str(label) for value, label in Task.Status.choices}
+    tz = timezone.get_current_timezone()
+    for pk, title, status, department, author, created_at, due_date, overdue, comments in rows:
+        yield (
+            pk,
+            title,
+            statuses.get(status, status),
+            department,
+            author,
+            created_at.astimezone(tz).strftime(DATETIME_FORMAT),
+            due_date.astimezone(tz).strftime(DATETIME_FORMAT),
+            'да' if overdue else 'нет',
+            comments,
+        )
+
+
+class _StreamBuffer:
+    """Файлоподобный буфер, содержимое которого забирается по частям."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+class _TextWriter:
+    """Текстовая обёртка буфера для csv.writer."""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, text):
+        return self.buffer.write(text.encode())
+
+
+def csv_stream(rows, chunk_size=64 * 1024):
+    """CSV в UTF-8 с BOM (его ожидает Excel), отдаваемый частями не меньше chunk_size байт."""
+    buffer = _StreamBuffer()
+    writer = csv.writer(_TextWriter(buffer))
+    buffer.write('\ufeff'.encode())
+    writer.writerow(HEADER)
+    # Заголовок уходит клиенту до выполнения запроса
+    yield buffer.pop()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.size >= chunk_size:
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Задачи" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        'relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_TAIL = '</sheetData></worksheet>'
+# Управляющие символы недопустимы в XML
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    if isinstance(value, int):
+        return f'<c t="n"><v>{value}</v></c>'
+    text = escape(_INVALID_XML.sub('', str(value or '')))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_stream(rows, chunk_size=64 * 1024):
+    """XLSX-книга из одного листа, отдаваемая частями не меньше chunk_size байт."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.pop()
+        # Размер листа заранее неизвестен: zip64 снимает ограничение в 2 ГБ
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(SHEET_HEAD.encode())
+            for row in chain([HEADER], rows):
+                sheet.write(f'<row>{"".join(_xlsx_cell(value) for value in row)}</row>'.encode())
+                if buffer.size >= chunk_size:
+                    yield buffer.pop()
+            sheet.write(SHEET_TAIL.encode())
+    yield buffer.pop()
+
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', csv_stream),
+    'xlsx': (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        xlsx_stream,
+    ),
+}
@@ -1,11 +1,45 @@
+from datetime import timedelta
+
 from django import forms
 from django.contrib.auth import authenticate
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
+from . import bulk
 from .models import Comment, Department, EmailConfiguration, Task, User
 
 
+class AutocompleteSelect(forms.Select):
+    """Select с подгрузкой вариантов по AJAX: в HTML попадает только выбранное значение."""
+    def __init__(self, kind, attrs=None):
+        self.kind = kind
+        super().__init__(attrs)
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse('autocomplete', args=[self.kind])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in (None, '')]
+        options = []
+        if not self.is_required and not self.allow_multiple_selected:
+            empty_label = self.choices.field.empty_label
+            options.append(self.create_option(name, '', empty_label, not selected, 0))
+        if selected:
+            queryset = self.choices.queryset.filter(pk__in=selected)
+            for index, obj in enumerate(queryset, start=len(options)):
+                options.append(self.create_option(
+                    name, obj.pk, self.choices.field.label_from_instance(obj), True, index
+                ))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelectMultiple(AutocompleteSelect, forms.SelectMultiple):
+    """Множественный выбор с подгрузкой вариантов по AJAX."""
+
+
 class CustomAuthenticationForm(AuthenticationForm):
     username = forms.CharField(
         label=_('Email или имя пользователя'),
@@ -85,10 +119,117 @@ class TaskForm(forms.ModelForm):
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'status': forms.Select(attrs={'class': 'form-select'}),
-            'assigned_to': forms.Select(attrs={'class': 'form-select'}),
+            'assigned_to': AutocompleteSelect('departments', attrs={'class': 'form-select'}),
         }
 
 
+class TaskBulkForm(TaskForm):
+    """Форма создания одной и той же задачи для нескольких служб."""
+    departments = forms.ModelMultipleChoiceField(
+        label=_('Службы'),
+        queryset=Department.objects.all(),
+        required=False,
+        widget=AutocompleteSelectMultiple('departments', attrs={'class': 'form-select'}),
+    )
+    all_departments = forms.BooleanField(
+        label=_('Всем службам'),
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    class Meta(TaskForm.Meta):
+        fields = ('title', 'description', 'status', 'due_date')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('all_departments'):
+            cleaned_data['departments'] = Department.objects.all()
+        elif not cleaned_data.get('departments'):
+            self.add_error('departments', _('Выберите службы или отметьте «Всем службам».'))
+        return cleaned_data
+
+    def task_fields(self):
+        """Значения полей задачи, общие для всех служб."""
+        return {field: self.cleaned_data[field] for field in self._meta.fields}
+
+
+class IdListField(forms.Field):
+    """Список целочисленных идентификаторов из повторяющегося параметра формы."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(item) for item in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError(_('Некорректный список задач.'))
+
+
+class TaskBulkActionForm(forms.Form):
+    """Массовое действие над задачами, отмеченными в списке."""
+    ACTIONS = (
+        ('status', _('Изменить статус')),
+        ('postpone', _('Отложить')),
+        ('reassign', _('Передать службе')),
+        ('shift', _('Сдвинуть срок')),
+    )
+    # Передача и перенос срока доступны только администраторам, как и редактирование
+    ADMIN_ACTIONS = ('reassign', 'shift')
+
+    tasks = IdListField(error_messages={'required': _('Отметьте задачи в списке.')})
+    action = forms.ChoiceField(
+        label=_('Действие'),
+        choices=ACTIONS,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    status = forms.ChoiceField(
+        label=_('Статус'),
+        choices=[('', '---------')] + Task.Status.choices,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    assigned_to = forms.ModelChoiceField(
+        label=_('Служба'),
+        queryset=Department.objects.all(),
+        required=False,
+        widget=AutocompleteSelect('departments', attrs={'class': 'form-select'}),
+    )
+    days = forms.IntegerField(
+        label=_('Дней'),
+        required=False,
+        min_value=-bulk.MAX_DUE_DATE_SHIFT_DAYS,
+        max_value=bulk.MAX_DUE_DATE_SHIFT_DAYS,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+    def __init__(self, *args, user, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not user.is_admin:
+            self.fields['action'].choices = [
+                choice for choice in self.ACTIONS if choice[0] not in self.ADMIN_ACTIONS
+            ]
+            del self.fields['assigned_to']
+            del self.fields['days']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        required = {'status': 'status', 'reassign': 'assigned_to', 'shift': 'days'}
+        field = required.get(cleaned_data.get('action'))
+        if field and cleaned_data.get(field) in (None, ''):
+            self.add_error(field, _('Обязательное поле для выбранного действия.'))
+        return cleaned_data
+
+    def changes(self):
+        """Аргументы bulk.update_tasks для выбранного действия."""
+        action = self.cleaned_data['action']
+        if action == 'status':
+            return {'status': self.cleaned_data['status']}
+        if action == 'postpone':
+            return {'status': Task.Status.POSTPONED}
+        if action == 'reassign':
+            return {'assigned_to': self.cleaned_data['assigned_to']}
+        return {'due_date_shift': timedelta(days=self.cleaned_data['days'])}
+
+
 class TaskStatusForm(forms.ModelForm):
     """Форма для обновления статуса задачи."""
     class Meta:
@@ -122,7 +263,16 @@ class EmailConfigurationForm(forms.ModelForm):
     """Форма для настройки параметров SMTP."""
     class Meta:
         model = EmailConfiguration
-        fields = ('smtp_host', 'smtp_port', 'smtp_user', 'smtp_password', 'use_tls', 'from_email')
+        fields = (
+            'smtp_host',
+            'smtp_port',
+            'smtp_user',
+            'smtp_password',
+            'use_tls',
+            'from_email',
+            'weight',
+            'is_active',
+        )
         widgets = {
             'smtp_host': forms.TextInput(attrs={'class': 'form-control'}),
             'smtp_port': forms.NumberInput(attrs={'class': 'form-control'}),
@@ -130,4 +280,6 @@ class EmailConfigurationForm(forms.ModelForm):
             'smtp_password': forms.PasswordInput(attrs={'class': 'form-control'}),
             'use_tls': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'from_email': forms.EmailInput(attrs={'class': 'form-control'}),
+            'weight': forms.NumberInput(attrs={'class': 'form-control'}),
+            'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
\ No newline at end of file
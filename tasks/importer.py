@@ -0,0 +1,287 @@
+"""Массовый импорт задач из CSV и XLSX через PostgreSQL COPY.
+
+Файл читается потоком, службы (по email) и авторы (по логину) сопоставляются
+по словарям, загруженным одним запросом. Строки загружаются командой COPY во
+временную таблицу и переносятся в tasks_task одним INSERT ... SELECT. Счётчики
+статистики и кэш обновляются пачкой, а каждая служба получает одно письмо
+со списком новых задач.
+"""
+import codecs
+import csv
+import io
+import zipfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache, outbox, pgcopy
+from .models import Department, DepartmentTaskStats, Task, User
+
+COLUMNS = {
+    'title': ('title', 'название'),
+    'description': ('description', 'описание'),
+    'department': ('department', 'служба', 'email службы'),
+    'author': ('author', 'автор'),
+    'due_date': ('due_date', 'крайний срок', 'срок'),
+    'status': ('status', 'статус'),
+}
+REQUIRED = ('title', 'department', 'due_date')
+DATE_FORMATS = ('%Y-%m-%d %H:%M', '%Y-%m-%d', '%d.%m.%Y %H:%M', '%d.%m.%Y')
+EXCEL_EPOCH = datetime(1899, 12, 30)
+XLSX_SHEET = 'xl/worksheets/sheet1.xml'
+MAX_ERRORS = 20
+STAGING_COLUMNS = (
+    'title', 'description', 'status', 'assigned_to_id', 'assigned_by_id', 'due_date',
+)
+
+
+class TaskImportError(Exception):
+    """Файл не импортирован; errors — сообщения об ошибках по строкам."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+class ExcelNumber(str):
+    """Значение числовой ячейки XLSX: в столбце срока это дата Excel."""
+
+
+def _encoding(file):
+    # CSV из Excel для Windows обычно сохранён в cp1251
+    sample = file.read(4096)
+    file.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+    except UnicodeDecodeError:
+        return 'cp1251'
+    return 'utf-8-sig'
+
+
+def _csv_rows(file):
+    text = io.TextIOWrapper(file, encoding=_encoding(file), newline='')
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(text, dialect)
+    except UnicodeDecodeError as exc:
+        raise TaskImportError([f'Файл не в кодировке UTF-8 или Windows-1251: {exc}']) from exc
+
+
+def _column_index(reference):
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _xlsx_rows(file):
+    try:
+        yield from _xlsx_sheet_rows(file)
+    except zipfile.BadZipFile as exc:
+        raise TaskImportError([f'Файл не является книгой XLSX: {exc}']) from exc
+
+
+def _xlsx_sheet_rows(file):
+    namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    with zipfile.ZipFile(file) as archive:
+        names = archive.namelist()
+        if XLSX_SHEET not in names:
+            raise TaskImportError([f'В книге нет первого листа ({XLSX_SHEET})'])
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            with archive.open('xl/sharedStrings.xml') as strings:
+                for _, element in iterparse(strings):
+                    if element.tag == f'{namespace}si':
+                        shared.append(''.join(element.itertext()))
+                        element.clear()
+        with archive.open(XLSX_SHEET) as sheet:
+            # iterparse с очисткой строк: лист не загружается в память целиком
+            for _, element in iterparse(sheet):
+                if element.tag != f'{namespace}row':
+                    continue
+                row = []
+                for cell in element.iter(f'{namespace}c'):
+                    cell_type = cell.get('t')
+                    if cell_type == 'inlineStr':
+                        value = ''.join(cell.find(f'{namespace}is').itertext())
+                    else:
+                        value = cell.findtext(f'{namespace}v') or ''
+                        if cell_type == 's' and value:
+                            value = shared[int(value)]
+                        elif cell_type in (None, 'n') and value:
+                            value = ExcelNumber(value)
+                    index = _column_index(cell.get('r', '')) if cell.get('r') else len(row)
+                    row.extend([''] * (index - len(row) + 1))
+                    row[index] = value
+                element.clear()
+                yield row
+
+
+def read_rows(file, name):
+    """Строки файла CSV или XLSX (по расширению имени) как списки строк."""
+    if name.lower().endswith('.xlsx'):
+        return _xlsx_rows(file)
+    return _csv_rows(file)
+
+
+def _parse_date(value, tz):
+    if isinstance(value, ExcelNumber):
+        # Дата в XLSX хранится числом дней от 30.12.1899
+        try:
+            return timezone.make_aware(EXCEL_EPOCH + timedelta(days=float(value)), tz)
+        except OverflowError:
+            raise ValueError(value) from None
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return timezone.make_aware(datetime.strptime(value, date_format), tz)
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+
+def _staged_rows(rows, default_author, errors):
+    """Проверяет строки файла и превращает их в строки временной таблицы.
+
+    Заголовок и словари соответствия читаются сразу: во время COPY
+    соединение занято и других запросов не принимает.
+    """
+    rows = iter(rows)
+    header = [value.strip().lower() for value in next(rows, [])]
+    positions = {}
+    for column, names in COLUMNS.items():
+        for index, value in enumerate(header):
+            if value in names:
+                positions[column] = index
+                break
+    missing = [column for column in REQUIRED if column not in positions]
+    if 'author' not in positions and default_author is None:
+        missing.append('author')
+    if missing:
+        errors.append(f'Нет столбцов: {", ".join(missing)}')
+        return iter(())
+
+    departments = {
+        email.lower(): pk for pk, email in Department.objects.values_list('id', 'email')
+    }
+    authors = dict(User.objects.values_list('username', 'id'))
+    statuses = {value: value for value in Task.Status.values}
+    statuses.update({str(label).lower(): value for value, label in Task.Status.choices})
+    title_length = Task._meta.get_field('title').max_length
+    tz = timezone.get_current_timezone()
+
+    def raw(row, column):
+        index = positions.get(column)
+        return row[index] if index is not None and index < len(row) else ''
+
+    def value(row, column):
+        return raw(row, column).strip()
+
+    def staged():
+        try:
+            yield from checked()
+        except TaskImportError as exc:
+            # Файл не дочитан: ошибка попадает в общий список, COPY завершается
+            errors.extend(exc.errors)
+
+    def checked():
+        for line, row in enumerate(rows, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            problems = []
+            title = value(row, 'title')
+            if not title:
+                problems.append('пустое название')
+            department_id = departments.get(value(row, 'department').lower())
+            if department_id is None:
+                problems.append(f'служба «{value(row, "department")}» не найдена')
+            author = value(row, 'author')
+            author_id = authors.get(author) if author else getattr(default_author, 'pk', None)
+            if author_id is None:
+                problems.append(f'автор «{author}» не найден')
+            status = statuses.get(value(row, 'status').lower() or Task.Status.NEW)
+            if status is None:
+                problems.append(f'неизвестный статус «{value(row, "status")}»')
+            try:
+                due_date = _parse_date(raw(row, 'due_date'), tz)
+            except ValueError:
+                problems.append(f'некорректный срок «{value(row, "due_date")}»')
+            if problems:
+                errors.append(f'Строка {line}: {", ".join(problems)}')
+                continue
+            if errors:
+                # Файл уже не будет импортирован: строки только проверяются
+                continue
+            yield (
+                title[:title_length],
+                value(row, 'description'),
+                status,
+                department_id,
+                author_id,
+                due_date.isoformat(),
+            )
+
+    return staged()
+
+
+def import_tasks(rows, default_author=None):
+    """Импортирует задачи из строк файла (первая — заголовок); возвращает созданные id.
+
+    Файл импортируется целиком или не импортируется совсем: при ошибках
+    в строках выбрасывается TaskImportError.
+    """
+    errors = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            staged = _staged_rows(rows, default_author, errors)
+            cursor.execute(
+                'CREATE TEMP TABLE task_import ('
+                ' title text, description text, status text,'
+                ' assigned_to_id bigint, assigned_by_id bigint, due_date timestamptz'
+                ') ON COMMIT DROP'
+            )
+            pgcopy.copy_rows(
+                cursor,
+                'task_import',
+                STAGING_COLUMNS,
+                staged,
+                # Пустое описание — пустая строка, а не NULL
+                'FORCE_NOT_NULL (description)',
+            )
+            if errors:
+                raise TaskImportError(errors[:MAX_ERRORS])
+            cursor.execute(
+                'INSERT INTO tasks_task (title, description, status, assigned_to_id,'
+                ' assigned_by_id, due_date, created_at, updated_at)'
+                ' SELECT title, description, status, assigned_to_id, assigned_by_id, due_date,'
+                ' now(), now() FROM task_import'
+                ' RETURNING id, assigned_to_id, status, due_date'
+            )
+            created = cursor.fetchall()
+            cursor.execute('DROP TABLE task_import')
+        DepartmentTaskStats.objects.apply_changes(
+            (None, (department_id, status, due_date))
+            for _, department_id, status, due_date in created
+        )
+        by_department = defaultdict(list)
+        for pk, department_id, _, _ in created:
+            by_department[department_id].append(pk)
+        outbox.enqueue_many(
+            'tasks.tasks.send_department_task_digest',
+            [
+                ((department_id, task_ids), f'import:{department_id}:{task_ids[0]}')
+                for department_id, task_ids in by_department.items()
+            ],
+        )
+    cache.bump_all()
+    return [pk for pk, *_ in created]
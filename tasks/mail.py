@@ -0,0 +1,451 @@
+import random
+import smtplib
+import threading
+import time
+from typing import NamedTuple
+
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection
+
+from .models import EmailConfiguration, SmtpRateBucket
+
+# Обрывы связи, после которых соединение пересоздаётся и отправка повторяется один раз
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+# Ошибки сервера, после которых письма передаются следующему серверу пула
+DELIVERY_ERRORS = (smtplib.SMTPException, ConnectionError, TimeoutError)
+
+
+class SmtpSettings(NamedTuple):
+    """Параметры подключения к SMTP-серверу."""
+    host: str
+    port: int
+    username: str
+    password: str
+    use_tls: bool
+    from_email: str
+
+
+def _config_settings(config):
+    return SmtpSettings(
+        config.smtp_host,
+        config.smtp_port,
+        config.smtp_user,
+        config.smtp_password,
+        config.use_tls,
+        config.from_email,
+    )
+
+
+def active_smtp_servers():
+    """Активные SMTP-серверы [(ключ, SmtpSettings, вес)]; без них — settings.EMAIL_*.
+
+    Сервер с нулевым весом (записанный в обход формы) в пул не входит.
+    """
+    servers = [
+        (config.pk, _config_settings(config), config.weight)
+        for config in EmailConfiguration.objects.filter(is_active=True, weight__gt=0).order_by('id')
+    ]
+    return servers or [(
+        'settings',
+        SmtpSettings(
+            settings.EMAIL_HOST,
+            settings.EMAIL_PORT,
+            settings.EMAIL_HOST_USER,
+            settings.EMAIL_HOST_PASSWORD,
+            settings.EMAIL_USE_TLS,
+            settings.DEFAULT_FROM_EMAIL,
+        ),
+        1,
+    )]
+
+
+def active_smtp_settings():
+    """Параметры первого активного SMTP-сервера."""
+    return active_smtp_servers()[0][1]
+
+
+class RateLimitExceeded(Exception):
+    """Лимит отправки SMTP-сервера не освободился за допустимое время ожидания."""
+
+
+class PartialDeliveryError(Exception):
+    """Отправка прервалась после того, как часть писем уже ушла.
+
+    unsent — неотправленные письма в том виде, в каком их передали на отправку:
+    повторять нужно только их. Не наследует SMTPException, чтобы автоповтор
+    задачи не отправил ушедшие письма второй раз.
+    """
+
+    def __init__(self, error, sent, unsent):
+        super().__init__(f'Отправлено писем: {sent}, не отправлено: {len(unsent)} ({error!r})')
+        self.error = error
+        self.sent = sent
+        self.unsent = unsent
+
+
+class TokenBucket:
+    """Ограничение писем в секунду на SMTP-сервер, общее для всех процессов.
+
+    Состояние корзины хранится в SmtpRateBucket и обновляется одним
+    атомарным INSERT ... ON CONFLICT: токены пополняются со скоростью rate
+    до capacity, запрос получает столько токенов, сколько есть (не больше count).
+    """
+
+    def __init__(self, rate, capacity, max_wait):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+
+    @classmethod
+    def from_settings(cls):
+        """Корзина из EMAIL_RATE_LIMIT_*; None, если ограничение выключено."""
+        if not settings.EMAIL_RATE_LIMIT_PER_SECOND:
+            return None
+        return cls(
+            settings.EMAIL_RATE_LIMIT_PER_SECOND,
+            settings.EMAIL_RATE_LIMIT_BURST,
+            settings.EMAIL_RATE_LIMIT_MAX_WAIT,
+        )
+
+    def take(self, host, count):
+        """Забирает до count токенов; возвращает (выдано, остаток токенов)."""
+        table = SmtpRateBucket._meta.db_table
+        refill = (
+            f'LEAST(%(capacity)s, {table}.tokens + %(rate)s * '
+            f'EXTRACT(EPOCH FROM clock_timestamp() - {table}.updated_at))'
+        )
+        granted = f'LEAST(%(count)s, FLOOR({refill}))'
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (host, tokens, granted, updated_at)
+                VALUES (
+                    %(host)s, %(capacity)s - LEAST(%(count)s, %(capacity)s),
+                    LEAST(%(count)s, %(capacity)s), clock_timestamp()
+                )
+                ON CONFLICT (host) DO UPDATE SET
+                    tokens = {refill} - {granted},
+                    granted = {granted},
+                    updated_at = clock_timestamp()
+                RETURNING granted, tokens
+                """,
+                {'host': host, 'count': count, 'capacity': self.capacity, 'rate': self.rate},
+            )
+            return cursor.fetchone()
+
+    def acquire(self, host, count):
+        """Ждёт хотя бы один токен и возвращает число разрешённых писем."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            granted, tokens = self.take(host, count)
+            if granted:
+                return granted
+            wait = (1 - tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f'Превышен лимит отправки для {host}')
+            time.sleep(wait)
+
+
+class EmailConnectionManager:
+    """SMTP-соединение процесса, переиспользуемое между отправками.
+
+    Соединение закрывается после простоя дольше idle_timeout секунд,
+    пересоздаётся при смене настроек SMTP и после обрыва связи.
+    """
+
+    def __init__(
+        self, load_settings=active_smtp_settings, backend=None, idle_timeout=None, rate_limit=True
+    ):
+        self.load_settings = load_settings
+        self.backend = backend
+        self.rate_limit = rate_limit
+        self.idle_timeout = (
+            settings.EMAIL_CONNECTION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        )
+        self.opened = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._settings = None
+        self._last_used = 0.0
+
+    def _open(self, smtp_settings):
+        connection = get_connection(
+            backend=self.backend,
+            host=smtp_settings.host,
+            port=smtp_settings.port,
+            username=smtp_settings.username,
+            password=smtp_settings.password,
+            use_tls=smtp_settings.use_tls,
+        )
+        connection.open()
+        self.opened += 1
+        return connection
+
+    def _acquire(self):
+        smtp_settings = self.load_settings()
+        idle = time.monotonic() - self._last_used > self.idle_timeout
+        if self._connection is not None and (idle or smtp_settings != self._settings):
+            self._close()
+        if self._connection is None:
+            self._connection = self._open(smtp_settings)
+            self._settings = smtp_settings
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+        self._connection = None
+        self._settings = None
+
+    def _send_one(self, message):
+        try:
+            return self._connection.send_messages([message])
+        except CONNECTION_ERRORS:
+            # Сервер закрыл простаивавшее соединение: подключаемся заново
+            self._close()
+            return self._acquire().send_messages([message])
+
+    def _send(self, items, build):
+        # Письма уходят по одному, чтобы при ошибке был известен неотправленный остаток
+        items = list(items)
+        with self._lock:
+            sent = 0
+            try:
+                self._acquire()
+                messages = build(self._settings, items)
+                bucket = TokenBucket.from_settings() if self.rate_limit else None
+                while sent < len(messages):
+                    count = len(messages) - sent
+                    if bucket:
+                        count = bucket.acquire(self._settings.host, count)
+                    for message in messages[sent:sent + count]:
+                        self._send_one(message)
+                        sent += 1
+            except (RateLimitExceeded, *DELIVERY_ERRORS) as exc:
+                if not sent:
+                    raise
+                raise PartialDeliveryError(exc, sent, items[sent:]) from exc
+            self._last_used = time.monotonic()
+            return sent
+
+    def send_messages(self, messages):
+        """Отправляет письма через общее соединение, при обрыве переподключается."""
+        return self._send(messages, lambda smtp_settings, messages: messages)
+
+    def send_mass_mail(self, datatuple):
+        """Отправляет письма (subject, message, html_message, recipient_list) за один проход."""
+        def build(smtp_settings, datatuple):
+            messages = []
+            for subject, message, html_message, recipient_list in datatuple:
+                email = EmailMultiAlternatives(
+                    subject, message, smtp_settings.from_email, recipient_list
+                )
+                if html_message:
+                    email.attach_alternative(html_message, 'text/html')
+                messages.append(email)
+            return messages
+
+        return self._send(datatuple, build)
+
+    def send_mail(self, subject, message, recipient_list, html_message=None):
+        """Аналог django.core.mail.send_mail с отправителем из настроек SMTP."""
+        return self.send_mass_mail([(subject, message, html_message, recipient_list)])
+
+    def invalidate(self):
+        """Закрывает соединение: следующая отправка подключится заново."""
+        with self._lock:
+            self._close()
+
+    close = invalidate
+
+    def reset(self):
+        """Забывает соединение без закрытия (после fork оно принадлежит родителю)."""
+        self._lock = threading.Lock()
+        self._connection = None
+        self._settings = None
+
+
+class SmtpServersUnavailable(smtplib.SMTPException):
+    """Ни один SMTP-сервер пула не принял письма."""
+
+
+class CircuitBreaker:
+    """Состояние SMTP-сервера в процессе воркера.
+
+    После threshold ошибок или медленных отправок подряд сервер исключается
+    из пула на cooldown секунд, затем получает одну пробную отправку.
+    """
+
+    def __init__(self, threshold, cooldown, slow_ms):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.slow_ms = slow_ms
+        self.failures = 0
+        self.opened_at = None
+        self.latency_ms = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def available(self):
+        return not self.is_open or time.monotonic() - self.opened_at >= self.cooldown
+
+    def record_success(self, elapsed_ms):
+        # Экспоненциальное среднее задержки на письмо
+        self.latency_ms = (
+            elapsed_ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * elapsed_ms
+        )
+        if elapsed_ms > self.slow_ms:
+            self.record_failure()
+        else:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class SmtpPool:
+    """Пул активных SMTP-серверов с весами, автоматическим переключением и circuit breaker.
+
+    Каждая отправка уходит на сервер, выбранный случайно пропорционально весу
+    среди доступных; при ошибке следующему серверу передаются только письма,
+    которые ещё не ушли.
+    """
+
+    def __init__(self, load_servers=active_smtp_servers, backend=None):
+        self.load_servers = load_servers
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._managers = {}
+        self._breakers = {}
+        self._current = {}
+
+    def _manager(self, key, smtp_settings):
+        self._current[key] = smtp_settings
+        if key not in self._managers:
+            self._managers[key] = EmailConnectionManager(
+                load_settings=lambda: self._current[key], backend=self.backend
+            )
+            self._breakers[key] = CircuitBreaker(
+                settings.SMTP_FAILURE_THRESHOLD,
+                settings.SMTP_CIRCUIT_COOLDOWN,
+                settings.SMTP_SLOW_SEND_MS,
+            )
+        return self._managers[key], self._breakers[key]
+
+    def _order(self, servers):
+        # Взвешенная случайная перестановка: сервер с большим весом чаще первый
+        return sorted(
+            servers, key=lambda server: random.random() ** (1 / server[2]), reverse=True
+        )
+
+    def _candidates(self):
+        """Серверы в порядке попытки: [(SmtpSettings, менеджер соединения, breaker)]."""
+        with self._lock:
+            servers = self.load_servers()
+            for key in set(self._managers) - {key for key, _, _ in servers}:
+                self._managers.pop(key).close()
+                self._breakers.pop(key)
+                self._current.pop(key)
+            candidates = [
+                (smtp_settings, *self._manager(key, smtp_settings))
+                for key, smtp_settings, weight in self._order(servers)
+            ]
+        available = [candidate for candidate in candidates if candidate[2].available()]
+        # Все серверы исключены: пробуем их всё равно, чем не отправлять вовсе
+        return available or candidates
+
+    def servers(self):
+        """Серверы в порядке попытки отправки: [(SmtpSettings, CircuitBreaker)]."""
+        return [(smtp_settings, breaker) for smtp_settings, _, breaker in self._candidates()]
+
+    def _send(self, send, items):
+        items = list(items)
+        sent = 0
+        error = None
+        for _, manager, breaker in self._candidates():
+            started = time.perf_counter()
+            try:
+                count = send(manager, items)
+            except PartialDeliveryError as exc:
+                # Сервер принял часть писем: следующему передаётся только остаток
+                sent += exc.sent
+                items = exc.unsent
+                error = exc.error
+            except (RateLimitExceeded, *DELIVERY_ERRORS) as exc:
+                error = exc
+            else:
+                breaker.record_success((time.perf_counter() - started) * 1000 / max(count, 1))
+                return sent + count
+            if isinstance(error, smtplib.SMTPRecipientsRefused):
+                # Адрес отклонён: другой сервер его тоже не примет
+                break
+            if not isinstance(error, RateLimitExceeded):
+                breaker.record_failure()
+        if sent:
+            raise PartialDeliveryError(error, sent, items) from error
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            raise error
+        raise SmtpServersUnavailable(f'SMTP-серверы недоступны: {error!r}') from error
+
+    def send_messages(self, messages):
+        """Отправляет письма через один из серверов пула."""
+        return self._send(lambda manager, messages: manager.send_messages(messages), messages)
+
+    def send_mass_mail(self, datatuple):
+        """Отправляет письма (subject, message, html_message, recipient_list) за один проход."""
+        return self._send(lambda manager, datatuple: manager.send_mass_mail(datatuple), datatuple)
+
+    def send_mail(self, subject, message, recipient_list, html_message=None):
+        """Аналог django.core.mail.send_mail с отправителем из настроек сервера."""
+        return self.send_mass_mail([(subject, message, html_message, recipient_list)])
+
+    def health(self):
+        """Состояние серверов процесса: {ключ: (открыт ли breaker, ошибок подряд, задержка)}."""
+        return {
+            key: (breaker.is_open, breaker.failures, breaker.latency_ms)
+            for key, breaker in self._breakers.items()
+        }
+
+    def invalidate(self):
+        """Закрывает соединения: следующая отправка подключится заново."""
+        with self._lock:
+            for manager in self._managers.values():
+                manager.close()
+
+    close = invalidate
+
+    def reset(self):
+        """Забывает соединения без закрытия (после fork они принадлежат родителю)."""
+        self._lock = threading.Lock()
+        self._managers = {}
+        self._breakers = {}
+        self._current = {}
+
+
+connections = SmtpPool()
+
+
+def send_mail(subject, message, recipient_list, html_message=None):
+    """Отправка письма через пул SMTP-серверов текущего процесса."""
+    return connections.send_mail(subject, message, recipient_list, html_message=html_message)
+
+
+@worker_process_init.connect
+def _reset_after_fork(**kwargs):
+    # Соединение родительского процесса не должно использоваться дочерними
+    connections.reset()
+
+
+@worker_process_shutdown.connect
+def _close_on_shutdown(**kwargs):
+    connections.close()
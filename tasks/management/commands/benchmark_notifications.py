@@ -0,0 +1,179 @@
+import email
+import re
+import time
+from datetime import timedelta
+
+from celery import current_app
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from tasks import mail, outbox
+from tasks.models import Comment, Department, EmailConfiguration, Task, User
+
+from .benchmark_smtp import SMTP_BACKEND, SinkHandler
+
+MARKER = re.compile(rb'\[bench:([tc]\d+)\]')
+
+
+class TimingSinkHandler(SinkHandler):
+    """Сервер-приёмник, запоминающий момент принятия DATA для каждого события."""
+
+    def __init__(self, handshake_delay, data_delay=0):
+        super().__init__(handshake_delay, data_delay)
+        self.accepted = []
+
+    async def handle_DATA(self, server, session, envelope):
+        response = await super().handle_DATA(server, session, envelope)
+        accepted_at = time.perf_counter()
+        message = email.message_from_bytes(envelope.original_content)
+        body = b''.join(
+            part.get_payload(decode=True) or b''
+            for part in message.walk()
+            if part.get_content_type() == 'text/plain'
+        )
+        markers = MARKER.findall(body)
+        # Письмо о комментарии содержит и маркер задачи: событие — комментарий
+        comments = [marker for marker in markers if marker.startswith(b'c')]
+        marker = (comments or markers or [b''])[0].decode()
+        self.accepted.append((marker, accepted_at))
+        return response
+
+
+class QueryCounter:
+    """Считает SQL-запросы через connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[round(percent / 100 * (len(ordered) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет путь уведомления от сохранения задачи или комментария до приёма письма '
+        'SMTP-сервером: post_save → outbox → задача Celery (eager) → SMTP. '
+        'Данные создаются в транзакции и откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=100, help='Число задач')
+        parser.add_argument('--comments', type=int, default=500, help='Число комментариев')
+        parser.add_argument(
+            '--handshake-delay', type=float, default=0,
+            help='Задержка установления соединения, мс',
+        )
+        parser.add_argument(
+            '--data-delay', type=float, default=0,
+            help='Задержка ответа сервера на письмо, мс',
+        )
+        parser.add_argument('--port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise CommandError('Для бенчмарка нужен пакет aiosmtpd (pip install aiosmtpd)')
+
+        handler = TimingSinkHandler(
+            options['handshake_delay'] / 1000, options['data_delay'] / 1000
+        )
+        controller = Controller(handler, hostname='127.0.0.1', port=options['port'])
+        controller.start()
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        try:
+            with override_settings(
+                EMAIL_BACKEND=SMTP_BACKEND,
+                EMAIL_RATE_LIMIT_PER_SECOND=0,
+                COMMENT_NOTIFICATION_DIGEST=False,
+            ):
+                self.run(handler, options)
+        finally:
+            current_app.conf.task_always_eager = eager
+            mail.connections.invalidate()
+            controller.stop()
+
+    def run(self, handler, options):
+        saved_at = {}
+        save_queries = QueryCounter()
+        delivery_queries = QueryCounter()
+        with transaction.atomic():
+            # Единственный активный сервер — локальный приёмник
+            EmailConfiguration.objects.update(is_active=False)
+            EmailConfiguration.objects.create(
+                smtp_host='127.0.0.1',
+                smtp_port=options['port'],
+                use_tls=False,
+                from_email='benchmark@kgok.ru',
+            )
+            department = Department.objects.create(
+                name='Служба бенчмарка', email='benchmark-service@kgok.ru'
+            )
+            author = User.objects.create(username='benchmark-author', email='author@kgok.ru')
+            commenter = User.objects.create(
+                username='benchmark-worker', email='worker@kgok.ru', department=department
+            )
+            outbox.relay_all()
+            handler.accepted.clear()
+            handler.received = 0
+
+            def deliver(marker, save):
+                saved_at[marker] = time.perf_counter()
+                with connection.execute_wrapper(save_queries):
+                    save()
+                with connection.execute_wrapper(delivery_queries):
+                    outbox.relay()
+
+            started = time.perf_counter()
+            tasks = []
+            for number in range(options['tasks']):
+                task = Task(
+                    title=f'Задача бенчмарка [bench:t{number}]',
+                    description='Проверка пропускной способности уведомлений',
+                    assigned_to=department,
+                    assigned_by=author,
+                    due_date=timezone.now() + timedelta(days=7),
+                )
+                deliver(f't{number}', task.save)
+                tasks.append(task)
+            for number in range(options['comments'] if tasks else 0):
+                comment = Comment(
+                    task=tasks[number % len(tasks)],
+                    user=commenter,
+                    content=f'Комментарий бенчмарка [bench:c{number}]',
+                )
+                deliver(f'c{number}', comment.save)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        events = len(saved_at)
+        latencies = {'t': [], 'c': []}
+        for marker, accepted_at in handler.accepted:
+            if marker in saved_at:
+                latencies[marker[0]].append((accepted_at - saved_at[marker]) * 1000)
+        emails = sum(len(values) for values in latencies.values())
+        self.stdout.write(
+            f'Событий: {events}, писем принято: {emails} из {handler.received} за {elapsed:.2f} с '
+            f'({events / elapsed:.0f} событий/с, {emails / elapsed:.0f} писем/с)'
+        )
+        for kind, title in (('t', 'Задача'), ('c', 'Комментарий')):
+            values = latencies[kind]
+            if values:
+                self.stdout.write(
+                    f'{title}: save() → DATA p50 {percentile(values, 50):.1f} мс, '
+                    f'p99 {percentile(values, 99):.1f} мс, max {max(values):.1f} мс'
+                )
+        if events and emails:
+            self.stdout.write(
+                f'SQL-запросов: при сохранении {save_queries.count / events:.1f} на событие, '
+                f'при доставке {delivery_queries.count / emails:.1f} на письмо'
+            )
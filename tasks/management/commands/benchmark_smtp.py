@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.async_mail import deliver_async
+from tasks.mail import EmailConnectionManager, SmtpSettings
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class SinkHandler:
+    """Принимает письма и не сохраняет их; задержка EHLO имитирует TLS и AUTH,
+    задержка DATA — время ответа реального сервера на письмо."""
+
+    def __init__(self, handshake_delay, data_delay=0):
+        self.handshake_delay = handshake_delay
+        self.data_delay = data_delay
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.data_delay)
+        self.received += 1
+        return '250 OK'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает отправку писем с новым SMTP-соединением на письмо, с общим соединением '
+        'и параллельную отправку через asyncio'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument(
+            '--handshake-delay', type=float, default=20,
+            help='Задержка установления соединения, мс (TLS и AUTH реального сервера)',
+        )
+        parser.add_argument(
+            '--data-delay', type=float, default=5,
+            help='Задержка ответа сервера на письмо, мс',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Число SMTP-соединений при параллельной отправке',
+        )
+        parser.add_argument('--port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise CommandError('Для бенчмарка нужен пакет aiosmtpd (pip install aiosmtpd)')
+
+        handler = SinkHandler(options['handshake_delay'] / 1000, options['data_delay'] / 1000)
+        controller = Controller(handler, hostname='127.0.0.1', port=options['port'])
+        controller.start()
+        smtp_settings = SmtpSettings(
+            '127.0.0.1', options['port'], '', '', False, 'benchmark@kgok.ru'
+        )
+        count = options['messages']
+        try:
+            def per_message():
+                for number in range(count):
+                    connection = get_connection(
+                        backend=SMTP_BACKEND, host=smtp_settings.host, port=smtp_settings.port,
+                        username='', password='', use_tls=False,
+                    )
+                    EmailMultiAlternatives(
+                        f'Письмо {number}', 'Текст', smtp_settings.from_email,
+                        ['service@kgok.ru'], connection=connection,
+                    ).send()
+
+            manager = EmailConnectionManager(
+                load_settings=lambda: smtp_settings, backend=SMTP_BACKEND, rate_limit=False
+            )
+
+            def reused():
+                for number in range(count):
+                    manager.send_mail(f'Письмо {number}', 'Текст', ['service@kgok.ru'])
+                manager.close()
+
+            def concurrent():
+                messages = [
+                    EmailMultiAlternatives(
+                        f'Письмо {number}', 'Текст', smtp_settings.from_email, ['service@kgok.ru']
+                    )
+                    for number in range(count)
+                ]
+                failed = asyncio.run(
+                    deliver_async(messages, smtp_settings, options['concurrency'])
+                )
+                if failed:
+                    raise CommandError(f'Не отправлено писем: {len(failed)}')
+
+            modes = (
+                ('Соединение на письмо', per_message),
+                ('Общее соединение', reused),
+                (f'asyncio, соединений: {options["concurrency"]}', concurrent),
+            )
+            for title, run in modes:
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{title}: {count} писем за {elapsed:.2f} с '
+                    f'({count / elapsed:.0f} писем/с, {elapsed / count * 1000:.2f} мс на письмо)'
+                )
+            self.stdout.write(
+                f'Сервер принял {handler.received} писем, соединений общего менеджера: '
+                f'{manager.opened}'
+            )
+        finally:
+            controller.stop()
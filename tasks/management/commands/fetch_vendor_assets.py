@@ -0,0 +1,47 @@
+import base64
+import hashlib
+import urllib.request
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Сторонние файлы фронтенда: версия зафиксирована точно, обновление — правкой
+# этого списка и пересборкой образа
+TOM_SELECT_VERSION = '2.3.1'
+TOM_SELECT_URL = f'https://cdn.jsdelivr.net/npm/tom-select@{TOM_SELECT_VERSION}/dist'
+VENDOR_DIR = Path(__file__).resolve().parents[2] / 'static' / 'tasks' / 'vendor'
+ASSETS = {
+    f'tom-select/{name}': f'{TOM_SELECT_URL}/{path}'
+    for name, path in (
+        ('tom-select.complete.min.js', 'js/tom-select.complete.min.js'),
+        ('tom-select.bootstrap5.min.css', 'css/tom-select.bootstrap5.min.css'),
+    )
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает сторонние JS/CSS фронтенда в tasks/static/tasks/vendor'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true', help='Перезаписать уже загруженные файлы'
+        )
+        parser.add_argument('--timeout', type=float, default=30.0, help='Таймаут загрузки, с')
+
+    def handle(self, *args, **options):
+        for name, url in ASSETS.items():
+            target = VENDOR_DIR / name
+            if target.exists() and not options['force']:
+                self.stdout.write(f'{name}: уже загружен')
+                continue
+            try:
+                with urllib.request.urlopen(url, timeout=options['timeout']) as response:
+                    content = response.read()
+            except OSError as exc:
+                raise CommandError(f'Не удалось загрузить {url}: {exc}') from exc
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+            # Хэш в формате Subresource Integrity — для сверки с опубликованным
+            digest = base64.b64encode(hashlib.sha384(content).digest()).decode()
+            self.stdout.write(f'{name}: {len(content)} байт, sha384-{digest}')
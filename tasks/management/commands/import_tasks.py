@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import importer
+from tasks.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импортирует задачи из файла CSV или XLSX (план работ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv или .xlsx; первая строка — заголовок')
+        parser.add_argument(
+            '--author',
+            help='Логин автора для строк без столбца «Автор»',
+        )
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            try:
+                author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {options["author"]} не найден')
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                created = importer.import_tasks(
+                    importer.read_rows(file, options['path']), default_author=author
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except importer.TaskImportError as exc:
+            raise CommandError('Файл не импортирован:\n' + '\n'.join(exc.errors))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Импортировано задач: {len(created)} за {time.perf_counter() - started:.1f} с'
+            )
+        )
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Aggregate, Count, FloatField, Q
+from django.utils import timezone
+
+from tasks.models import DeliveryAttempt
+
+PERCENTILES = (0.5, 0.95, 0.99)
+# Поле журнала попыток и подпись в отчёте
+FIELDS = (
+    ('duration_ms', 'всего'),
+    ('queue_wait_ms', 'очередь'),
+    ('db_ms', 'БД'),
+    ('render_ms', 'рендеринг'),
+    ('smtp_ms', 'SMTP'),
+)
+
+
+class Percentile(Aggregate):
+    function = 'percentile_cont'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=fraction, **extra)
+
+
+class Command(BaseCommand):
+    help = 'Выводит перцентили времени доставки уведомлений по журналу попыток'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='За сколько последних часов')
+        parser.add_argument('--task-name', help='Только попытки указанной задачи Celery')
+
+    def handle(self, *args, **options):
+        attempts = DeliveryAttempt.objects.filter(
+            created_at__gte=timezone.now() - timedelta(hours=options['hours'])
+        )
+        if options['task_name']:
+            attempts = attempts.filter(task_name=options['task_name'])
+        aggregates = {
+            f'{field}_{int(fraction * 100)}': Percentile(field, fraction)
+            for field, _label in FIELDS
+            for fraction in PERCENTILES
+        }
+        rows = (
+            attempts.values('task_name')
+            .annotate(
+                total=Count('id'),
+                **{
+                    outcome: Count('id', filter=Q(outcome=outcome))
+                    for outcome in DeliveryAttempt.Outcome.values
+                },
+                **aggregates,
+            )
+            .order_by('task_name')
+        )
+        header = ', '.join(f'p{int(fraction * 100)}' for fraction in PERCENTILES)
+        for row in rows:
+            outcomes = ', '.join(
+                f'{label.lower()} {row[outcome]}'
+                for outcome, label in DeliveryAttempt.Outcome.choices
+            )
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(f"{row['task_name']}: попыток {row['total']}")
+                + f' ({outcomes})'
+            )
+            for field, label in FIELDS:
+                values = [row[f'{field}_{int(fraction * 100)}'] for fraction in PERCENTILES]
+                if values[0] is None:
+                    continue
+                formatted = ' / '.join(f'{value:.1f}' for value in values)
+                self.stdout.write(f'  {label} ({header}), мс: {formatted}')
+        if not rows:
+            self.stdout.write('Попыток доставки за период нет')
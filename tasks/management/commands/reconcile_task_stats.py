@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tasks import cache
+from tasks.models import DepartmentTaskStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу статистики задач по службам с нуля'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчет статистики задач...')
+        rows = DepartmentTaskStats.objects.rebuild()
+        cache.bump_all()
+        self.stdout.write(self.style.SUCCESS(f'Статистика пересчитана: {len(rows)} строк.'))
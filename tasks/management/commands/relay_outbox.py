@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks import outbox
+
+
+class Command(BaseCommand):
+    help = 'Публикует в брокер задачи, накопленные в outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument(
+            '--loop', action='store_true', help='Работать постоянно, опрашивая outbox'
+        )
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза опроса, с')
+
+    def handle(self, *args, **options):
+        while True:
+            published = outbox.relay_all(options['batch_size'])
+            if published or not options['loop']:
+                self.stdout.write(f'Опубликовано сообщений outbox: {published}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tasks import outbox
+from tasks.models import DeadLetter
+
+
+class Command(BaseCommand):
+    help = 'Повторно отправляет уведомления, не доставленные после всех повторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='ID записей (по умолчанию все)')
+        parser.add_argument('--task-name', help='Только уведомления указанной задачи Celery')
+
+    def handle(self, *args, **options):
+        letters = DeadLetter.objects.all()
+        if options['ids']:
+            letters = letters.filter(pk__in=options['ids'])
+        if options['task_name']:
+            letters = letters.filter(task_name=options['task_name'])
+        count = outbox.replay_dead_letters(letters)
+        self.stdout.write(self.style.SUCCESS(f'Поставлено в очередь повторно: {count}'))
@@ -1,17 +1,73 @@
 import datetime
+import os
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils import timezone
 
+from tasks import demo_data
 from tasks.models import Department, EmailConfiguration, Task, User
 
 
 class Command(BaseCommand):
     help = 'Инициализирует демо-данные для системы управления задачами'
 
-    @transaction.atomic
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            action='store_true',
+            help='Сгенерировать данные промышленного объёма для проверки производительности',
+        )
+        defaults = demo_data.Volume()
+        parser.add_argument('--departments', type=int, default=defaults.departments)
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--tasks', type=int, default=defaults.tasks)
+        parser.add_argument('--comments', type=int, default=defaults.comments)
+        parser.add_argument(
+            '--days', type=int, default=defaults.days, help='Глубина истории задач, дней'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=50_000, help='Задач в пачке COPY')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Параллельно загружаемых пачек (процессов)',
+        )
+
     def handle(self, *args, **options):
+        if options['scale']:
+            self.handle_scale(options)
+        else:
+            self.handle_demo()
+
+    def handle_scale(self, options):
+        volume = demo_data.Volume(
+            departments=options['departments'],
+            users=options['users'],
+            tasks=options['tasks'],
+            comments=options['comments'],
+            days=options['days'],
+        )
+        self.stdout.write(f'Генерация данных: {volume}...')
+        tasks, comments = demo_data.generate(
+            volume,
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Создано задач: {tasks}, комментариев: {comments}')
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пользователи: user00001..user{volume.users:05d} / {demo_data.PASSWORD}'
+            )
+        )
+
+    @transaction.atomic
+    def handle_demo(self):
         self.stdout.write('Начало инициализации демо-данных...')
 
         # Создание служб
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Выводит самые тяжёлые запросы из pg_stat_statements и их планы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order', choices=sorted(slow_queries.ORDERINGS), default='total',
+            help='Сортировка по суммарному (total) или среднему (mean) времени',
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--source', help='Источник, например view=task_list или task=...')
+        parser.add_argument('--explain', type=int, metavar='QUERYID',
+                            help='Выполнить EXPLAIN (ANALYZE, BUFFERS) запроса')
+        parser.add_argument('--param', action='append', default=[],
+                            help='Значение $1, $2, ... для --explain (по порядку)')
+        parser.add_argument('--reset', action='store_true', help='Сбросить статистику')
+
+    def handle(self, *args, **options):
+        try:
+            if options['reset']:
+                slow_queries.reset()
+                self.stdout.write(self.style.SUCCESS('Статистика pg_stat_statements сброшена'))
+            elif options['explain']:
+                self.explain(options['explain'], options['param'])
+            else:
+                self.report(options['order'], options['limit'], options['source'])
+        except slow_queries.SlowQueryError as exc:
+            raise CommandError(exc) from exc
+
+    def report(self, order, limit, source):
+        statements = slow_queries.top_statements(order, limit, source)
+        for statement in statements:
+            hit_ratio = statement.hit_ratio
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{statement.queryid} [{statement.source or "?"}]: '
+                f'всего {statement.total_ms:.1f} мс, в среднем {statement.mean_ms:.2f} мс, '
+                f'вызовов {statement.calls}, строк {statement.rows}'
+                + (f', кэш {hit_ratio:.0%}' if hit_ratio is not None else '')
+            ))
+            self.stdout.write(f"  {' '.join(statement.query.split())}")
+        if not statements:
+            self.stdout.write('Запросов не найдено')
+
+    def explain(self, queryid, values):
+        statement = slow_queries.get_statement(queryid)
+        if statement is None:
+            raise CommandError(f'Запрос {queryid} не найден в pg_stat_statements')
+        if len(values) < statement.parameter_count:
+            raise CommandError(
+                f'Запросу нужно значений --param: {statement.parameter_count}\n{statement.query}'
+            )
+        self.stdout.write(statement.query)
+        self.stdout.write(slow_queries.explain(statement.query, values))
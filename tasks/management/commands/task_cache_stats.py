@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tasks.cache import cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Выводит счетчики попаданий и промахов кэша страниц задач'
+
+    def handle(self, *args, **options):
+        for scope, counters in cache_stats().items():
+            requests = counters['hits'] + counters['misses']
+            ratio = counters['hits'] / requests * 100 if requests else 0
+            self.stdout.write(
+                f"{scope}: попаданий {counters['hits']}, промахов {counters['misses']} "
+                f"({ratio:.1f}% попаданий)"
+            )
@@ -0,0 +1,252 @@
+"""Метрики приложения в формате Prometheus.
+
+Метрики копятся в памяти процесса: наблюдение — поиск корзины и сложение
+под коротким локом, без запросов к БД и кэшу. Эндпоинт /metrics копирует
+значения под локом и форматирует текст уже без него, поэтому частый опрос
+не задерживает обработку запросов. Каждый воркер gunicorn отдаёт свои
+значения; воркер Celery суммирует снимки процессов пула (worker_metrics).
+"""
+import hmac
+import ipaddress
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+from django.template.backends.django import Template as BaseTemplate
+from django.template.backends.django import reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Остальные методы попадают в метку method="other", чтобы число рядов было ограничено
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+
+def authorized(remote_addr, headers):
+    """Можно ли отдать метрики на запрос с адреса remote_addr и заголовками headers.
+
+    При заданном METRICS_TOKEN нужен заголовок Authorization: Bearer <токен>.
+    Без токена метрики отдаются только прямым запросам (без X-Forwarded-For,
+    то есть не через Nginx) из сетей METRICS_ALLOWED_NETWORKS.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        return hmac.compare_digest(headers.get('Authorization', ''), f'Bearer {token}')
+    if headers.get('X-Forwarded-For'):
+        return False
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    address = getattr(address, 'ipv4_mapped', None) or address
+    return any(
+        address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: self._copy(value) for labels, value in self.series.items()}
+
+    def _copy(self, value):
+        return value
+
+    def render(self, snapshots=None):
+        """Строки экспозиции; snapshots — снимки Registry.snapshot() других процессов."""
+        if snapshots is None:
+            series = self.snapshot()
+        else:
+            series = {}
+            for snapshot in snapshots:
+                for labels, value in snapshot.get(self.name, ()):
+                    self._merge(series, tuple(labels), value)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labels, value in sorted(series.items()):
+            lines.extend(self._render_series(labels, value))
+        return lines
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+    type = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def _merge(self, series, labels, value):
+        series[labels] = series.get(labels, 0) + value
+
+    def _render_series(self, labels, value):
+        yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами (le — верхняя граница включительно)."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Счётчики по корзинам (последняя — +Inf) и сумма
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+    def _merge(self, series, labels, value):
+        current = series.get(labels)
+        if current is None:
+            series[labels] = self._copy(value)
+        else:
+            current[0] = [a + b for a, b in zip(current[0], value[0])]
+            current[1] += value[1]
+
+    def _render_series(self, labels, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            cumulative += count
+            le = _labels(self.labelnames, labels, [('le', _number(bound))])
+            yield f'{self.name}_bucket{le} {cumulative}'
+        yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}'
+        yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """Значения всех метрик в виде, пригодном для JSON."""
+        return {
+            metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for metric in self.metrics
+        }
+
+    def render(self, snapshots=None):
+        """Текст для Prometheus: значения процесса или сумма снимков snapshots."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(snapshots))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    'kapantask_http_requests_total', 'Число HTTP-запросов', ('view', 'method', 'status'),
+))
+http_request_duration = REGISTRY.register(Histogram(
+    'kapantask_http_request_duration_seconds', 'Время обработки HTTP-запроса',
+    ('view', 'method'),
+))
+http_sql_queries = REGISTRY.register(Histogram(
+    'kapantask_http_request_sql_queries', 'Число SQL-запросов на HTTP-запрос', ('view',),
+    buckets=QUERY_COUNT_BUCKETS,
+))
+http_sql_duration = REGISTRY.register(Counter(
+    'kapantask_http_sql_seconds_total', 'Суммарное время SQL-запросов', ('view',),
+))
+http_template_duration = REGISTRY.register(Counter(
+    'kapantask_http_template_render_seconds_total', 'Суммарное время рендеринга шаблонов',
+    ('view',),
+))
+
+
+class RequestStats:
+    """Показатели одного запроса: SQL и рендеринг шаблонов."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        # Глубина вложенных рендерингов: время считается только у внешнего
+        self.template_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += perf_counter() - started
+            self.queries += 1
+
+
+current_request = ContextVar('kapantask_request_stats', default=None)
+
+
+class Template(BaseTemplate):
+    """Шаблон, время рендеринга которого учитывается в текущем запросе."""
+
+    def render(self, context=None, request=None):
+        stats = current_request.get()
+        if stats is None or stats.template_depth:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            stats.template_seconds += perf_counter() - started
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """Бэкенд шаблонов Django с учётом времени рендеринга.
+
+    Вложенные шаблоны ({% include %}, {% extends %}) рендерятся движком внутри
+    внешнего. Шаблоны, полученные через get_template() во время рендеринга
+    (теги django_bootstrap5, рендерер форм), тоже учитываются только во
+    внешнем: Template считает время лишь на нулевой глубине RequestStats.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
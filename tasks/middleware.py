@@ -0,0 +1,71 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import metrics, sqlcomments
+
+UNRESOLVED = '<unresolved>'
+
+
+class MetricsMiddleware:
+    """Время ответа, число и время SQL-запросов и время шаблонов по имени URL.
+
+    Стоит первым в MIDDLEWARE, чтобы учитывать и остальные middleware.
+    Для потоковых ответов учитывается время до отдачи заголовков.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        started = perf_counter()
+        try:
+            with connection.execute_wrapper(stats.execute_wrapper):
+                response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        elapsed = perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        if view in settings.METRICS_EXCLUDED_VIEWS:
+            return response
+        method = request.method if request.method in metrics.HTTP_METHODS else 'other'
+        metrics.http_requests.inc((view, method, str(response.status_code)))
+        metrics.http_request_duration.observe((view, method), elapsed)
+        metrics.http_sql_queries.observe((view,), stats.queries)
+        metrics.http_sql_duration.inc((view,), stats.sql_seconds)
+        metrics.http_template_duration.inc((view,), stats.template_seconds)
+        return response
+
+
+class QueryCommentMiddleware:
+    """Дописывает в SQL-запросы представления комментарий с его именем URL.
+
+    Имя известно только после разрешения URL, поэтому комментарий задаётся в
+    process_view; запросы middleware до этого идут без комментария.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_COMMENTS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = sqlcomments.current_source.set(None)
+        try:
+            with connection.execute_wrapper(sqlcomments.execute_wrapper):
+                return self.get_response(request)
+        finally:
+            sqlcomments.current_source.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sqlcomments.current_source.set(
+            sqlcomments.comment('view', request.resolver_match.view_name)
+        )
@@ -0,0 +1,100 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def populate_department_task_stats(apps, schema_editor):
+    """Заполняет счётчики по уже существующим задачам."""
+    Department = apps.get_model("tasks", "Department")
+    DepartmentTaskStats = apps.get_model("tasks", "DepartmentTaskStats")
+    Task = apps.get_model("tasks", "Task")
+
+    now = timezone.now()
+    rows = [
+        DepartmentTaskStats(department_id=department_id, status=status, count=count)
+        for department_id, status, count in Task.objects.order_by()
+        .values("assigned_to", "status")
+        .annotate(count=Count("id"))
+        .values_list("assigned_to", "status", "count")
+    ]
+    overdue = dict(
+        Task.objects.order_by()
+        .exclude(status="completed")
+        .filter(due_date__lt=now)
+        .values("assigned_to")
+        .annotate(count=Count("id"))
+        .values_list("assigned_to", "count")
+    )
+    rows += [
+        DepartmentTaskStats(
+            department_id=department_id,
+            status="overdue",
+            count=overdue.get(department_id, 0),
+            refreshed_at=now,
+        )
+        for department_id in Department.objects.values_list("id", flat=True)
+    ]
+    DepartmentTaskStats.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DepartmentTaskStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("new", "Новая"),
+                            ("in_progress", "В Работе"),
+                            ("completed", "Выполнена"),
+                            ("postponed", "Отложена"),
+                            ("overdue", "Просрочена"),
+                        ],
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0, verbose_name="Количество")),
+                (
+                    "refreshed_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Пересчитано"),
+                ),
+                (
+                    "department",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="task_stats",
+                        to="tasks.department",
+                        verbose_name="Служба",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика службы",
+                "verbose_name_plural": "Статистика служб",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("department", "status"),
+                        name="unique_department_task_stats",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_department_task_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись в большие таблицы
+    atomic = False
+
+    dependencies = [
+        ("tasks", "0003_task_ordering"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["assigned_to", "status"], name="task_assigned_status_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["assigned_to", "-created_at", "-id"],
+                name="task_assigned_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(fields=["-created_at", "-id"], name="task_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["due_date"],
+                name="task_open_due_date_idx",
+                condition=~models.Q(status="completed"),
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="comment",
+            index=models.Index(
+                fields=["task", "created_at"], name="comment_task_created_idx"
+            ),
+        ),
+        # Одиночные индексы внешних ключей покрываются составными индексами выше
+        migrations.AlterField(
+            model_name="task",
+            name="assigned_to",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="assigned_tasks",
+                to="tasks.department",
+                verbose_name="Назначена службе",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="task",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="comments",
+                to="tasks.task",
+                verbose_name="Задача",
+            ),
+        ),
+    ]
@@ -0,0 +1,102 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# Вектор задачи: название (вес A), описание (B) и текст всех комментариев (C)
+CREATE_TRIGGERS = """
+CREATE FUNCTION tasks_task_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(content, ' ' ORDER BY created_at)
+            FROM tasks_comment
+            WHERE task_id = NEW.id
+        ), '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_task_search_vector
+    BEFORE INSERT OR UPDATE OF title, description ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_search_vector_update();
+
+-- Изменение комментариев пересчитывает вектор задачи; триггеры уровня
+-- оператора, чтобы массовые вставки обновляли каждую задачу один раз
+CREATE FUNCTION tasks_comment_search_vector_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE tasks_task SET title = title
+        WHERE id IN (SELECT task_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE tasks_task SET title = title
+        WHERE id IN (SELECT task_id FROM new_rows UNION SELECT task_id FROM old_rows);
+    ELSE
+        UPDATE tasks_task SET title = title
+        WHERE id IN (SELECT task_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_comment_search_insert
+    AFTER INSERT ON tasks_comment
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tasks_comment_search_vector_refresh();
+
+CREATE TRIGGER tasks_comment_search_update
+    AFTER UPDATE ON tasks_comment
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tasks_comment_search_vector_refresh();
+
+CREATE TRIGGER tasks_comment_search_delete
+    AFTER DELETE ON tasks_comment
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tasks_comment_search_vector_refresh();
+
+-- Заполнение вектора для существующих задач
+UPDATE tasks_task SET title = title;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS tasks_comment_search_delete ON tasks_comment;
+DROP TRIGGER IF EXISTS tasks_comment_search_update ON tasks_comment;
+DROP TRIGGER IF EXISTS tasks_comment_search_insert ON tasks_comment;
+DROP FUNCTION IF EXISTS tasks_comment_search_vector_refresh();
+DROP TRIGGER IF EXISTS tasks_task_search_vector ON tasks_task;
+DROP FUNCTION IF EXISTS tasks_task_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("tasks", "0004_task_comment_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name="Поисковый вектор"
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        AddIndexConcurrently(
+            model_name="task",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="task_search_vector_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="comment",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector("content", config="russian"),
+                name="comment_search_idx",
+            ),
+        ),
+    ]
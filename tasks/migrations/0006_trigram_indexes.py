@@ -0,0 +1,67 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись в большие таблицы
+    atomic = False
+
+    dependencies = [
+        ("tasks", "0005_task_search"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Индексы по UPPER(...) используются фильтрами icontains (автодополнение, поиск в админке)
+        AddIndexConcurrently(
+            model_name="department",
+            index=GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="department_name_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="department",
+            index=GinIndex(
+                OpClass(Upper("email"), name="gin_trgm_ops"),
+                name="department_email_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(
+                OpClass(Upper("username"), name="gin_trgm_ops"),
+                name="user_username_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(
+                OpClass(Upper("first_name"), name="gin_trgm_ops"),
+                name="user_first_name_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(
+                OpClass(Upper("last_name"), name="gin_trgm_ops"),
+                name="user_last_name_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(
+                OpClass(Upper("email"), name="gin_trgm_ops"),
+                name="user_email_trgm_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=GinIndex(
+                OpClass(Upper("title"), name="gin_trgm_ops"),
+                name="task_title_trgm_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0006_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingCommentNotification",
+            fields=[
+                (
+                    "comment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="pending_notification",
+                        serialize=False,
+                        to="tasks.comment",
+                        verbose_name="Комментарий",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата постановки в очередь"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Комментарий в очереди сводки",
+                "verbose_name_plural": "Комментарии в очереди сводки",
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0007_pending_comment_notification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("task_name", models.CharField(max_length=200, verbose_name="Задача Celery")),
+                ("args", models.JSONField(default=list, verbose_name="Аргументы")),
+                (
+                    "key",
+                    models.CharField(
+                        max_length=200, unique=True, verbose_name="Ключ дедупликации"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "published_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Дата публикации"),
+                ),
+                (
+                    "delivered_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Дата обработки"),
+                ),
+            ],
+            options={
+                "verbose_name": "Сообщение outbox",
+                "verbose_name_plural": "Сообщения outbox",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("published_at__isnull", True)),
+                        fields=["id"],
+                        name="outbox_unpublished_idx",
+                    ),
+                    models.Index(fields=["published_at"], name="outbox_published_idx"),
+                ],
+            },
+        ),
+    ]
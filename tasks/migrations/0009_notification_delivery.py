@@ -0,0 +1,101 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0008_outbox_message"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeadLetter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("task_name", models.CharField(max_length=200, verbose_name="Задача Celery")),
+                ("task_id", models.CharField(max_length=255, verbose_name="ID задачи Celery")),
+                ("args", models.JSONField(default=list, verbose_name="Аргументы")),
+                ("error", models.TextField(verbose_name="Ошибка")),
+                ("attempts", models.PositiveIntegerField(verbose_name="Попыток")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата")),
+                (
+                    "replayed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата повторной отправки"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Недоставленное уведомление",
+                "verbose_name_plural": "Недоставленные уведомления",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="SmtpRateBucket",
+            fields=[
+                (
+                    "host",
+                    models.CharField(
+                        max_length=100,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="SMTP сервер",
+                    ),
+                ),
+                ("tokens", models.FloatField(verbose_name="Токены")),
+                (
+                    "granted",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Выдано последним запросом"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(verbose_name="Дата обновления")),
+            ],
+            options={
+                "verbose_name": "Лимит SMTP сервера",
+                "verbose_name_plural": "Лимиты SMTP серверов",
+            },
+        ),
+        migrations.CreateModel(
+            name="DeliveryAttempt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("task_name", models.CharField(max_length=200, verbose_name="Задача Celery")),
+                ("task_id", models.CharField(max_length=255, verbose_name="ID задачи Celery")),
+                ("attempt", models.PositiveIntegerField(verbose_name="Номер попытки")),
+                (
+                    "outcome",
+                    models.CharField(
+                        choices=[("sent", "Отправлено"), ("retry", "Повтор"), ("failed", "Ошибка")],
+                        max_length=10,
+                        verbose_name="Результат",
+                    ),
+                ),
+                (
+                    "duration_ms",
+                    models.FloatField(blank=True, null=True, verbose_name="Длительность, мс"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата")),
+            ],
+            options={
+                "verbose_name": "Попытка доставки",
+                "verbose_name_plural": "Попытки доставки",
+                "indexes": [
+                    models.Index(
+                        fields=["created_at", "outcome"], name="delivery_created_outcome_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0009_notification_delivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailconfiguration",
+            name="weight",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Доля писем, отправляемых через этот сервер",
+                verbose_name="Вес",
+            ),
+        ),
+    ]
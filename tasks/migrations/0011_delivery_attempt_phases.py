@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0010_email_configuration_weight"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deliveryattempt",
+            name="queue_wait_ms",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Ожидание в очереди, мс"
+            ),
+        ),
+        migrations.AddField(
+            model_name="deliveryattempt",
+            name="db_ms",
+            field=models.FloatField(blank=True, null=True, verbose_name="Запросы к БД, мс"),
+        ),
+        migrations.AddField(
+            model_name="deliveryattempt",
+            name="render_ms",
+            field=models.FloatField(blank=True, null=True, verbose_name="Рендеринг, мс"),
+        ),
+        migrations.AddField(
+            model_name="deliveryattempt",
+            name="smtp_ms",
+            field=models.FloatField(blank=True, null=True, verbose_name="Отправка SMTP, мс"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0011_delivery_attempt_phases"),
+    ]
+
+    operations = [
+        # Статистика запросов для отчёта slow_queries; сервер PostgreSQL должен
+        # загружать модуль: shared_preload_libraries = 'pg_stat_statements'.
+        # Создать расширение может только суперпользователь: без прав или без
+        # пакета расширения миграция проходит, а отчёт сообщает, что его нет
+        migrations.RunSQL(
+            """
+            DO $$
+            BEGIN
+                CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
+            EXCEPTION
+                WHEN insufficient_privilege OR undefined_file THEN
+                    RAISE NOTICE 'pg_stat_statements не создано: %', SQLERRM;
+            END
+            $$;
+            """,
+            "DROP EXTENSION IF EXISTS pg_stat_statements",
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0012_pg_stat_statements"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="is_admin",
+            field=models.BooleanField(
+                default=False,
+                help_text="Отдел горного планирования",
+                verbose_name="Администратор",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0013_user_is_admin_help_text"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emailconfiguration",
+            name="weight",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Доля писем, отправляемых через этот сервер",
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="Вес",
+            ),
+        ),
+    ]
@@ -1,9 +1,39 @@
+from collections import Counter
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+)
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+def trigram_index(field, name):
+    """GIN-индекс pg_trgm по UPPER(field): ускоряет icontains и автодополнение."""
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name)
+
+
 class Department(models.Model):
     """Модель для представления службы в системе."""
     name = models.CharField(_('Название службы'), max_length=100)
@@ -12,6 +42,10 @@ class Department(models.Model):
     class Meta:
         verbose_name = _('Служба')
         verbose_name_plural = _('Службы')
+        indexes = [
+            trigram_index('name', 'department_name_trgm_idx'),
+            trigram_index('email', 'department_email_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -33,11 +67,89 @@ class User(AbstractUser):
     class Meta:
         verbose_name = _('Пользователь')
         verbose_name_plural = _('Пользователи')
+        indexes = [
+            trigram_index('username', 'user_username_trgm_idx'),
+            trigram_index('first_name', 'user_first_name_trgm_idx'),
+            trigram_index('last_name', 'user_last_name_trgm_idx'),
+            trigram_index('email', 'user_email_trgm_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.department.name if self.department else 'Без службы'})"
 
 
+TASK_STAT_KEYS = ('total', 'completed', 'in_progress', 'overdue')
+SEARCH_CONFIG = 'russian'
+
+
+def overdue_condition(prefix='', now=None):
+    """Условие просроченности задачи: не выполнена и срок раньше now."""
+    now = now or timezone.now()
+    return ~Q(**{f'{prefix}status': Task.Status.COMPLETED}) & Q(**{f'{prefix}due_date__lt': now})
+
+
+def task_stat_aggregates(prefix='', now=None):
+    """Условные агрегаты для статистики задач (всего, выполнено, в работе, просрочено)."""
+    pk = f'{prefix}id'
+    return {
+        'total': Count(pk),
+        'completed': Count(pk, filter=Q(**{f'{prefix}status': Task.Status.COMPLETED})),
+        'in_progress': Count(pk, filter=Q(**{f'{prefix}status': Task.Status.IN_PROGRESS})),
+        'overdue': Count(pk, filter=overdue_condition(prefix, now)),
+    }
+
+
+class TaskQuerySet(models.QuerySet):
+    """Набор запросов к задачам с методами для списков и статистики дашбордов."""
+
+    def with_overdue(self, now=None):
+        """Аннотирует признак просроченности, вычисленный в БД на один момент now."""
+        return self.annotate(
+            overdue=ExpressionWrapper(overdue_condition(now=now), output_field=BooleanField())
+        )
+
+    def overdue(self, now=None):
+        """Только просроченные задачи (использует частичный индекс по due_date)."""
+        return self.filter(overdue_condition(now=now))
+
+    def search(self, query):
+        """Полнотекстовый поиск по названию, описанию и комментариям с ранжированием."""
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return self.filter(search_vector=search_query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+        )
+
+    def for_list(self, now=None):
+        """Задачи для карточек списка: служба и просроченность тем же запросом."""
+        return self.select_related('assigned_to').only(
+            'title', 'description', 'status', 'due_date', 'created_at',
+            'assigned_to__name',
+        ).with_overdue(now)
+
+    def stats(self, now=None):
+        """Статистика по выборке задач одним агрегирующим запросом."""
+        return self.aggregate(**task_stat_aggregates(now=now))
+
+    def dashboard_stats(self, now=None):
+        """Общая статистика и статистика по службам одним сгруппированным запросом."""
+        departments = Department.objects.annotate(
+            **task_stat_aggregates(prefix='assigned_tasks__', now=now)
+        ).order_by('name')
+        return collect_department_stats(departments)
+
+
+def collect_department_stats(departments):
+    """Собирает общие итоги и построчную статистику из аннотированных служб."""
+    totals = dict.fromkeys(TASK_STAT_KEYS, 0)
+    department_stats = []
+    for department in departments:
+        stats = {key: getattr(department, key) for key in TASK_STAT_KEYS}
+        for key, value in stats.items():
+            totals[key] += value
+        department_stats.append({'department': department, **stats})
+    return totals, department_stats
+
+
 class Task(models.Model):
     """Модель задачи в системе."""
     class Status(models.TextChoices):
@@ -59,6 +171,8 @@ class Task(models.Model):
         on_delete=models.CASCADE,
         verbose_name=_('Назначена службе'),
         related_name='assigned_tasks',
+        # Покрывается составными индексами task_assigned_*
+        db_index=False,
     )
     assigned_by = models.ForeignKey(
         User,
@@ -69,21 +183,292 @@ class Task(models.Model):
     created_at = models.DateTimeField(_('Дата создания'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Дата обновления'), auto_now=True)
     due_date = models.DateTimeField(_('Крайний срок'))
+    # Заполняется триггерами БД из названия, описания и комментариев
+    search_vector = SearchVectorField(_('Поисковый вектор'), null=True, editable=False)
+
+    objects = TaskQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('Задача')
         verbose_name_plural = _('Задачи')
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['assigned_to', 'status'], name='task_assigned_status_idx'),
+            models.Index(
+                fields=['assigned_to', '-created_at', '-id'], name='task_assigned_created_idx'
+            ),
+            models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
+            models.Index(
+                fields=['due_date'],
+                name='task_open_due_date_idx',
+                condition=~Q(status='completed'),
+            ),
+            GinIndex(fields=['search_vector'], name='task_search_vector_idx'),
+            trigram_index('title', 'task_title_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Обработчики post_save обновляют счётчики статистики и пишут outbox:
+        # всё это фиксируется вместе с задачей или не фиксируется вовсе
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def is_overdue(self):
-        """Проверяет, просрочена ли задача."""
+        """Проверяет, просрочена ли задача.
+
+        Для списков используйте аннотацию TaskQuerySet.with_overdue().
+        """
         return self.status != self.Status.COMPLETED and self.due_date < timezone.now()
 
 
+class DepartmentTaskStatsManager(models.Manager):
+    """Поддержка денормализованных счётчиков задач по службам."""
+
+    def watermark(self):
+        """Момент, на который пересчитаны просроченные задачи."""
+        return self.filter(
+            status=DepartmentTaskStats.OVERDUE
+        ).aggregate(value=Max('refreshed_at'))['value']
+
+    def lock_watermark(self, department_ids):
+        """Блокирует счётчики просроченных задач служб и возвращает watermark.
+
+        refresh_overdue блокирует те же строки, поэтому задача, сохраняемая во
+        время пересчёта, либо попадёт в пересчёт, либо увидит новый watermark.
+        Пересчёт ставит refreshed_at всем строкам сразу, поэтому значение
+        заблокированной строки и есть watermark.
+        """
+        refreshed = [
+            value
+            for value in self.select_for_update()
+            .filter(status=DepartmentTaskStats.OVERDUE, department_id__in=department_ids)
+            .order_by('department_id')
+            .values_list('refreshed_at', flat=True)
+            if value
+        ]
+        return max(refreshed) if refreshed else self.watermark()
+
+    def buckets(self, status, due_date, watermark):
+        """Счётчики, в которые попадает задача с указанными статусом и сроком."""
+        buckets = [status]
+        if watermark and status != Task.Status.COMPLETED and due_date < watermark:
+            buckets.append(DepartmentTaskStats.OVERDUE)
+        return buckets
+
+    def adjust(self, department_id, bucket, delta, watermark=None, create=True):
+        """Изменяет счётчик на delta, при необходимости создавая строку."""
+        updated = self.filter(department_id=department_id, status=bucket).update(
+            count=F('count') + delta
+        )
+        if not updated and create:
+            with transaction.atomic():
+                self.get_or_create(
+                    department_id=department_id,
+                    status=bucket,
+                    defaults={
+                        'refreshed_at': watermark if bucket == DepartmentTaskStats.OVERDUE else None
+                    },
+                )
+            self.filter(department_id=department_id, status=bucket).update(
+                count=F('count') + delta
+            )
+
+    def apply_change(self, old, new):
+        """Переносит задачу между счётчиками.
+
+        old и new — кортежи (служба, статус, срок) до и после изменения
+        или None для созданной/удалённой задачи.
+        """
+        if old == new:
+            return
+        with transaction.atomic():
+            watermark = self.lock_watermark([key[0] for key in (old, new) if key])
+            if old:
+                department_id, status, due_date = old
+                for bucket in self.buckets(status, due_date, watermark):
+                    self.adjust(department_id, bucket, -1, create=False)
+            if new:
+                department_id, status, due_date = new
+                for bucket in self.buckets(status, due_date, watermark):
+                    self.adjust(department_id, bucket, 1, watermark)
+
+    def apply_changes(self, changes):
+        """Переносит пачку задач между счётчиками за постоянное число запросов.
+
+        changes — пары (old, new) в формате apply_change.
+        """
+        changes = [(old, new) for old, new in changes if old != new]
+        with transaction.atomic():
+            watermark = self.lock_watermark(
+                {key[0] for change in changes for key in change if key}
+            )
+            deltas = Counter()
+            for old, new in changes:
+                if old:
+                    department_id, status, due_date = old
+                    for bucket in self.buckets(status, due_date, watermark):
+                        deltas[department_id, bucket] -= 1
+                if new:
+                    department_id, status, due_date = new
+                    for bucket in self.buckets(status, due_date, watermark):
+                        deltas[department_id, bucket] += 1
+            deltas = {key: delta for key, delta in deltas.items() if delta}
+            if not deltas:
+                return
+            self.bulk_create(
+                [
+                    DepartmentTaskStats(
+                        department_id=department_id,
+                        status=bucket,
+                        refreshed_at=watermark if bucket == DepartmentTaskStats.OVERDUE else None,
+                    )
+                    for (department_id, bucket), delta in deltas.items()
+                    if delta > 0
+                ],
+                ignore_conflicts=True,
+            )
+            condition = Q()
+            whens = []
+            for (department_id, bucket), delta in deltas.items():
+                match = Q(department_id=department_id, status=bucket)
+                condition |= match
+                whens.append(When(match, then=Value(delta)))
+            self.filter(condition).update(
+                count=F('count') + Case(*whens, output_field=IntegerField())
+            )
+
+    @transaction.atomic
+    def rebuild(self, now=None):
+        """Полностью пересчитывает таблицу по задачам."""
+        now = now or timezone.now()
+        self.all().delete()
+        rows = [
+            DepartmentTaskStats(department_id=department_id, status=status, count=count)
+            for department_id, status, count in Task.objects.order_by()
+            .values('assigned_to', 'status')
+            .annotate(count=Count('id'))
+            .values_list('assigned_to', 'status', 'count')
+        ]
+        overdue = dict(
+            Task.objects.order_by()
+            .overdue(now)
+            .values('assigned_to')
+            .annotate(count=Count('id'))
+            .values_list('assigned_to', 'count')
+        )
+        rows += [
+            DepartmentTaskStats(
+                department_id=department_id,
+                status=DepartmentTaskStats.OVERDUE,
+                count=overdue.get(department_id, 0),
+                refreshed_at=now,
+            )
+            for department_id in Department.objects.values_list('id', flat=True)
+        ]
+        return self.bulk_create(rows)
+
+    @transaction.atomic
+    def refresh_overdue(self, now=None):
+        """Добавляет задачи, ставшие просроченными с момента прошлого пересчёта.
+
+        Возвращает идентификаторы служб, у которых изменился счётчик.
+        """
+        now = now or timezone.now()
+        list(
+            self.select_for_update()
+            .filter(status=DepartmentTaskStats.OVERDUE)
+            .order_by('department_id')
+        )
+        watermark = self.watermark()
+
+        tasks = Task.objects.order_by().overdue(now)
+        if watermark:
+            tasks = tasks.filter(due_date__gte=watermark)
+        else:
+            self.filter(status=DepartmentTaskStats.OVERDUE).delete()
+
+        missing = Department.objects.exclude(
+            task_stats__status=DepartmentTaskStats.OVERDUE
+        ).values_list('id', flat=True)
+        self.bulk_create(
+            [
+                DepartmentTaskStats(department_id=department_id,
+                                    status=DepartmentTaskStats.OVERDUE)
+                for department_id in missing
+            ],
+            ignore_conflicts=True,
+        )
+        changed = []
+        for department_id, count in (
+            tasks.values('assigned_to').annotate(count=Count('id'))
+            .values_list('assigned_to', 'count')
+        ):
+            self.adjust(department_id, DepartmentTaskStats.OVERDUE, count, create=False)
+            changed.append(department_id)
+        self.filter(status=DepartmentTaskStats.OVERDUE).update(refreshed_at=now)
+        return changed
+
+    def dashboard_stats(self):
+        """Общая статистика и статистика по службам из таблицы счётчиков."""
+        departments = Department.objects.annotate(**self._aggregates('task_stats__')).order_by(
+            'name'
+        )
+        return collect_department_stats(departments)
+
+    def department_stats(self, department):
+        """Статистика одной службы из таблицы счётчиков."""
+        return self.filter(department=department).aggregate(**self._aggregates())
+
+    @staticmethod
+    def _aggregates(prefix=''):
+        def total(condition):
+            return Coalesce(Sum(f'{prefix}count', filter=condition), 0)
+
+        return {
+            'total': total(~Q(**{f'{prefix}status': DepartmentTaskStats.OVERDUE})),
+            'completed': total(Q(**{f'{prefix}status': Task.Status.COMPLETED})),
+            'in_progress': total(Q(**{f'{prefix}status': Task.Status.IN_PROGRESS})),
+            'overdue': total(Q(**{f'{prefix}status': DepartmentTaskStats.OVERDUE})),
+        }
+
+
+class DepartmentTaskStats(models.Model):
+    """Счётчик задач службы по статусу, поддерживаемый сигналами."""
+    OVERDUE = 'overdue'
+
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.CASCADE,
+        verbose_name=_('Служба'),
+        related_name='task_stats',
+    )
+    status = models.CharField(
+        _('Статус'),
+        max_length=20,
+        choices=Task.Status.choices + [(OVERDUE, _('Просрочена'))],
+    )
+    count = models.IntegerField(_('Количество'), default=0)
+    refreshed_at = models.DateTimeField(_('Пересчитано'), null=True, blank=True)
+
+    objects = DepartmentTaskStatsManager()
+
+    class Meta:
+        verbose_name = _('Статистика службы')
+        verbose_name_plural = _('Статистика служб')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['department', 'status'], name='unique_department_task_stats'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.department_id}: {self.status} = {self.count}"
+
+
 class Comment(models.Model):
     """Модель комментария к задаче."""
     task = models.ForeignKey(
@@ -91,6 +476,8 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         verbose_name=_('Задача'),
         related_name='comments',
+        # Покрывается индексом comment_task_created_idx
+        db_index=False,
     )
     user = models.ForeignKey(
         User,
@@ -105,10 +492,130 @@ class Comment(models.Model):
         verbose_name = _('Комментарий')
         verbose_name_plural = _('Комментарии')
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['task', 'created_at'], name='comment_task_created_idx'),
+            GinIndex(
+                SearchVector('content', config=SEARCH_CONFIG), name='comment_search_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Комментарий от {self.user.username} к задаче {self.task.title}"
 
+    def save(self, *args, **kwargs):
+        # Сообщение outbox или запись сводки пишется post_save в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class PendingCommentNotification(models.Model):
+    """Комментарий, ожидающий отправки в сводке уведомлений."""
+    comment = models.OneToOneField(
+        Comment,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name=_('Комментарий'),
+        related_name='pending_notification',
+    )
+    created_at = models.DateTimeField(_('Дата постановки в очередь'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Комментарий в очереди сводки')
+        verbose_name_plural = _('Комментарии в очереди сводки')
+
+    def __str__(self):
+        return f"Сводка: комментарий {self.comment_id}"
+
+
+class OutboxMessage(models.Model):
+    """Задача Celery, записанная в транзакции изменения и ожидающая публикации в брокер."""
+    task_name = models.CharField(_('Задача Celery'), max_length=200)
+    args = models.JSONField(_('Аргументы'), default=list)
+    key = models.CharField(_('Ключ дедупликации'), max_length=200, unique=True)
+    created_at = models.DateTimeField(_('Дата создания'), auto_now_add=True)
+    published_at = models.DateTimeField(_('Дата публикации'), null=True, blank=True)
+    delivered_at = models.DateTimeField(_('Дата обработки'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Сообщение outbox')
+        verbose_name_plural = _('Сообщения outbox')
+        indexes = [
+            # Очередь релея: только неопубликованные сообщения
+            models.Index(
+                fields=['id'],
+                name='outbox_unpublished_idx',
+                condition=Q(published_at__isnull=True),
+            ),
+            models.Index(fields=['published_at'], name='outbox_published_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name}{tuple(self.args)}"
+
+
+class DeliveryAttempt(models.Model):
+    """Попытка выполнения задачи отправки уведомления."""
+    class Outcome(models.TextChoices):
+        SENT = 'sent', _('Отправлено')
+        RETRY = 'retry', _('Повтор')
+        FAILED = 'failed', _('Ошибка')
+
+    task_name = models.CharField(_('Задача Celery'), max_length=200)
+    task_id = models.CharField(_('ID задачи Celery'), max_length=255)
+    attempt = models.PositiveIntegerField(_('Номер попытки'))
+    outcome = models.CharField(_('Результат'), max_length=10, choices=Outcome.choices)
+    duration_ms = models.FloatField(_('Длительность, мс'), null=True, blank=True)
+    queue_wait_ms = models.FloatField(_('Ожидание в очереди, мс'), null=True, blank=True)
+    db_ms = models.FloatField(_('Запросы к БД, мс'), null=True, blank=True)
+    render_ms = models.FloatField(_('Рендеринг, мс'), null=True, blank=True)
+    smtp_ms = models.FloatField(_('Отправка SMTP, мс'), null=True, blank=True)
+    error = models.TextField(_('Ошибка'), blank=True)
+    created_at = models.DateTimeField(_('Дата'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Попытка доставки')
+        verbose_name_plural = _('Попытки доставки')
+        indexes = [
+            models.Index(fields=['created_at', 'outcome'], name='delivery_created_outcome_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} #{self.attempt}: {self.outcome}"
+
+
+class DeadLetter(models.Model):
+    """Уведомление, не доставленное после всех повторов."""
+    task_name = models.CharField(_('Задача Celery'), max_length=200)
+    task_id = models.CharField(_('ID задачи Celery'), max_length=255)
+    args = models.JSONField(_('Аргументы'), default=list)
+    error = models.TextField(_('Ошибка'))
+    attempts = models.PositiveIntegerField(_('Попыток'))
+    created_at = models.DateTimeField(_('Дата'), auto_now_add=True)
+    replayed_at = models.DateTimeField(_('Дата повторной отправки'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Недоставленное уведомление')
+        verbose_name_plural = _('Недоставленные уведомления')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.task_name}{tuple(self.args)}: {self.error[:50]}"
+
+
+class SmtpRateBucket(models.Model):
+    """Корзина токенов ограничения отправки для SMTP-сервера, общая для всех воркеров."""
+    host = models.CharField(_('SMTP сервер'), max_length=100, primary_key=True)
+    tokens = models.FloatField(_('Токены'))
+    granted = models.PositiveIntegerField(_('Выдано последним запросом'), default=0)
+    updated_at = models.DateTimeField(_('Дата обновления'))
+
+    class Meta:
+        verbose_name = _('Лимит SMTP сервера')
+        verbose_name_plural = _('Лимиты SMTP серверов')
+
+    def __str__(self):
+        return f"{self.host}: {self.tokens:.1f}"
+
 
 class EmailConfiguration(models.Model):
     """Модель для хранения настроек SMTP сервера."""
@@ -118,6 +625,12 @@ class EmailConfiguration(models.Model):
     smtp_password = models.CharField(_('Пароль SMTP'), max_length=100)
     use_tls = models.BooleanField(_('Использовать TLS'), default=True)
     from_email = models.EmailField(_('Email отправителя'))
+    weight = models.PositiveSmallIntegerField(
+        _('Вес'),
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text=_('Доля писем, отправляемых через этот сервер'),
+    )
     is_active = models.BooleanField(_('Активно'), default=True)
 
     class Meta:
@@ -0,0 +1,72 @@
+"""Подготовка писем-уведомлений: шаблоны, получатели и замеры этапов.
+
+Письмо рендерится один раз на событие из пары шаблонов
+tasks/email/<name>.txt и tasks/email/<name>.html и отправляется каждому
+получателю отдельным сообщением через общее SMTP-соединение процесса.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from functools import cache
+
+from django.template.loader import get_template
+
+from . import mail
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def _template(name):
+    # Скомпилированный шаблон хранится в процессе воркера
+    return get_template(name)
+
+
+def render(name, context):
+    """Текстовая и HTML-версии письма tasks/email/<name>."""
+    return (
+        _template(f'tasks/email/{name}.txt').render(context),
+        _template(f'tasks/email/{name}.html').render(context),
+    )
+
+
+class StageTimings:
+    """Длительность этапов обработки уведомления в миллисекундах."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stages[name] = self.stages.get(name, 0) + elapsed
+
+    def __str__(self):
+        return ', '.join(f'{name} {elapsed:.1f} мс' for name, elapsed in self.stages.items())
+
+
+def send(name, subject, context, recipients, timings):
+    """Рендерит письмо один раз и отправляет его всем получателям за один проход."""
+    with timings.stage('render'):
+        text, html = render(name, context)
+    with timings.stage('send'):
+        sent = mail.connections.send_mass_mail(
+            [(subject, text, html, [recipient]) for recipient in recipients]
+        )
+    logger.info('Уведомление %s: получателей %s, %s', name, len(recipients), timings)
+    return sent
+
+
+def comment_recipients(comment):
+    """Получатели уведомления о комментарии: служба задачи и её автор, кроме автора комментария."""
+    task = comment.task
+    recipients = [task.assigned_to.email]
+    if task.assigned_by.email not in recipients:
+        recipients.append(task.assigned_by.email)
+    if comment.user.email in recipients:
+        recipients.remove(comment.user.email)
+    return recipients
@@ -0,0 +1,119 @@
+"""Transactional outbox для задач Celery.
+
+Сигналы записывают задачу в таблицу OutboxMessage в той же транзакции, что и
+изменение данных, поэтому запрос не ждёт брокер, а воркер не получит задачу
+раньше коммита. Релей (задача relay_outbox или команда manage.py relay_outbox)
+публикует накопленные сообщения пачками. Доставка «как минимум один раз»:
+повторно опубликованное сообщение отбрасывается по отметке delivered_at.
+"""
+import functools
+from contextlib import nullcontext
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DeadLetter, OutboxMessage
+
+TASK_ID_PREFIX = 'outbox-'
+
+
+def enqueue(task_name, *args, key):
+    """Записывает задачу в outbox; сообщение с уже известным ключом не дублируется."""
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(task_name=task_name, args=list(args), key=key)],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_many(task_name, messages):
+    """Записывает пачку задач одним запросом; messages — пары (args, key)."""
+    OutboxMessage.objects.bulk_create(
+        [OutboxMessage(task_name=task_name, args=list(args), key=key) for args, key in messages],
+        ignore_conflicts=True,
+    )
+
+
+def _message_id(task_id):
+    if task_id and task_id.startswith(TASK_ID_PREFIX):
+        return int(task_id[len(TASK_ID_PREFIX):])
+    return None
+
+
+def relay(batch_size=None):
+    """Публикует одну пачку неопубликованных сообщений и возвращает их число."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        # SKIP LOCKED: несколько релеев разбирают очередь, не блокируя друг друга
+        messages = list(
+            OutboxMessage.objects.filter(published_at__isnull=True)
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not messages:
+            return 0
+        # Одно соединение с брокером на всю пачку (в eager-режиме брокер не нужен)
+        if current_app.conf.task_always_eager:
+            # Без воркера задачи приложений могут быть ещё не импортированы:
+            # незарегистрированная задача ушла бы в брокер вместо выполнения
+            if any(message.task_name not in current_app.tasks for message in messages):
+                current_app.loader.import_default_modules()
+            producer_context = nullcontext()
+        else:
+            producer_context = current_app.producer_or_acquire()
+        with producer_context as producer:
+            for message in messages:
+                current_app.signature(message.task_name, args=message.args).apply_async(
+                    task_id=f'{TASK_ID_PREFIX}{message.pk}', producer=producer
+                )
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+            published_at=timezone.now()
+        )
+    return len(messages)
+
+
+def relay_all(batch_size=None):
+    """Публикует все накопленные сообщения и удаляет опубликованные старше срока хранения."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    published = 0
+    while True:
+        count = relay(batch_size)
+        published += count
+        if count < batch_size:
+            break
+    OutboxMessage.objects.filter(
+        published_at__lt=timezone.now() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    ).delete()
+    return published
+
+
+def deduplicated(func):
+    """Декоратор bind-задачи: пропускает уже обработанное сообщение outbox."""
+    @functools.wraps(func)
+    def wrapper(task, *args, **kwargs):
+        message_id = _message_id(task.request.id)
+        if message_id is not None and OutboxMessage.objects.filter(
+            pk=message_id, delivered_at__isnull=False
+        ).exists():
+            return f'Сообщение outbox {message_id} уже обработано'
+        result = func(task, *args, **kwargs)
+        if message_id is not None:
+            OutboxMessage.objects.filter(pk=message_id).update(delivered_at=timezone.now())
+        return result
+
+    return wrapper
+
+
+def replay_dead_letters(letters):
+    """Ставит недоставленные уведомления в outbox заново и возвращает их число."""
+    now = timezone.now()
+    with transaction.atomic():
+        letters = list(letters.filter(replayed_at__isnull=True).select_for_update(skip_locked=True))
+        for letter in letters:
+            enqueue(
+                letter.task_name, *letter.args, key=f'dead-letter:{letter.pk}:{now.timestamp()}'
+            )
+        DeadLetter.objects.filter(pk__in=[letter.pk for letter in letters]).update(replayed_at=now)
+    return len(letters)
@@ -0,0 +1,107 @@
+"""Курсорная (keyset) пагинация списка задач.
+
+Страницы выбираются условием по паре (ключ сортировки, id), совпадающей с
+сортировкой Task.Meta.ordering (или с рангом при полнотекстовом поиске),
+поэтому стоимость запроса не зависит от глубины страницы, в отличие от OFFSET.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class KeysetPage:
+    """Страница задач с токенами для перехода вперед и назад."""
+
+    def __init__(self, items, next_token=None, prev_token=None):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_token is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(task, key='created_at'):
+    """Токен позиции задачи в сортировке (-key, -id)."""
+    value = getattr(task, key)
+    if isinstance(value, datetime):
+        raw = f'd{value.isoformat()}|{task.pk}'
+    else:
+        raw = f'f{float(value)!r}|{task.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен; для некорректного токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        value, pk = raw[1:].rsplit('|', 1)
+        if raw[0] == 'd':
+            return datetime.fromisoformat(value), int(pk)
+        if raw[0] == 'f':
+            return float(value), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, IndexError):
+        pass
+    return None
+
+
+def get_page_size(value=None):
+    """Размер страницы из параметра запроса с ограничением сверху."""
+    default = getattr(settings, 'TASK_LIST_PAGE_SIZE', 20)
+    maximum = getattr(settings, 'TASK_LIST_MAX_PAGE_SIZE', 100)
+    try:
+        page_size = int(value) if value else default
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def paginate(queryset, after=None, before=None, page_size=None, key='created_at'):
+    """Возвращает страницу задач после или перед указанным курсором.
+
+    key — поле или аннотация, по которой задачи отсортированы по убыванию.
+    """
+    page_size = page_size or get_page_size()
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        value, pk = before
+        rows = list(
+            queryset.filter(Q(**{f'{key}__gt': value}) | Q(**{key: value, 'pk__gt': pk}))
+            .order_by(key, 'id')[:page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        return KeysetPage(
+            items,
+            next_token=encode_cursor(items[-1], key) if items else None,
+            prev_token=encode_cursor(items[0], key) if has_more and items else None,
+        )
+
+    if after:
+        value, pk = after
+        queryset = queryset.filter(Q(**{f'{key}__lt': value}) | Q(**{key: value, 'pk__lt': pk}))
+    rows = list(queryset.order_by(f'-{key}', '-id')[:page_size + 1])
+    has_more = len(rows) > page_size
+    items = rows[:page_size]
+    return KeysetPage(
+        items,
+        next_token=encode_cursor(items[-1], key) if has_more else None,
+        prev_token=encode_cursor(items[0], key) if after and items else None,
+    )
@@ -0,0 +1,37 @@
+"""Загрузка строк в PostgreSQL командой COPY без промежуточного файла."""
+import csv
+import io
+
+
+class _CopySource:
+    """Файлоподобный источник для copy_expert: строки CSV генерируются по мере чтения."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def read(self, size=-1):
+        for row in self.rows:
+            self.writer.writerow(row)
+            if self.buffer.tell() >= max(size, 1):
+                break
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    readline = read
+
+
+def copy_rows(cursor, table, columns, rows, options=''):
+    """Загружает строки (кортежи значений columns) в таблицу одним COPY FROM STDIN.
+
+    Строки читаются из итератора по мере отправки, поэтому в память целиком
+    не попадают. Пока идёт COPY, соединение не принимает других запросов.
+    """
+    options = f', {options}' if options else ''
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv{options})',
+        _CopySource(rows),
+    )
@@ -1,19 +1,101 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Comment, Task
-from .tasks import send_comment_notification, send_task_notification
+from . import bulk, cache, mail, outbox
+from .models import (
+    Comment,
+    Department,
+    DepartmentTaskStats,
+    EmailConfiguration,
+    PendingCommentNotification,
+    Task,
+)
+
+
+def _stats_key(task):
+    """Поля задачи, влияющие на счётчики статистики."""
+    due_date = Task._meta.get_field('due_date').get_prep_value(task.due_date)
+    return (task.assigned_to_id, task.status, due_date)
+
+
+def _comment_department_id(comment):
+    """Служба, которой назначена задача комментария."""
+    if Comment.task.is_cached(comment):
+        return comment.task.assigned_to_id
+    return (
+        Task.objects.filter(pk=comment.task_id)
+        .values_list('assigned_to_id', flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Task)
+def task_pre_save(sender, instance, **kwargs):
+    """Запоминает прежние значения задачи для обновления счётчиков."""
+    instance._stats_previous = None
+    if instance.pk:
+        instance._stats_previous = (
+            Task.objects.filter(pk=instance.pk)
+            .values_list('assigned_to_id', 'status', 'due_date')
+            .first()
+        )
 
 
 @receiver(post_save, sender=Task)
 def task_post_save(sender, instance, created, **kwargs):
     """Отправка уведомления при создании новой задачи."""
+    previous = getattr(instance, '_stats_previous', None)
+    DepartmentTaskStats.objects.apply_change(previous, _stats_key(instance))
+    cache.bump(instance.assigned_to_id, previous[0] if previous else None)
     if created:
-        send_task_notification.delay(instance.id)
+        # Публикацию в брокер выполнит релей outbox после коммита
+        outbox.enqueue('tasks.tasks.send_task_notification', instance.id, key=f'task:{instance.id}')
+
+
+@receiver(post_delete, sender=Task)
+def task_post_delete(sender, instance, **kwargs):
+    """Исключает удалённую задачу из счётчиков статистики."""
+    DepartmentTaskStats.objects.apply_change(_stats_key(instance), None)
+    cache.bump(instance.assigned_to_id)
+
+
+@receiver(bulk.tasks_updated, sender=Task)
+def tasks_bulk_updated(sender, department_ids, **kwargs):
+    """Инвалидирует кэш служб, затронутых массовым изменением задач."""
+    cache.bump(*department_ids)
 
 
 @receiver(post_save, sender=Comment)
 def comment_post_save(sender, instance, created, **kwargs):
     """Отправка уведомления при добавлении комментария к задаче."""
-    if created:
-        send_comment_notification.delay(instance.id)
\ No newline at end of file
+    cache.bump(_comment_department_id(instance))
+    if not created:
+        return
+    if settings.COMMENT_NOTIFICATION_DIGEST:
+        # Комментарий попадёт в ближайшую сводку send_comment_digests
+        PendingCommentNotification.objects.create(comment=instance)
+    else:
+        outbox.enqueue(
+            'tasks.tasks.send_comment_notification', instance.id, key=f'comment:{instance.id}'
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_post_delete(sender, instance, **kwargs):
+    """Инвалидирует кэш службы при удалении комментария."""
+    cache.bump(_comment_department_id(instance))
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def department_changed(sender, instance, **kwargs):
+    """Инвалидирует кэш при изменении или удалении службы."""
+    cache.bump(instance.id)
+
+
+@receiver(post_save, sender=EmailConfiguration)
+@receiver(post_delete, sender=EmailConfiguration)
+def email_configuration_changed(sender, instance, **kwargs):
+    """Закрывает SMTP-соединение, открытое со старыми настройками."""
+    mail.connections.invalidate()
@@ -0,0 +1,135 @@
+"""Отчёт о медленных запросах по pg_stat_statements.
+
+Статистика суммируется по queryid (нормализованный запрос, константы
+заменены на $1, $2, ...) в пределах текущей базы. Источник запроса берётся
+из комментария sqlcomments. PostgreSQL хранит текст первого выполнения
+запроса, поэтому одинаковый запрос из нескольких представлений показывается
+с источником того, кто выполнил его первым после сброса статистики.
+"""
+import re
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from . import sqlcomments
+
+ORDERINGS = {'total': 'total_ms', 'mean': 'mean_ms'}
+PARAMETER_RE = re.compile(r'\$(\d+)')
+
+STATEMENTS_SQL = '''
+    SELECT queryid, min(query), sum(calls)::bigint, sum(total_exec_time) AS total_ms,
+           sum(total_exec_time) / nullif(sum(calls), 0) AS mean_ms, sum(rows)::bigint,
+           sum(shared_blks_hit)::bigint, sum(shared_blks_read)::bigint
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND ({filter})
+    GROUP BY queryid
+'''
+
+
+class SlowQueryError(Exception):
+    """pg_stat_statements недоступен или EXPLAIN завершился ошибкой."""
+
+
+class Statement(NamedTuple):
+    queryid: int
+    query: str
+    calls: int
+    total_ms: float
+    mean_ms: float
+    rows: int
+    blocks_hit: int
+    blocks_read: int
+
+    @property
+    def source(self):
+        return sqlcomments.source(self.query)
+
+    @property
+    def hit_ratio(self):
+        """Доля блоков, найденных в shared buffers, или None без чтений."""
+        blocks = self.blocks_hit + self.blocks_read
+        return self.blocks_hit / blocks if blocks else None
+
+    @property
+    def parameter_count(self):
+        return max(map(int, PARAMETER_RE.findall(self.query)), default=0)
+
+
+def _require_extension(cursor):
+    # Без расширения запрос к pg_stat_statements падал бы с невнятной ошибкой
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+    if cursor.fetchone() is None:
+        raise SlowQueryError(
+            'Расширение pg_stat_statements не установлено: суперпользователь PostgreSQL '
+            'должен выполнить CREATE EXTENSION pg_stat_statements в базе приложения'
+        )
+
+
+def _fetch(filter_sql, params, suffix=''):
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _require_extension(cursor)
+            cursor.execute(STATEMENTS_SQL.format(filter=filter_sql) + suffix, params)
+            return [Statement(*row) for row in cursor.fetchall()]
+    except DatabaseError as exc:
+        raise SlowQueryError(f'pg_stat_statements недоступен: {exc}') from exc
+
+
+def top_statements(order='total', limit=20, source=None):
+    """Самые тяжёлые запросы по суммарному (total) или среднему (mean) времени.
+
+    source ограничивает запросы одним источником, например 'view=task_list'.
+    """
+    filter_sql, params = 'TRUE', []
+    if source:
+        # Комментарий без % и _, поэтому strpos, а не LIKE
+        filter_sql = 'strpos(query, %s) > 0'
+        params.append(f'{sqlcomments.PREFIX} {source} */')
+    return _fetch(
+        filter_sql, [*params, limit], f' ORDER BY {ORDERINGS[order]} DESC NULLS LAST LIMIT %s'
+    )
+
+
+def get_statement(queryid):
+    statements = _fetch('queryid = %s', [queryid])
+    return statements[0] if statements else None
+
+
+def reset():
+    """Сбрасывает статистику (например, перед нагрузочным тестом или после релиза)."""
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _require_extension(cursor)
+            cursor.execute('SELECT pg_stat_statements_reset()')
+    except DatabaseError as exc:
+        raise SlowQueryError(f'pg_stat_statements недоступен: {exc}') from exc
+
+
+def explain(query, values):
+    """План EXPLAIN (ANALYZE, BUFFERS) запроса с подставленными значениями $1, $2, ...
+
+    Запрос выполняется по-настоящему, поэтому — в транзакции только для чтения
+    с ограничением времени, которая затем откатывается: изменяющие запросы
+    завершаются ошибкой, а не меняют данные. Значения передаются строками, и
+    PostgreSQL приводит их к нужному типу, как литералы в исходном запросе.
+    """
+    # Django подставляет параметры на стороне клиента, поэтому в pg_stat_statements
+    # они заменены на $n; возвращаем их как именованные параметры psycopg2
+    sql = PARAMETER_RE.sub(r'%(p\1)s', query.replace('%', '%%'))
+    params = {f'p{number}': value for number, value in enumerate(values, 1)}
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL transaction_read_only = on')
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true)",
+                [f'{settings.SLOW_QUERY_EXPLAIN_TIMEOUT}s'],
+            )
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            transaction.set_rollback(True)
+    except (DatabaseError, KeyError) as exc:
+        # KeyError — значений меньше, чем параметров в запросе
+        raise SlowQueryError(f'EXPLAIN не выполнен: {exc}') from exc
+    return plan
@@ -0,0 +1,65 @@
+"""Комментарии в SQL с источником запроса.
+
+Обёртка запросов дописывает в конец каждого запроса комментарий с именем
+представления или задачи Celery, например /* kapantask view=task_list */.
+PostgreSQL не учитывает комментарии при разборе и при нормализации в
+pg_stat_statements, но сохраняет их в тексте запроса, поэтому отчёт о
+медленных запросах (slow_queries) показывает, откуда запрос пришёл.
+"""
+import re
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db import connection
+
+PREFIX = 'kapantask'
+# Имя попадает в SQL: оставляем только безопасные символы (без %, */ и кавычек)
+_UNSAFE = re.compile(r'[^\w.:<>-]', re.ASCII)
+SOURCE_RE = re.compile(rf'/\* {PREFIX} (\w+=[\w.:<>-]+) \*/')
+
+current_source = ContextVar('kapantask_sql_source', default=None)
+
+
+def comment(kind, name):
+    return f'/* {PREFIX} {kind}={_UNSAFE.sub("_", name)} */'
+
+
+def source(sql):
+    """Источник запроса из его комментария (view=... или task=...) или None."""
+    match = SOURCE_RE.search(sql)
+    return match[1] if match else None
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    tag = current_source.get()
+    if tag:
+        sql = f'{sql} {tag}'
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def tagged(kind, name):
+    """Помечает запросы внутри блока комментарием с источником."""
+    token = current_source.set(comment(kind, name))
+    try:
+        with connection.execute_wrapper(execute_wrapper):
+            yield
+    finally:
+        current_source.reset(token)
+
+
+@task_prerun.connect
+def tag_task(task=None, **kwargs):
+    if not settings.SQL_COMMENTS_ENABLED:
+        return
+    task.request.kapantask_sql_tag = ExitStack()
+    task.request.kapantask_sql_tag.enter_context(tagged('task', task.name))
+
+
+@task_postrun.connect
+def untag_task(task=None, **kwargs):
+    stack = getattr(task.request, 'kapantask_sql_tag', None)
+    if stack is not None:
+        stack.close()
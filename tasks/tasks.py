@@ -1,102 +1,315 @@
+import functools
+import smtplib
+import time
+from collections import defaultdict
+
+from celery import Task as CeleryTask
 from celery import shared_task
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.db import transaction
 
-from .models import Comment, EmailConfiguration, Task
+from . import async_mail, cache, mail, notifications, outbox, worker_metrics
+from .models import (
+    Comment,
+    DeadLetter,
+    DeliveryAttempt,
+    DepartmentTaskStats,
+    PendingCommentNotification,
+    Task,
+)
 
+# Временные ошибки доставки: задача повторяется с экспоненциальной задержкой
+DELIVERY_ERRORS = (smtplib.SMTPException, ConnectionError, TimeoutError, mail.RateLimitExceeded)
 
-def get_email_config():
-    """Получение активной конфигурации Email."""
-    config = EmailConfiguration.objects.filter(is_active=True).first()
-    if config:
-        return {
-            'host': config.smtp_host,
-            'port': config.smtp_port,
-            'username': config.smtp_user,
-            'password': config.smtp_password,
-            'use_tls': config.use_tls,
-            'from_email': config.from_email,
-        }
-    return None
 
+class NotificationTask(CeleryTask):
+    """Задача отправки уведомления с повторами, журналом попыток и dead letter."""
+    autoretry_for = DELIVERY_ERRORS
+    # Адрес отклонён сервером: повтор не поможет
+    dont_autoretry_for = (smtplib.SMTPRecipientsRefused,)
+    max_retries = settings.NOTIFICATION_MAX_RETRIES
+    retry_backoff = True
+    retry_backoff_max = settings.NOTIFICATION_RETRY_BACKOFF_MAX
+    retry_jitter = True
 
-@shared_task
-def send_task_notification(task_id):
+    def before_start(self, task_id, args, kwargs):
+        self.request.delivery_started = time.perf_counter()
+
+    def stage_timings(self):
+        """Этапы текущего выполнения; попадают в журнал попыток и метрики воркера."""
+        self.request.stage_timings = notifications.StageTimings()
+        return self.request.stage_timings
+
+    def _record(self, task_id, outcome, error=''):
+        started = getattr(self.request, 'delivery_started', None)
+        queue_wait = getattr(self.request, 'kapantask_queue_wait', None)
+        DeliveryAttempt.objects.create(
+            task_name=self.name,
+            task_id=task_id,
+            attempt=self.request.retries + 1,
+            outcome=outcome,
+            duration_ms=(time.perf_counter() - started) * 1000 if started else None,
+            queue_wait_ms=queue_wait * 1000 if queue_wait is not None else None,
+            error=error,
+            # db_ms, render_ms, smtp_ms
+            **{
+                f'{phase}_ms': seconds * 1000
+                for phase, seconds in worker_metrics.phases(self.request).items()
+            },
+        )
+
+    def on_success(self, retval, task_id, args, kwargs):
+        self._record(task_id, DeliveryAttempt.Outcome.SENT)
+
+    def on_retry(self, exc, task_id, args, kwargs, einfo):
+        self._record(task_id, DeliveryAttempt.Outcome.RETRY, repr(exc))
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        self._record(task_id, DeliveryAttempt.Outcome.FAILED, repr(exc))
+        DeadLetter.objects.create(
+            task_name=self.name,
+            task_id=task_id,
+            args=list(args),
+            error=repr(exc),
+            attempts=self.request.retries + 1,
+        )
+
+
+def enqueue_unsent(datatuple, key):
+    """Ставит неотправленные письма в outbox задачей send_notification_batch."""
+    outbox.enqueue('tasks.tasks.send_notification_batch', list(datatuple), key=key)
+
+
+def retries_unsent(func):
+    """Декоратор bind-задачи: после частичной отправки повторяется только остаток.
+
+    Автоповтор всей задачи отправил бы ушедшие письма второй раз, поэтому
+    неотправленные письма передаются задаче send_notification_batch.
+    """
+    @functools.wraps(func)
+    def wrapper(task, *args, **kwargs):
+        try:
+            return func(task, *args, **kwargs)
+        except mail.PartialDeliveryError as exc:
+            enqueue_unsent(exc.unsent, key=f'unsent:{task.request.id}:{task.request.retries}')
+            return f'Отправлено писем: {exc.sent}, остаток передан на повтор ({exc.error!r})'
+
+    return wrapper
+
+
+@shared_task(bind=True, base=NotificationTask)
+@outbox.deduplicated
+@retries_unsent
+def send_task_notification(self, task_id):
     """Отправка уведомления о новой задаче."""
+    timings = self.stage_timings()
     try:
-        task = Task.objects.get(id=task_id)
+        with timings.stage('fetch'):
+            task = Task.objects.select_related('assigned_to', 'assigned_by').get(id=task_id)
         recipient_email = task.assigned_to.email
         
-        # Формирование сообщения
-        subject = f'Новая задача: {task.title}'
-        html_message = render_to_string('tasks/email/task_notification.html', {
-            'task': task,
-        })
-        plain_message = strip_tags(html_message)
-        
-        # Отправка email
-        email_config = get_email_config()
-        from_email = email_config['from_email'] if email_config else settings.DEFAULT_FROM_EMAIL
-        
-        send_mail(
-            subject,
-            plain_message,
-            from_email,
+        notifications.send(
+            'task_notification',
+            f'Новая задача: {task.title}',
+            {'task': task},
             [recipient_email],
-            html_message=html_message,
+            timings,
         )
         
-        return f'Уведомление о задаче {task_id} успешно отправлено на {recipient_email}'
+        return f'Уведомление о задаче {task_id} успешно отправлено на {recipient_email} ({timings})'
     except Task.DoesNotExist:
         return f'Задача с ID {task_id} не найдена'
-    except Exception as e:
-        return f'Ошибка при отправке уведомления о задаче: {str(e)}'
 
 
-@shared_task
-def send_comment_notification(comment_id):
+@shared_task(bind=True, base=NotificationTask)
+@outbox.deduplicated
+@retries_unsent
+def send_task_notifications(self, task_ids):
+    """Отправка уведомлений о пачке задач, созданных массовым назначением."""
+    timings = self.stage_timings()
+    with timings.stage('fetch'):
+        tasks = list(
+            Task.objects.select_related('assigned_to', 'assigned_by').filter(id__in=task_ids)
+        )
+    with timings.stage('render'):
+        messages = [
+            (
+                f'Новая задача: {task.title}',
+                *notifications.render('task_notification', {'task': task}),
+                [task.assigned_to.email],
+            )
+            for task in tasks
+        ]
+    with timings.stage('send'):
+        mail.connections.send_mass_mail(messages)
+    return f'Уведомления о {len(tasks)} задачах отправлены ({timings})'
+
+
+# Столько задач перечисляется в письме о пачке; об остальных — только их число
+DEPARTMENT_DIGEST_TASK_LIMIT = 50
+
+
+@shared_task(bind=True, base=NotificationTask)
+@outbox.deduplicated
+@retries_unsent
+def send_department_task_digest(self, department_id, task_ids):
+    """Одно письмо службе о пачке новых задач (импорт плана работ)."""
+    timings = self.stage_timings()
+    with timings.stage('fetch'):
+        tasks = list(
+            Task.objects.select_related('assigned_to')
+            .filter(id__in=task_ids, assigned_to_id=department_id)
+            .order_by('due_date', 'id')[:DEPARTMENT_DIGEST_TASK_LIMIT]
+        )
+    if not tasks:
+        return f'Нет задач для службы {department_id}'
+    department = tasks[0].assigned_to
+    notifications.send(
+        'task_digest',
+        f'Новые задачи: {len(task_ids)}',
+        {
+            'department': department,
+            'tasks': tasks,
+            'count': len(task_ids),
+            'more': len(task_ids) - len(tasks),
+        },
+        [department.email],
+        timings,
+    )
+    return f'Сводка о {len(task_ids)} задачах отправлена службе {department_id} ({timings})'
+
+
+@shared_task(bind=True, base=NotificationTask)
+@outbox.deduplicated
+@retries_unsent
+def send_comment_notification(self, comment_id):
     """Отправка уведомления о новом комментарии."""
+    timings = self.stage_timings()
     try:
-        comment = Comment.objects.get(id=comment_id)
+        # Комментарий, задача, служба и авторы одним запросом
+        with timings.stage('fetch'):
+            comment = Comment.objects.select_related(
+                'user', 'task__assigned_to', 'task__assigned_by'
+            ).get(id=comment_id)
         task = comment.task
         
-        # Получаем список получателей (назначенная служба и создатель задачи)
-        recipients = [task.assigned_to.email]
-        if task.assigned_by.email not in recipients:
-            recipients.append(task.assigned_by.email)
-        
-        # Исключаем автора комментария из получателей
-        if comment.user.email in recipients:
-            recipients.remove(comment.user.email)
+        recipients = notifications.comment_recipients(comment)
         
         if not recipients:
             return f'Нет получателей для уведомления о комментарии {comment_id}'
         
-        # Формирование сообщения
-        subject = f'Новый комментарий к задаче: {task.title}'
-        html_message = render_to_string('tasks/email/comment_notification.html', {
-            'comment': comment,
-            'task': task,
-        })
-        plain_message = strip_tags(html_message)
-        
-        # Отправка email
-        email_config = get_email_config()
-        from_email = email_config['from_email'] if email_config else settings.DEFAULT_FROM_EMAIL
-        
-        send_mail(
-            subject,
-            plain_message,
-            from_email,
+        notifications.send(
+            'comment_notification',
+            f'Новый комментарий к задаче: {task.title}',
+            {'comment': comment, 'task': task},
             recipients,
-            html_message=html_message,
+            timings,
         )
         
         recipients_str = ", ".join(recipients)
-        return f'Уведомление о комментарии {comment_id} успешно отправлено на {recipients_str}'
+        return (
+            f'Уведомление о комментарии {comment_id} успешно отправлено на {recipients_str} '
+            f'({timings})'
+        )
     except Comment.DoesNotExist:
         return f'Комментарий с ID {comment_id} не найден'
-    except Exception as e:
-        return f'Ошибка при отправке уведомления о комментарии: {str(e)}'
\ No newline at end of file
+
+
+@shared_task(bind=True)
+def send_comment_digests(self):
+    """Отправка накопленных комментариев одной сводкой на каждого получателя."""
+    batch_size = settings.COMMENT_DIGEST_BATCH_SIZE
+    comments_sent = emails_sent = 0
+    # Этапы попадают в метрики воркера
+    timings = self.request.stage_timings = notifications.StageTimings()
+    while True:
+        with transaction.atomic():
+            # SKIP LOCKED: параллельные запуски не отправят один комментарий дважды
+            with timings.stage('fetch'):
+                pending = list(
+                    PendingCommentNotification.objects.select_for_update(
+                        skip_locked=True, of=('self',)
+                    )
+                    .select_related(
+                        'comment__user',
+                        'comment__task__assigned_to',
+                        'comment__task__assigned_by',
+                    )
+                    .order_by('created_at')[:batch_size]
+                )
+            if not pending:
+                break
+            digests = defaultdict(list)
+            for entry in pending:
+                for recipient in notifications.comment_recipients(entry.comment):
+                    digests[recipient].append(entry.comment)
+            if digests:
+                with timings.stage('render'):
+                    messages = [
+                        comment_digest_message(recipient, comments)
+                        for recipient, comments in digests.items()
+                    ]
+                if settings.EMAIL_ASYNC_DELIVERY:
+                    # Пачка уходит отдельной задачей в той же транзакции через outbox
+                    outbox.enqueue(
+                        'tasks.tasks.send_notification_batch',
+                        messages,
+                        key=f'digest:{pending[0].pk}:{pending[-1].pk}',
+                    )
+                else:
+                    try:
+                        with timings.stage('send'):
+                            mail.connections.send_mass_mail(messages)
+                    except mail.PartialDeliveryError as exc:
+                        # Ушедшие сводки не повторяются: остаток уходит пачкой
+                        enqueue_unsent(
+                            exc.unsent, key=f'digest:{pending[0].pk}:{pending[-1].pk}'
+                        )
+            PendingCommentNotification.objects.filter(
+                pk__in=[entry.pk for entry in pending]
+            ).delete()
+        comments_sent += len(pending)
+        emails_sent += len(digests)
+        if len(pending) < batch_size:
+            break
+    return f'Сводка: {comments_sent} комментариев в {emails_sent} письмах ({timings})'
+
+
+def comment_digest_message(recipient, comments):
+    """Письмо-сводка (subject, message, html_message, recipient_list) для одного получателя."""
+    tasks = defaultdict(list)
+    for comment in comments:
+        tasks[comment.task].append(comment)
+    context = {'tasks': dict(tasks), 'count': len(comments)}
+    text, html = notifications.render('comment_digest', context)
+    return (f'Новые комментарии к задачам: {len(comments)}', text, html, [recipient])
+
+
+@shared_task(bind=True, base=NotificationTask)
+@outbox.deduplicated
+def send_notification_batch(self, datatuple):
+    """Параллельная отправка пачки готовых писем; повторяются только неотправленные."""
+    timings = self.stage_timings()
+    with timings.stage('send'):
+        failed = async_mail.deliver(datatuple)
+    if failed:
+        raise self.retry(
+            args=[failed],
+            exc=smtplib.SMTPException(f'Не отправлено писем: {len(failed)} из {len(datatuple)}'),
+        )
+    return f'Пачка из {len(datatuple)} писем отправлена'
+
+
+@shared_task
+def relay_outbox():
+    """Публикация задач, накопленных в outbox."""
+    return f'Опубликовано сообщений outbox: {outbox.relay_all()}'
+
+
+@shared_task
+def refresh_overdue_task_stats():
+    """Пересчет счетчиков просроченных задач по службам."""
+    changed = DepartmentTaskStats.objects.refresh_overdue()
+    if changed:
+        cache.bump(*changed)
+    return f'Счетчики просроченных задач обновлены для {len(changed)} служб'
@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+
+from tasks import demo_data
+from tasks.models import Comment, Department, DepartmentTaskStats, Task, User
+
+
+class ScaleDataTest(TestCase):
+    def test_generate_volume(self):
+        volume = demo_data.Volume(departments=5, users=60, tasks=300, comments=1000, days=90)
+        out = StringIO()
+        call_command(
+            'setup_demo_data', '--scale', '--departments=5', '--users=60', '--tasks=300',
+            '--comments=1000', '--days=90', '--batch-size=120', '--workers=1', stdout=out,
+        )
+        self.assertIn('Создано задач: 300, комментариев: 1000', out.getvalue())
+        self.assertEqual(Department.objects.count(), volume.departments)
+        self.assertEqual(User.objects.filter(is_admin=True).count(), 1)
+        self.assertEqual(Task.objects.count(), volume.tasks)
+        self.assertEqual(Comment.objects.count(), volume.comments)
+        # Пароль хэшируется один раз и подходит всем пользователям
+        self.assertTrue(User.objects.get(username='user00060').check_password('servicepass'))
+        # Поисковые векторы построены вместе с комментариями
+        self.assertFalse(Task.objects.filter(search_vector__isnull=True).exists())
+        task = Task.objects.annotate(comment_count=Count('comments')).order_by(
+            '-comment_count'
+        ).first()
+        word = task.comments.first().content.split()[0].rstrip('.')
+        self.assertTrue(Task.objects.search(word).filter(pk=task.pk).exists())
+        # Статистика пересчитана
+        stats = DepartmentTaskStats.objects.exclude(status=DepartmentTaskStats.OVERDUE)
+        self.assertEqual(sum(stats.values_list('count', flat=True)), volume.tasks)
+
+        # Повторный запуск переиспользует службы и пользователей
+        call_command(
+            'setup_demo_data', '--scale', '--departments=5', '--users=60', '--tasks=10',
+            '--comments=0', '--workers=1', stdout=out,
+        )
+        self.assertEqual(User.objects.count(), volume.users)
+        self.assertEqual(Task.objects.count(), volume.tasks + 10)
+
+    def test_batches_are_deterministic(self):
+        volume = demo_data.Volume(departments=3, users=10, tasks=100, comments=400)
+        department_ids = demo_data.create_departments(volume.departments)
+        admin_ids, members = demo_data.create_users(volume.users, department_ids)
+        first, second = (
+            demo_data.Generator(7, volume, department_ids, admin_ids, members, 1_700_000_000)
+            for _ in range(2)
+        )
+        ids = list(range(1, 51))
+        self.assertEqual(first.batch(1, ids, 200), second.batch(1, ids, 200))
+        self.assertNotEqual(first.batch(0, ids, 200), first.batch(1, ids, 200))
+        self.assertEqual(
+            first.comment_count(0, 30) + first.comment_count(30, 70), volume.comments
+        )
@@ -0,0 +1,212 @@
+import io
+import tempfile
+import zipfile
+
+from celery import current_app
+from django.core import mail as outbox_mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks import importer, outbox
+from tasks.models import DepartmentTaskStats, OutboxMessage, Task
+from tasks.tests.test_models import DepartmentFactory, UserFactory
+
+CSV = (
+    'Название;Описание;Служба;Автор;Крайний срок;Статус\n'
+    'Ревизия насосов;Цех 1;plant@kgok.ru;planner;2030-03-01;\n'
+    'Замена фильтров;;PLANT@kgok.ru;planner;15.03.2030 10:00;В работе\n'
+    ';;;;;\n'
+    'Поверка весов;Склад;lab@kgok.ru;;2030-04-01 09:30;new\n'
+)
+
+
+def xlsx_file(rows):
+    """Книга XLSX с общими строками, как её сохраняет Excel."""
+    shared = sorted({value for row in rows for value in row if isinstance(value, str)})
+    sheet = ''.join(
+        '<row>' + ''.join(
+            f'<c r="{chr(65 + column)}{line}" t="s"><v>{shared.index(value)}</v></c>'
+            if isinstance(value, str)
+            else f'<c r="{chr(65 + column)}{line}"><v>{value}</v></c>'
+            for column, value in enumerate(row)
+        ) + '</row>'
+        for line, row in enumerate(rows, start=1)
+    )
+    namespace = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(
+            'xl/sharedStrings.xml',
+            f'<sst xmlns="{namespace}">'
+            + ''.join(f'<si><t>{value}</t></si>' for value in shared)
+            + '</sst>',
+        )
+        archive.writestr(
+            'xl/worksheets/sheet1.xml',
+            f'<worksheet xmlns="{namespace}"><sheetData>{sheet}</sheetData></worksheet>',
+        )
+    buffer.seek(0)
+    return buffer
+
+
+class TaskImportTest(TestCase):
+    def setUp(self):
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', eager)
+        self.plant = DepartmentFactory(name='Цех', email='plant@kgok.ru')
+        self.lab = DepartmentFactory(name='Лаборатория', email='lab@kgok.ru')
+        self.planner = UserFactory(username='planner', is_admin=True)
+        self.admin = UserFactory(username='chief', is_admin=True)
+
+    def import_csv(self, text, **kwargs):
+        return importer.import_tasks(
+            importer.read_rows(io.BytesIO(text.encode()), 'plan.csv'), **kwargs
+        )
+
+    def test_csv_import(self):
+        created = self.import_csv(CSV, default_author=self.admin)
+        self.assertEqual(len(created), 3)
+        tasks = {task.title: task for task in Task.objects.filter(id__in=created)}
+        self.assertEqual(tasks['Замена фильтров'].status, Task.Status.IN_PROGRESS)
+        self.assertEqual(tasks['Замена фильтров'].assigned_to, self.plant)
+        self.assertEqual(tasks['Поверка весов'].assigned_by, self.admin)
+        self.assertEqual(timezone.localtime(tasks['Ревизия насосов'].due_date).day, 1)
+        # Поисковый вектор заполняет триггер, как при обычном сохранении
+        self.assertTrue(Task.objects.search('насосов').exists())
+
+        counts = dict(
+            DepartmentTaskStats.objects.filter(department=self.plant).values_list(
+                'status', 'count'
+            )
+        )
+        self.assertEqual(counts[Task.Status.NEW], 1)
+        self.assertEqual(counts[Task.Status.IN_PROGRESS], 1)
+
+    def test_one_notification_per_department(self):
+        # Как в рабочей базе: у служб уже есть счётчики просроченных задач
+        DepartmentTaskStats.objects.rebuild()
+        # Число запросов не зависит от числа строк файла
+        with self.assertNumQueries(14):
+            self.import_csv(CSV, default_author=self.admin)
+        messages = OutboxMessage.objects.filter(
+            task_name='tasks.tasks.send_department_task_digest'
+        )
+        self.assertEqual(messages.count(), 2)
+        outbox.relay_all()
+        self.assertEqual(len(outbox_mail.outbox), 2)
+        plant_mail = next(m for m in outbox_mail.outbox if m.to == ['plant@kgok.ru'])
+        self.assertIn('Новые задачи: 2', plant_mail.subject)
+        self.assertIn('Замена фильтров', plant_mail.body)
+
+    def test_errors_roll_back_whole_file(self):
+        text = CSV + 'Лишняя;;unknown@kgok.ru;nobody;завтра;\n'
+        with self.assertRaises(importer.TaskImportError) as raised:
+            self.import_csv(text)
+        self.assertEqual(len(raised.exception.errors), 2)
+        self.assertIn('Строка 5', raised.exception.errors[0])
+        self.assertIn('служба «unknown@kgok.ru» не найдена', raised.exception.errors[1])
+        self.assertIn('некорректный срок', raised.exception.errors[1])
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_missing_columns(self):
+        with self.assertRaises(importer.TaskImportError) as raised:
+            self.import_csv('Название,Описание\nЗадача,Текст\n')
+        self.assertEqual(
+            raised.exception.errors, ['Нет столбцов: department, due_date, author']
+        )
+
+    def test_xlsx_import(self):
+        workbook = xlsx_file([
+            ('Название', 'Служба', 'Автор', 'Крайний срок'),
+            ('Ревизия насосов', 'plant@kgok.ru', 'planner', 47543.5),
+        ])
+        created = importer.import_tasks(importer.read_rows(workbook, 'plan.xlsx'))
+        task = Task.objects.get(id__in=created)
+        self.assertEqual(task.assigned_by, self.planner)
+        self.assertEqual(
+            timezone.localtime(task.due_date).strftime('%Y-%m-%d %H:%M'), '2030-03-01 12:00'
+        )
+
+    def test_xlsx_serial_out_of_range(self):
+        workbook = xlsx_file([
+            ('Название', 'Служба', 'Автор', 'Крайний срок'),
+            ('Ревизия насосов', 'plant@kgok.ru', 'planner', 20240101),
+            ('Замена фильтров', 'plant@kgok.ru', 'planner', float('inf')),
+        ])
+        with self.assertRaises(importer.TaskImportError) as raised:
+            importer.import_tasks(importer.read_rows(workbook, 'plan.xlsx'))
+        self.assertEqual(len(raised.exception.errors), 2)
+        self.assertIn('некорректный срок «20240101»', raised.exception.errors[0])
+        self.assertIn('некорректный срок «inf»', raised.exception.errors[1])
+
+    def test_csv_number_is_not_excel_date(self):
+        with self.assertRaises(importer.TaskImportError) as raised:
+            self.import_csv(
+                'Название;Служба;Крайний срок\nРевизия насосов;plant@kgok.ru;2024\n',
+                default_author=self.admin,
+            )
+        self.assertEqual(raised.exception.errors, ['Строка 2: некорректный срок «2024»'])
+
+    def test_cp1251_csv(self):
+        created = importer.import_tasks(
+            importer.read_rows(io.BytesIO(CSV.encode('cp1251')), 'plan.csv'),
+            default_author=self.admin,
+        )
+        self.assertEqual(
+            sorted(Task.objects.filter(id__in=created).values_list('title', flat=True)),
+            ['Замена фильтров', 'Поверка весов', 'Ревизия насосов'],
+        )
+
+    def test_undecodable_csv(self):
+        # Первые 4 КБ в UTF-8, дальше байт, которого нет ни в UTF-8, ни в cp1251
+        text = CSV.encode() + ('Ревизия;;plant@kgok.ru;planner;2030-03-01;\n' * 100).encode()
+        with self.assertRaises(importer.TaskImportError) as raised:
+            importer.import_tasks(importer.read_rows(io.BytesIO(text + b'\x98\n'), 'plan.csv'))
+        self.assertIn('не в кодировке UTF-8', raised.exception.errors[-1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_not_a_workbook(self):
+        with self.assertRaises(importer.TaskImportError) as raised:
+            importer.import_tasks(importer.read_rows(io.BytesIO(CSV.encode()), 'plan.xlsx'))
+        self.assertIn('не является книгой XLSX', raised.exception.errors[0])
+
+    def test_workbook_without_sheet(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('xl/workbook.xml', '<workbook/>')
+        buffer.seek(0)
+        with self.assertRaises(importer.TaskImportError) as raised:
+            importer.import_tasks(importer.read_rows(buffer, 'plan.xlsx'))
+        self.assertIn('нет первого листа', raised.exception.errors[0])
+
+    def test_command(self):
+        path = self.enterContext(tempfile.NamedTemporaryFile(suffix='.csv'))
+        path.write(CSV.encode())
+        path.flush()
+        out = io.StringIO()
+        call_command('import_tasks', path.name, author='chief', stdout=out)
+        self.assertIn('Импортировано задач: 3', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('import_tasks', path.name, stdout=out)
+
+    def test_admin_upload(self):
+        superuser = UserFactory(username='root', is_staff=True, is_superuser=True)
+        client = Client()
+        client.force_login(superuser)
+        url = reverse('admin:tasks_task_import')
+        self.assertEqual(client.get(url).status_code, 200)
+        response = client.post(
+            url, {'file': SimpleUploadedFile('plan.csv', CSV.encode(), 'text/csv')}
+        )
+        self.assertRedirects(response, reverse('admin:tasks_task_changelist'))
+        self.assertEqual(Task.objects.count(), 3)
+
+        response = client.post(
+            url, {'file': SimpleUploadedFile('plan.csv', b'title\nx\n', 'text/csv')}
+        )
+        self.assertContains(response, 'Нет столбцов')
@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import Comment, Department, Task
+from tasks.tests.test_models import DepartmentFactory, TaskFactory, UserFactory
+
+# Проверка планов на большом объёме данных включается явно: EXPLAIN_TEST_ROWS=1000000
+ROWS = int(os.environ.get('EXPLAIN_TEST_ROWS') or 0)
+DEPARTMENTS = 100
+
+
+def used_indexes(queryset):
+    """Имена индексов, которые использует план запроса."""
+    plan = json.loads(queryset.explain(format='json'))
+
+    def walk(node):
+        if 'Index Name' in node:
+            yield node['Index Name']
+        for child in node.get('Plans', []):
+            yield from walk(child)
+
+    return set(walk(plan[0]['Plan']))
+
+
+@skipUnless(ROWS, 'задайте EXPLAIN_TEST_ROWS, чтобы проверить планы запросов')
+class QueryPlanIndexTest(TestCase):
+    """Проверяет по EXPLAIN, что горячие запросы используют индексы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        departments = [
+            DepartmentFactory(email=f'explain-{number}@kgok.ru') for number in range(DEPARTMENTS)
+        ]
+        cls.department = departments[0]
+        cls.author = UserFactory(department=cls.department)
+        cls.task = TaskFactory(assigned_to=cls.department, assigned_by=cls.author)
+        with connection.cursor() as cursor:
+            # Реалистичное распределение: большинство задач выполнено,
+            # просрочена малая доля открытых
+            cursor.execute(
+                f"""
+                INSERT INTO {Task._meta.db_table}
+                    (title, description, status, assigned_to_id, assigned_by_id,
+                     created_at, updated_at, due_date)
+                SELECT
+                    'Задача ' || g, '',
+                    (ARRAY['new', 'in_progress', 'postponed', 'completed', 'completed',
+                           'completed', 'completed', 'completed', 'completed',
+                           'completed'])[1 + g %% 10],
+                    (%s::bigint[])[1 + g %% %s],
+                    %s,
+                    now() - g * interval '1 minute',
+                    now(),
+                    now() + ((g %% 100) - 2) * interval '1 day'
+                FROM generate_series(1, %s) AS g
+                """,
+                [[d.id for d in departments], DEPARTMENTS, cls.author.id, ROWS],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {Comment._meta.db_table} (content, created_at, task_id, user_id)
+                SELECT 'Комментарий ' || g, now() - g * interval '1 second', t.id, %s
+                FROM generate_series(1, 20) AS g
+                CROSS JOIN (
+                    SELECT id FROM {Task._meta.db_table} ORDER BY id DESC LIMIT 5000
+                ) AS t
+                """,
+                [cls.author.id],
+            )
+            cursor.execute(f'ANALYZE {Task._meta.db_table}')
+            cursor.execute(f'ANALYZE {Comment._meta.db_table}')
+            cursor.execute(f'ANALYZE {Department._meta.db_table}')
+
+    def test_department_status_filter(self):
+        tasks = Task.objects.filter(assigned_to=self.department, status=Task.Status.NEW)
+        self.assertTrue(
+            used_indexes(tasks[:20])
+            & {'task_assigned_status_idx', 'task_assigned_created_idx'}
+        )
+        self.assertIn(
+            'task_assigned_status_idx',
+            used_indexes(tasks.values('status').annotate(count=Count('id'))),
+        )
+
+    def test_department_task_list_page(self):
+        tasks = Task.objects.filter(assigned_to=self.department).order_by('-created_at', '-id')
+        self.assertIn('task_assigned_created_idx', used_indexes(tasks[:21]))
+
+    def test_global_task_list_page(self):
+        self.assertIn('task_created_idx', used_indexes(Task.objects.all()[:21]))
+
+    def test_overdue_filter(self):
+        overdue = Task.objects.filter(
+            ~Q(status=Task.Status.COMPLETED), due_date__lt=timezone.now()
+        )
+        self.assertIn('task_open_due_date_idx', used_indexes(overdue))
+
+    def test_overdue_since_watermark(self):
+        now = timezone.now()
+        newly_overdue = Task.objects.exclude(status=Task.Status.COMPLETED).filter(
+            due_date__gte=now - timedelta(minutes=5), due_date__lt=now
+        )
+        self.assertIn('task_open_due_date_idx', used_indexes(newly_overdue))
+
+    def test_task_comments(self):
+        comments = Comment.objects.filter(task=self.task).order_by('created_at')
+        self.assertIn('comment_task_created_idx', used_indexes(comments))
+
+    def test_full_text_search(self):
+        self.assertIn('task_search_vector_idx', used_indexes(Task.objects.search('Задача 4242')))
+
+    def test_trigram_autocomplete(self):
+        tasks = Task.objects.filter(title__icontains='дача 42424')
+        self.assertIn('task_title_trgm_idx', used_indexes(tasks))
@@ -0,0 +1,271 @@
+import random
+import smtplib
+import socket
+import unittest
+
+from django.core import mail as outbox
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+
+from tasks import async_mail, mail
+from tasks.models import EmailConfiguration
+
+
+class FlakyBackend(EmailBackend):
+    """Почтовый backend, у которого первое соединение обрывается при отправке."""
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+        FlakyBackend.instances.append(self)
+
+    def close(self):
+        self.closed = True
+
+    def send_messages(self, messages):
+        if len(FlakyBackend.instances) == 1:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+class DroppingBackend(EmailBackend):
+    """Почтовый backend, теряющий связь после limit отправленных писем."""
+    limit = 2
+
+    def send_messages(self, messages):
+        if len(outbox.outbox) >= DroppingBackend.limit:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+class EmailConnectionManagerTest(TestCase):
+    def setUp(self):
+        self.config = EmailConfiguration.objects.create(
+            smtp_host='smtp.kgok.ru',
+            smtp_port=587,
+            smtp_user='robot',
+            smtp_password='secret',
+            from_email='robot@kgok.ru',
+        )
+        self.manager = mail.EmailConnectionManager()
+
+    def test_connection_reused_between_sends(self):
+        for number in range(3):
+            self.manager.send_mail(f'Письмо {number}', 'Текст', ['service@kgok.ru'])
+        self.assertEqual(self.manager.opened, 1)
+        self.assertEqual(len(outbox.outbox), 3)
+        self.assertEqual(outbox.outbox[0].from_email, 'robot@kgok.ru')
+
+    def test_reconnects_when_configuration_changes(self):
+        self.manager.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        self.config.from_email = 'notify@kgok.ru'
+        self.config.save()
+        self.manager.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        self.assertEqual(self.manager.opened, 2)
+        self.assertEqual(outbox.outbox[1].from_email, 'notify@kgok.ru')
+
+    def test_reconnects_after_idle_timeout(self):
+        manager = mail.EmailConnectionManager(idle_timeout=0)
+        manager.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        manager.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        self.assertEqual(manager.opened, 2)
+
+    def test_reconnects_after_disconnect(self):
+        FlakyBackend.instances = []
+        manager = mail.EmailConnectionManager(backend='tasks.tests.test_mail.FlakyBackend')
+        self.assertEqual(manager.send_mail('Письмо', 'Текст', ['service@kgok.ru']), 1)
+        self.assertEqual(len(FlakyBackend.instances), 2)
+        self.assertTrue(FlakyBackend.instances[0].closed)
+        self.assertEqual(len(outbox.outbox), 1)
+
+    def test_partial_send_reports_unsent_messages(self):
+        manager = mail.EmailConnectionManager(backend='tasks.tests.test_mail.DroppingBackend')
+        datatuple = [
+            (f'Письмо {number}', 'Текст', None, [f'user{number}@kgok.ru'])
+            for number in range(5)
+        ]
+        with self.assertRaises(mail.PartialDeliveryError) as error:
+            manager.send_mass_mail(datatuple)
+        self.assertEqual(error.exception.sent, 2)
+        self.assertEqual(error.exception.unsent, datatuple[2:])
+        self.assertEqual(len(outbox.outbox), 2)
+
+    def test_saving_configuration_closes_shared_connection(self):
+        mail.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        manager = mail.connections._managers[self.config.pk]
+        self.assertIsNotNone(manager._connection)
+        self.config.save()
+        self.assertIsNone(manager._connection)
+
+
+class HostBackend(EmailBackend):
+    """Почтовый backend: down.* отклоняет письма, drop.* теряет связь после двух писем."""
+
+    def __init__(self, host=None, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+
+    def send_messages(self, messages):
+        if self.host.startswith('down.'):
+            raise smtplib.SMTPServerDisconnected('Connection refused')
+        if self.host.startswith('drop.') and len(outbox.outbox) >= 2:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+@override_settings(SMTP_FAILURE_THRESHOLD=2, EMAIL_RATE_LIMIT_PER_SECOND=0)
+class SmtpPoolTest(TestCase):
+    def server(self, host, weight=1):
+        return EmailConfiguration.objects.create(
+            smtp_host=host,
+            smtp_port=25,
+            smtp_user='robot',
+            smtp_password='secret',
+            from_email=f'robot@{host}',
+            weight=weight,
+        )
+
+    def test_fails_over_and_opens_circuit(self):
+        down = self.server('down.kgok.ru', weight=100)
+        self.server('relay.kgok.ru')
+        pool = mail.SmtpPool(backend='tasks.tests.test_mail.HostBackend')
+        for _ in range(5):
+            pool.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        self.assertEqual(len(outbox.outbox), 5)
+        self.assertTrue(all(m.from_email == 'robot@relay.kgok.ru' for m in outbox.outbox))
+        self.assertTrue(pool.health()[down.pk][0])
+
+    def test_fails_over_only_unsent_messages(self):
+        self.server('drop.kgok.ru', weight=100)
+        self.server('relay.kgok.ru')
+        random.seed(1)
+        pool = mail.SmtpPool(backend='tasks.tests.test_mail.HostBackend')
+        datatuple = [
+            (f'Письмо {number}', 'Текст', None, [f'user{number}@kgok.ru'])
+            for number in range(5)
+        ]
+        self.assertEqual(pool.send_mass_mail(datatuple), 5)
+        self.assertEqual(
+            [message.from_email for message in outbox.outbox],
+            ['robot@drop.kgok.ru'] * 2 + ['robot@relay.kgok.ru'] * 3,
+        )
+        self.assertEqual(
+            [message.to[0] for message in outbox.outbox], [item[3][0] for item in datatuple]
+        )
+
+    def test_all_servers_down(self):
+        self.server('down.kgok.ru')
+        pool = mail.SmtpPool(backend='tasks.tests.test_mail.HostBackend')
+        with self.assertRaises(mail.SmtpServersUnavailable):
+            pool.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+
+    def test_sends_spread_by_weight(self):
+        self.server('main.kgok.ru', weight=3)
+        self.server('spare.kgok.ru', weight=1)
+        random.seed(1)
+        pool = mail.SmtpPool()
+        for _ in range(400):
+            pool.send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        main = sum(message.from_email == 'robot@main.kgok.ru' for message in outbox.outbox)
+        self.assertTrue(260 < main < 340, main)
+
+    def test_inactive_servers_skipped(self):
+        self.server('main.kgok.ru')
+        spare = self.server('spare.kgok.ru')
+        spare.is_active = False
+        spare.save()
+        mail.SmtpPool().send_mail('Письмо', 'Текст', ['service@kgok.ru'])
+        self.assertEqual(outbox.outbox[0].from_email, 'robot@main.kgok.ru')
+
+    def test_zero_weight_servers_skipped(self):
+        self.server('main.kgok.ru')
+        spare = self.server('spare.kgok.ru', weight=0)
+        with self.assertRaises(ValidationError):
+            spare.full_clean()
+        self.assertEqual(
+            [smtp_settings.host for _, smtp_settings, _ in mail.active_smtp_servers()],
+            ['main.kgok.ru'],
+        )
+
+
+def free_port():
+    """Свободный локальный порт для тестового SMTP-сервера."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    """SMTP-сервер aiosmtpd, временно отклоняющий первые failures писем."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.failures:
+            self.failures -= 1
+            return '451 Try again later'
+        self.received.append(envelope.rcpt_tos[0])
+        return '250 OK'
+
+
+@override_settings(
+    EMAIL_BACKEND=async_mail.SMTP_BACKEND,
+    EMAIL_RATE_LIMIT_PER_SECOND=0,
+    EMAIL_ASYNC_CONCURRENCY=4,
+)
+class AsyncDeliveryTest(TestCase):
+    def setUp(self):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise unittest.SkipTest('Нужен пакет aiosmtpd')
+        self.handler = RecordingHandler()
+        controller = Controller(self.handler, hostname='127.0.0.1', port=free_port())
+        controller.start()
+        self.addCleanup(controller.stop)
+        EmailConfiguration.objects.create(
+            smtp_host='127.0.0.1',
+            smtp_port=controller.port,
+            use_tls=False,
+            from_email='robot@kgok.ru',
+        )
+
+    def batch(self, count):
+        return [
+            (f'Письмо {number}', 'Текст', '<p>Текст</p>', [f'user{number}@kgok.ru'])
+            for number in range(count)
+        ]
+
+    def test_batch_sent_concurrently(self):
+        self.assertEqual(async_mail.deliver(self.batch(50)), [])
+        self.assertEqual(len(self.handler.received), 50)
+        self.assertEqual(len(set(self.handler.received)), 50)
+
+    @override_settings(SMTP_FAILURE_THRESHOLD=1)
+    def test_fails_over_to_next_server(self):
+        # На порту никто не слушает: соединения не открываются
+        down = EmailConfiguration.objects.create(
+            smtp_host='127.0.0.1',
+            smtp_port=free_port(),
+            use_tls=False,
+            from_email='robot@kgok.ru',
+            weight=100,
+        )
+        random.seed(1)
+        self.assertEqual(async_mail.deliver(self.batch(10)), [])
+        self.assertEqual(len(self.handler.received), 10)
+        self.assertTrue(mail.connections.health()[down.pk][0])
+
+    def test_failed_messages_returned(self):
+        self.handler.failures = 3
+        failed = async_mail.deliver(self.batch(10))
+        self.assertEqual(len(failed), 3)
+        self.assertEqual(len(self.handler.received), 7)
+        self.assertEqual(
+            sorted(self.handler.received + [item[3][0] for item in failed]),
+            sorted(item[3][0] for item in self.batch(10)),
+        )
@@ -0,0 +1,126 @@
+import itertools
+from unittest import mock
+
+from django.contrib.auth.forms import AuthenticationForm
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from tasks import metrics
+from tasks.tests.test_models import DepartmentFactory, TaskFactory, UserFactory
+
+
+def sample(text, name, **labels):
+    """Значение ряда метрики из текста /metrics."""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    prefix = f'{name}{{{label_text}}} ' if labels else f'{name} '
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return None
+
+
+class MetricTypesTest(TestCase):
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram('test_seconds', 'Тест', ('view',), buckets=(0.1, 1.0))
+        histogram.observe(('a"b',), 0.1)
+        histogram.observe(('a"b',), 0.5)
+        histogram.observe(('a"b',), 3)
+        self.assertEqual(
+            histogram.render(),
+            [
+                '# HELP test_seconds Тест',
+                '# TYPE test_seconds histogram',
+                'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+                'test_seconds_bucket{view="a\\"b",le="1.0"} 2',
+                'test_seconds_bucket{view="a\\"b",le="+Inf"} 3',
+                'test_seconds_sum{view="a\\"b"} 3.6',
+                'test_seconds_count{view="a\\"b"} 3',
+            ],
+        )
+
+    def test_counter(self):
+        counter = metrics.Counter('test_total', 'Тест')
+        counter.inc()
+        counter.inc(amount=2)
+        self.assertEqual(counter.render()[-1], 'test_total 3')
+
+
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        department = DepartmentFactory()
+        self.user = UserFactory(department=department)
+        TaskFactory(assigned_to=department)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_view_is_measured(self):
+        before = metrics.REGISTRY.render()
+        self.assertEqual(self.client.get(reverse('task_list')).status_code, 200)
+        self.client.get('/no-such-page/')
+        after = self.client.get(reverse('metrics'))
+        self.assertEqual(after['Content-Type'], metrics.CONTENT_TYPE)
+        text = after.content.decode()
+
+        def delta(name, **labels):
+            return sample(text, name, **labels) - (sample(before, name, **labels) or 0)
+
+        self.assertEqual(
+            delta('kapantask_http_requests_total', view='task_list', method='GET', status='200'),
+            1,
+        )
+        self.assertEqual(
+            delta('kapantask_http_request_duration_seconds_count', view='task_list', method='GET'),
+            1,
+        )
+        self.assertEqual(
+            delta('kapantask_http_requests_total', view='<unresolved>', method='GET', status='404'),
+            1,
+        )
+        self.assertGreater(delta('kapantask_http_request_sql_queries_sum', view='task_list'), 0)
+        self.assertGreater(delta('kapantask_http_sql_seconds_total', view='task_list'), 0)
+        self.assertGreater(
+            delta('kapantask_http_template_render_seconds_total', view='task_list'), 0
+        )
+        # Опрос метрик в них не попадает
+        self.assertNotIn('view="metrics"', text)
+
+    def test_nested_templates_counted_once(self):
+        # bootstrap_form рендерит поля через get_template() внутри страницы
+        template = get_template('registration/login.html')
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        self.addCleanup(metrics.current_request.reset, token)
+        # Часы сдвигаются на секунду при каждом обращении
+        with mock.patch.object(metrics, 'perf_counter', side_effect=itertools.count()):
+            html = template.render({'form': AuthenticationForm()})
+        self.assertIn('id_username', html)
+        self.assertEqual(stats.template_seconds, 1)
+
+    def test_unknown_methods_share_label(self):
+        before = metrics.REGISTRY.render()
+        for method in ('PROPFIND', 'X-RANDOM-1', 'X-RANDOM-2'):
+            self.client.generic(method, reverse('task_list'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        name = 'kapantask_http_request_duration_seconds_count'
+        labels = {'view': 'task_list', 'method': 'other'}
+        self.assertEqual(sample(text, name, **labels) - (sample(before, name, **labels) or 0), 3)
+        self.assertNotIn('PROPFIND', text)
+
+    def test_without_token_only_internal_direct_requests(self):
+        client = Client()
+        url = reverse('metrics')
+        self.assertEqual(client.get(url, REMOTE_ADDR='10.0.3.7').status_code, 200)
+        self.assertEqual(client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 403)
+        # Запрос через Nginx: адрес прокси внутренний, но клиент внешний
+        response = client.get(url, REMOTE_ADDR='10.0.3.2', HTTP_X_FORWARDED_FOR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        client = Client()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
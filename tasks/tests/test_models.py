@@ -1,11 +1,21 @@
 from datetime import timedelta
+from unittest import mock
 
+from django.db import DatabaseError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from factory import Faker, SubFactory
 from factory.django import DjangoModelFactory
 
-from tasks.models import Comment, Department, EmailConfiguration, Task, User
+from tasks.models import (
+    Comment,
+    Department,
+    DepartmentTaskStats,
+    EmailConfiguration,
+    Task,
+    User,
+)
 
 
 class DepartmentFactory(DjangoModelFactory):
@@ -126,6 +136,161 @@ class TaskModelTest(TestCase):
         )
         self.assertFalse(completed_task.is_overdue)
 
+    def test_overdue_annotation(self):
+        now = timezone.now()
+        overdue = TaskFactory(due_date=now - timedelta(days=1), status=Task.Status.NEW)
+        TaskFactory(due_date=now + timedelta(days=1), status=Task.Status.NEW)
+        TaskFactory(due_date=now - timedelta(days=1), status=Task.Status.COMPLETED)
+
+        annotated = Task.objects.with_overdue(now)
+        for task in annotated:
+            self.assertEqual(task.overdue, task.is_overdue)
+        self.assertEqual(list(Task.objects.overdue(now)), [overdue])
+        self.assertEqual(annotated.filter(overdue=True).count(), 1)
+        self.assertEqual(annotated.order_by('-overdue', 'id').first(), overdue)
+
+
+class TaskStatsTest(TestCase):
+    def setUp(self):
+        self.department = DepartmentFactory()
+        self.other_department = DepartmentFactory()
+        now = timezone.now()
+        TaskFactory(assigned_to=self.department, status=Task.Status.COMPLETED,
+                    due_date=now - timedelta(days=1))
+        TaskFactory(assigned_to=self.department, status=Task.Status.IN_PROGRESS,
+                    due_date=now - timedelta(days=1))
+        TaskFactory(assigned_to=self.department, status=Task.Status.NEW,
+                    due_date=now + timedelta(days=1))
+
+    def test_stats(self):
+        stats = Task.objects.filter(assigned_to=self.department).stats()
+        self.assertEqual(
+            stats, {'total': 3, 'completed': 1, 'in_progress': 1, 'overdue': 1}
+        )
+
+    def test_dashboard_stats(self):
+        with self.assertNumQueries(1):
+            totals, department_stats = Task.objects.dashboard_stats()
+        self.assertEqual(totals['total'], 3)
+        by_department = {stat['department']: stat for stat in department_stats}
+        self.assertEqual(by_department[self.department]['completed'], 1)
+        self.assertEqual(by_department[self.department]['overdue'], 1)
+        self.assertEqual(by_department[self.other_department]['total'], 0)
+
+
+class DepartmentTaskStatsTest(TestCase):
+    def setUp(self):
+        self.department = DepartmentFactory()
+        self.other_department = DepartmentFactory()
+
+    def counts(self, department):
+        return dict(
+            DepartmentTaskStats.objects.filter(department=department)
+            .values_list('status', 'count')
+        )
+
+    def test_create_and_status_change(self):
+        task = TaskFactory(assigned_to=self.department, status=Task.Status.NEW)
+        self.assertEqual(self.counts(self.department)[Task.Status.NEW], 1)
+
+        task.status = Task.Status.COMPLETED
+        task.save()
+        counts = self.counts(self.department)
+        self.assertEqual(counts[Task.Status.NEW], 0)
+        self.assertEqual(counts[Task.Status.COMPLETED], 1)
+
+    def test_counter_failure_rolls_back_task(self):
+        with mock.patch.object(
+            DepartmentTaskStats.objects, 'apply_change', side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            TaskFactory(assigned_to=self.department)
+        self.assertFalse(Task.objects.exists())
+
+    def test_change_waits_for_overdue_refresh(self):
+        task = TaskFactory(assigned_to=self.department)
+        task.assigned_to = self.other_department
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+        # Те же строки, что блокирует refresh_overdue, в порядке служб
+        locks = [query['sql'] for query in queries if 'FOR UPDATE' in query['sql']]
+        self.assertEqual(len(locks), 1)
+        self.assertIn('"overdue"', locks[0].replace("'", '"'))
+
+    def test_reassignment_and_delete(self):
+        task = TaskFactory(assigned_to=self.department, status=Task.Status.IN_PROGRESS)
+        task.assigned_to = self.other_department
+        task.save()
+        self.assertEqual(self.counts(self.department)[Task.Status.IN_PROGRESS], 0)
+        self.assertEqual(self.counts(self.other_department)[Task.Status.IN_PROGRESS], 1)
+
+        task.delete()
+        self.assertEqual(self.counts(self.other_department)[Task.Status.IN_PROGRESS], 0)
+
+    def test_apply_changes_batch(self):
+        task = TaskFactory(assigned_to=self.department, status=Task.Status.NEW)
+        task.refresh_from_db()
+        key = (self.department.id, Task.Status.NEW, task.due_date)
+        # Как в рабочей базе: у служб уже есть счётчики просроченных задач
+        DepartmentTaskStats.objects.rebuild()
+        with self.assertNumQueries(5):
+            DepartmentTaskStats.objects.apply_changes([
+                (key, (self.other_department.id, Task.Status.NEW, task.due_date)),
+                (None, (self.other_department.id, Task.Status.NEW, task.due_date)),
+                (None, (self.other_department.id, Task.Status.COMPLETED, task.due_date)),
+            ])
+        self.assertEqual(self.counts(self.department)[Task.Status.NEW], 0)
+        self.assertEqual(
+            self.counts(self.other_department),
+            {Task.Status.NEW: 2, Task.Status.COMPLETED: 1, DepartmentTaskStats.OVERDUE: 0},
+        )
+
+    def test_refresh_overdue(self):
+        now = timezone.now()
+        DepartmentTaskStats.objects.rebuild(now=now - timedelta(days=2))
+        TaskFactory(assigned_to=self.department, due_date=now - timedelta(days=1))
+        TaskFactory(assigned_to=self.department, due_date=now - timedelta(days=3))
+        TaskFactory(assigned_to=self.department, due_date=now + timedelta(days=1))
+        self.assertEqual(self.counts(self.department)[DepartmentTaskStats.OVERDUE], 1)
+
+        DepartmentTaskStats.objects.refresh_overdue(now=now)
+        self.assertEqual(self.counts(self.department)[DepartmentTaskStats.OVERDUE], 2)
+
+    def test_matches_task_aggregation(self):
+        now = timezone.now()
+        TaskFactory(assigned_to=self.department, status=Task.Status.COMPLETED,
+                    due_date=now - timedelta(days=1))
+        TaskFactory(assigned_to=self.department, due_date=now - timedelta(days=1))
+        TaskFactory(assigned_to=self.other_department, status=Task.Status.IN_PROGRESS,
+                    due_date=now + timedelta(days=1))
+        DepartmentTaskStats.objects.rebuild(now=now)
+
+        with self.assertNumQueries(1):
+            from_counters = DepartmentTaskStats.objects.dashboard_stats()
+        self.assertEqual(from_counters, Task.objects.dashboard_stats(now=now))
+
+
+class TaskSearchTest(TestCase):
+    def setUp(self):
+        self.report = TaskFactory(
+            title='Подготовить геологический отчет', description='Квартальный'
+        )
+        self.survey = TaskFactory(title='Маркшейдерская съемка', description='Участок №3')
+
+    def test_search_uses_russian_stemming(self):
+        self.assertEqual(list(Task.objects.search('отчеты')), [self.report])
+
+    def test_search_covers_comments(self):
+        CommentFactory(task=self.survey, content='Нужны координаты скважин')
+        self.assertEqual(list(Task.objects.search('скважина')), [self.survey])
+
+        self.survey.comments.all().delete()
+        self.assertFalse(Task.objects.search('скважина').exists())
+
+    def test_search_ranks_title_above_description(self):
+        in_description = TaskFactory(title='Анализ проб', description='Сверить с отчетом')
+        results = list(Task.objects.search('отчет').order_by('-rank'))
+        self.assertEqual(results, [self.report, in_description])
+
 
 class CommentModelTest(TestCase):
     def test_comment_creation(self):
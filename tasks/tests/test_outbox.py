@@ -0,0 +1,78 @@
+from unittest import mock
+
+from celery import current_app
+from django.core import mail as outbox_mail
+from django.db import DatabaseError, transaction
+from django.test import TestCase, override_settings
+
+from tasks import outbox
+from tasks.models import Comment, OutboxMessage, Task
+from tasks.tasks import send_task_notification
+from tasks.tests.test_models import CommentFactory, TaskFactory
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        # Релей публикует задачи, которые выполняются сразу же в процессе теста
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', eager)
+
+    def test_task_creation_writes_outbox_instead_of_publishing(self):
+        task = TaskFactory()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task_name, 'tasks.tasks.send_task_notification')
+        self.assertEqual(message.args, [task.id])
+        self.assertIsNone(message.published_at)
+
+    def test_outbox_rolled_back_with_task(self):
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            TaskFactory()
+            raise DatabaseError
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_task_not_saved_without_outbox_message(self):
+        with mock.patch.object(outbox, 'enqueue', side_effect=DatabaseError), self.assertRaises(
+            DatabaseError
+        ):
+            TaskFactory()
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(COMMENT_NOTIFICATION_DIGEST=False)
+    def test_comment_not_saved_without_outbox_message(self):
+        task = TaskFactory()
+        with mock.patch.object(outbox, 'enqueue', side_effect=DatabaseError), self.assertRaises(
+            DatabaseError
+        ):
+            CommentFactory(task=task)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_enqueue_deduplicates_by_key(self):
+        outbox.enqueue('tasks.tasks.send_task_notification', 1, key='task:1')
+        outbox.enqueue('tasks.tasks.send_task_notification', 1, key='task:1')
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    @override_settings(COMMENT_NOTIFICATION_DIGEST=False)
+    def test_relay_publishes_in_batches(self):
+        task = TaskFactory()
+        for _ in range(4):
+            CommentFactory(task=task)
+        self.assertEqual(outbox.relay(batch_size=3), 3)
+        self.assertEqual(outbox.relay_all(batch_size=3), 2)
+        self.assertFalse(OutboxMessage.objects.filter(published_at__isnull=True).exists())
+        # Задачи выполнены и отмечены как обработанные
+        self.assertFalse(OutboxMessage.objects.filter(delivered_at__isnull=True).exists())
+
+    def test_redelivered_message_skipped(self):
+        TaskFactory()
+        message = OutboxMessage.objects.get()
+        outbox.relay()
+        message.refresh_from_db()
+        self.assertIsNotNone(message.delivered_at)
+        sent = len(outbox_mail.outbox)
+        result = send_task_notification.apply(
+            args=message.args, task_id=f'{outbox.TASK_ID_PREFIX}{message.pk}'
+        ).get()
+        self.assertIn('уже обработано', result)
+        self.assertEqual(len(outbox_mail.outbox), sent)
@@ -0,0 +1,121 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from tasks import slow_queries, sqlcomments
+from tasks.models import Task
+from tasks.tests.test_models import DepartmentFactory, TaskFactory, UserFactory
+
+
+def statements_available():
+    # Модуль должен быть загружен сервером (shared_preload_libraries)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_stat_statements'"
+            )
+            if not cursor.fetchone():
+                return False
+            cursor.execute('SHOW shared_preload_libraries')
+            return 'pg_stat_statements' in cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+class SqlCommentTest(TestCase):
+    def test_comment_appended(self):
+        executed = []
+
+        def execute(sql, params, many, context):
+            executed.append(sql)
+
+        sqlcomments.execute_wrapper(execute, 'SELECT 1', None, False, {})
+        with sqlcomments.tagged('view', 'admin:tasks_task_changelist'):
+            sqlcomments.execute_wrapper(execute, 'SELECT 2', None, False, {})
+            with sqlcomments.tagged('task', "evil */ DROP %s"):
+                sqlcomments.execute_wrapper(execute, 'SELECT 3', None, False, {})
+        self.assertEqual(
+            executed,
+            [
+                'SELECT 1',
+                'SELECT 2 /* kapantask view=admin:tasks_task_changelist */',
+                'SELECT 3 /* kapantask task=evil____DROP__s */',
+            ],
+        )
+        self.assertEqual(sqlcomments.source(executed[1]), 'view=admin:tasks_task_changelist')
+        self.assertIsNone(sqlcomments.source(executed[0]))
+
+
+class MissingExtensionTest(TestCase):
+    def test_report_explains_missing_extension(self):
+        # Как в базе, где миграции выполнял пользователь без прав суперпользователя
+        with connection.cursor() as cursor:
+            cursor.execute('DROP EXTENSION IF EXISTS pg_stat_statements')
+        with self.assertRaisesMessage(slow_queries.SlowQueryError, 'не установлено'):
+            slow_queries.top_statements()
+        with self.assertRaisesMessage(CommandError, 'CREATE EXTENSION pg_stat_statements'):
+            call_command('slow_queries', '--reset', stdout=StringIO())
+
+
+@skipUnless(statements_available(), 'pg_stat_statements не загружен сервером')
+class SlowQueryReportTest(TestCase):
+    def setUp(self):
+        self.task = TaskFactory(assigned_to=DepartmentFactory())
+
+    def test_report_and_explain(self):
+        # Исполняется и в представлениях через QueryCommentMiddleware
+        user = UserFactory(is_superuser=True, is_staff=True, is_admin=True)
+        client = Client()
+        client.force_login(user)
+        client.get(reverse('task_detail', args=[self.task.pk]))
+        self.assertTrue(slow_queries.top_statements(limit=1, source='view=task_detail'))
+
+        with sqlcomments.tagged('task', 'slow_query_test'):
+            Task.objects.filter(pk=self.task.pk).count()
+        statement, = slow_queries.top_statements(source='task=slow_query_test')
+        self.assertEqual(statement.parameter_count, 1)
+        self.assertGreaterEqual(statement.calls, 1)
+
+        plan = slow_queries.explain(statement.query, [str(self.task.pk)])
+        self.assertIn('actual time', plan)
+        self.assertIn('Buffers', plan)
+        with self.assertRaisesMessage(slow_queries.SlowQueryError, 'read-only'):
+            slow_queries.explain('UPDATE tasks_task SET title = $1', ['x'])
+        self.task.refresh_from_db()
+        self.assertNotEqual(self.task.title, 'x')
+
+        out = StringIO()
+        call_command('slow_queries', '--source=task=slow_query_test', stdout=out)
+        self.assertIn(f'{statement.queryid} [task=slow_query_test]', out.getvalue())
+        out = StringIO()
+        call_command(
+            'slow_queries', f'--explain={statement.queryid}', f'--param={self.task.pk}',
+            stdout=out,
+        )
+        self.assertIn('Execution Time', out.getvalue())
+
+    def test_admin_page(self):
+        url = reverse('admin_slow_queries')
+        staff = Client()
+        staff.force_login(UserFactory(is_staff=True))
+        self.assertEqual(staff.get(url).status_code, 403)
+
+        client = Client()
+        client.force_login(UserFactory(is_superuser=True, is_staff=True))
+        with sqlcomments.tagged('task', 'slow_query_admin_test'):
+            Task.objects.filter(assigned_to=self.task.assigned_to_id).count()
+        response = client.get(url, {'source': 'task=slow_query_admin_test', 'order': 'mean'})
+        statement = response.context['statements'][0]
+        self.assertContains(response, f'?queryid={statement.queryid}')
+
+        response = client.post(
+            f'{url}?queryid={statement.queryid}', {'p1': self.task.assigned_to_id}
+        )
+        self.assertContains(response, 'Execution Time')
+        response = client.post(f'{url}?queryid={statement.queryid}', {'p1': 'abc'})
+        self.assertContains(response, 'EXPLAIN не выполнен')
+        self.assertEqual(client.get(url, {'queryid': '1'}).status_code, 404)
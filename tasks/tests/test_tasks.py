@@ -0,0 +1,256 @@
+import smtplib
+from io import StringIO
+
+from celery import current_app
+from django.core import mail as outbox
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from tasks import async_mail, mail
+from tasks.models import (
+    DeadLetter,
+    DeliveryAttempt,
+    EmailConfiguration,
+    OutboxMessage,
+    PendingCommentNotification,
+)
+from tasks.tasks import (
+    send_comment_digests,
+    send_comment_notification,
+    send_notification_batch,
+    send_task_notification,
+)
+from tasks.tests.test_mail import DroppingBackend, RecordingHandler, free_port
+from tasks.tests.test_models import (
+    CommentFactory,
+    DepartmentFactory,
+    TaskFactory,
+    UserFactory,
+)
+
+
+@override_settings(COMMENT_NOTIFICATION_DIGEST=True)
+class CommentDigestTest(TestCase):
+    def setUp(self):
+        # Релей публикует задачи, которые выполняются сразу же в процессе теста
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', eager)
+        self.department = DepartmentFactory(email='service@kgok.ru')
+        self.author = UserFactory(email='planner@kgok.ru')
+        self.worker = UserFactory(email='worker@kgok.ru', department=self.department)
+        self.task = TaskFactory(assigned_to=self.department, assigned_by=self.author)
+
+    def test_comments_sent_as_one_digest_per_recipient(self):
+        for number in range(20):
+            CommentFactory(task=self.task, user=self.worker, content=f'Замечание {number}')
+        self.assertEqual(PendingCommentNotification.objects.count(), 20)
+        self.assertEqual(len(outbox.outbox), 0)
+
+        send_comment_digests()
+
+        self.assertEqual(len(outbox.outbox), 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in outbox.outbox),
+            ['planner@kgok.ru', 'service@kgok.ru'],
+        )
+        self.assertIn('Замечание 19', outbox.outbox[0].body)
+        self.assertIn('Замечание 0', outbox.outbox[0].alternatives[0][0])
+        self.assertFalse(PendingCommentNotification.objects.exists())
+
+    def test_comment_author_excluded(self):
+        CommentFactory(task=self.task, user=self.author)
+        send_comment_digests()
+        self.assertEqual([message.to for message in outbox.outbox], [['service@kgok.ru']])
+
+    @override_settings(EMAIL_RATE_LIMIT_PER_SECOND=0)
+    def test_query_count_independent_of_comment_count(self):
+        def flush_queries(comments):
+            for _ in range(comments):
+                CommentFactory(task=TaskFactory(), user=self.worker)
+            with CaptureQueriesContext(connection) as queries:
+                send_comment_digests()
+            return len(queries)
+
+        self.assertEqual(flush_queries(3), flush_queries(30))
+
+    @override_settings(EMAIL_ASYNC_DELIVERY=True)
+    def test_async_delivery_hands_batch_to_task(self):
+        OutboxMessage.objects.all().delete()
+        for _ in range(3):
+            CommentFactory(task=self.task, user=self.worker)
+        send_comment_digests()
+        self.assertEqual(len(outbox.outbox), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task_name, 'tasks.tasks.send_notification_batch')
+
+        call_command('relay_outbox', stdout=StringIO())
+        self.assertEqual(
+            sorted(message.to[0] for message in outbox.outbox),
+            ['planner@kgok.ru', 'service@kgok.ru'],
+        )
+
+
+class NotificationTaskTest(TestCase):
+    def setUp(self):
+        self.department = DepartmentFactory(email='service@kgok.ru')
+        self.author = UserFactory(email='planner@kgok.ru')
+        self.task = TaskFactory(
+            title='Замена футеровки <мельницы>',
+            assigned_to=self.department,
+            assigned_by=self.author,
+        )
+
+    def test_task_notification_plain_text_template(self):
+        # Задача со службой и автором, настройки SMTP, лимит отправки и журнал попытки
+        with self.assertNumQueries(4):
+            result = send_task_notification.apply(args=[self.task.id]).get()
+        self.assertIn('успешно отправлено', result)
+        message = outbox.outbox[0]
+        self.assertEqual(message.to, ['service@kgok.ru'])
+        self.assertIn('Замена футеровки <мельницы>', message.body)
+        self.assertIn('&lt;мельницы&gt;', message.alternatives[0][0])
+
+    @override_settings(COMMENT_NOTIFICATION_DIGEST=False)
+    def test_comment_notification_one_message_per_recipient(self):
+        comment = CommentFactory(task=self.task, user=UserFactory())
+        with self.assertNumQueries(4):
+            send_comment_notification.apply(args=[comment.id]).get()
+        self.assertEqual(
+            sorted(message.to[0] for message in outbox.outbox),
+            ['planner@kgok.ru', 'service@kgok.ru'],
+        )
+        self.assertEqual(outbox.outbox[0].body, outbox.outbox[1].body)
+
+
+class UnavailableBackend(EmailBackend):
+    """Почтовый сервер, временно отклоняющий письма первые failures раз."""
+    failures = 0
+
+    def send_messages(self, messages):
+        if UnavailableBackend.failures:
+            UnavailableBackend.failures -= 1
+            raise smtplib.SMTPDataError(451, 'Try again later')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='tasks.tests.test_tasks.UnavailableBackend')
+class NotificationRetryTest(TestCase):
+    def setUp(self):
+        mail.connections.invalidate()
+        self.addCleanup(mail.connections.invalidate)
+        self.task = TaskFactory()
+
+    def test_transient_error_retried(self):
+        UnavailableBackend.failures = 2
+        send_task_notification.apply(args=[self.task.id])
+        self.assertEqual(len(outbox.outbox), 1)
+        self.assertEqual(
+            list(DeliveryAttempt.objects.order_by('id').values_list('attempt', 'outcome')),
+            [(1, 'retry'), (2, 'retry'), (3, 'sent')],
+        )
+        self.assertFalse(DeadLetter.objects.exists())
+
+    def test_dead_letter_and_replay(self):
+        UnavailableBackend.failures = 100
+        send_task_notification.apply(args=[self.task.id])
+        letter = DeadLetter.objects.get()
+        self.assertEqual(letter.args, [self.task.id])
+        self.assertEqual(letter.attempts, send_task_notification.max_retries + 1)
+        self.assertEqual(DeliveryAttempt.objects.filter(outcome='failed').count(), 1)
+
+        OutboxMessage.objects.all().delete()
+        call_command('replay_dead_letters', stdout=StringIO())
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.args, [self.task.id])
+        letter.refresh_from_db()
+        self.assertIsNotNone(letter.replayed_at)
+
+
+@override_settings(
+    EMAIL_BACKEND='tasks.tests.test_mail.DroppingBackend',
+    EMAIL_RATE_LIMIT_PER_SECOND=0,
+    COMMENT_NOTIFICATION_DIGEST=False,
+)
+class PartialDeliveryTest(TestCase):
+    def setUp(self):
+        mail.connections.invalidate()
+        self.addCleanup(mail.connections.invalidate)
+        self.addCleanup(setattr, DroppingBackend, 'limit', DroppingBackend.limit)
+        DroppingBackend.limit = 1
+        self.comment = CommentFactory()
+
+    def test_only_unsent_messages_retried(self):
+        send_comment_notification.apply(args=[self.comment.id])
+        self.assertEqual(len(outbox.outbox), 1)
+        self.assertEqual(
+            list(DeliveryAttempt.objects.values_list('outcome', flat=True)), ['sent']
+        )
+        message = OutboxMessage.objects.get(task_name='tasks.tasks.send_notification_batch')
+        self.assertEqual(len(message.args[0]), 1)
+
+        DroppingBackend.limit = 10
+        send_notification_batch.apply(args=message.args)
+        self.assertEqual(
+            sorted(email.to[0] for email in outbox.outbox),
+            sorted([self.comment.task.assigned_to.email, self.comment.task.assigned_by.email]),
+        )
+
+
+class TokenBucketTest(TestCase):
+    def test_bucket_shared_by_host(self):
+        bucket = mail.TokenBucket(rate=0.5, capacity=3, max_wait=0)
+        self.assertEqual(bucket.take('smtp.kgok.ru', 5)[0], 3)
+        self.assertEqual(bucket.take('smtp.kgok.ru', 1)[0], 0)
+        self.assertEqual(bucket.take('relay.kgok.ru', 1)[0], 1)
+        with self.assertRaises(mail.RateLimitExceeded):
+            bucket.acquire('smtp.kgok.ru', 1)
+
+
+@override_settings(EMAIL_RATE_LIMIT_PER_SECOND=0)
+class NotificationBatchTest(TestCase):
+    def test_only_failed_messages_retried(self):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            self.skipTest('Нужен пакет aiosmtpd')
+        handler = RecordingHandler(failures=2)
+        controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+        controller.start()
+        self.addCleanup(controller.stop)
+        EmailConfiguration.objects.create(
+            smtp_host='127.0.0.1',
+            smtp_port=controller.port,
+            use_tls=False,
+            from_email='robot@kgok.ru',
+        )
+        batch = [
+            ('Сводка', 'Текст', None, [f'user{number}@kgok.ru']) for number in range(6)
+        ]
+        with override_settings(EMAIL_BACKEND=async_mail.SMTP_BACKEND):
+            send_notification_batch.apply(args=[batch])
+        self.assertEqual(sorted(handler.received), sorted(item[3][0] for item in batch))
+        self.assertEqual(
+            list(DeliveryAttempt.objects.order_by('id').values_list('outcome', flat=True)),
+            ['retry', 'sent'],
+        )
+
+
+class NotificationBenchmarkTest(TestCase):
+    def test_benchmark_reports_latency_and_rolls_back(self):
+        try:
+            import aiosmtpd  # noqa: F401
+        except ImportError:
+            self.skipTest('Нужен пакет aiosmtpd')
+        stdout = StringIO()
+        call_command(
+            'benchmark_notifications', tasks=2, comments=3, port=free_port(), stdout=stdout
+        )
+        output = stdout.getvalue()
+        self.assertIn('Событий: 5, писем принято: 8 из 8', output)
+        self.assertIn('Комментарий: save() → DATA p50', output)
+        self.assertFalse(EmailConfiguration.objects.exists())
+        self.assertFalse(DeliveryAttempt.objects.exists())
@@ -1,15 +1,48 @@
+import csv
+import io
+import tempfile
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from xml.etree import ElementTree
+
+from celery import current_app
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-
-from tasks.models import Department, Task
-from tasks.tests.test_models import DepartmentFactory, TaskFactory, UserFactory
+from django.utils import timezone
+
+from tasks import outbox
+from tasks.cache import cache_stats
+from tasks.management.commands import fetch_vendor_assets
+from tasks.models import (
+    Comment,
+    Department,
+    DepartmentTaskStats,
+    EmailConfiguration,
+    OutboxMessage,
+    Task,
+)
+from tasks.tests.test_models import (
+    CommentFactory,
+    DepartmentFactory,
+    TaskFactory,
+    UserFactory,
+)
 
 User = get_user_model()
 
 
 class ViewsTestCase(TestCase):
     def setUp(self):
+        cache.clear()
+
         # Создаем администратора
         self.admin_user = UserFactory(
             username='admin',
@@ -111,6 +144,42 @@ class DashboardViewTest(ViewsTestCase):
         self.assertIn('in_progress_tasks', response.context)
         self.assertIn('overdue_tasks', response.context)
 
+    def test_dashboard_admin_query_count_constant(self):
+        # Число запросов не должно зависеть от количества служб
+        with CaptureQueriesContext(connection) as initial:
+            self.admin_client.get(reverse('dashboard'))
+
+        # Кэш сбрасывается после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                TaskFactory(assigned_to=DepartmentFactory(), assigned_by=self.admin_user)
+
+        with self.assertNumQueries(len(initial)):
+            response = self.admin_client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['department_stats']), 6)
+        self.assertEqual(response.context['total_tasks'], 6)
+
+    def test_dashboard_cached_until_department_changes(self):
+        self.service_client.get(reverse('dashboard'))
+        response = self.service_client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_tasks'], 1)
+        self.assertEqual(cache_stats()['dashboard'], {'hits': 1, 'misses': 1})
+
+        # Изменения в другой службе не сбрасывают кэш
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskFactory(assigned_to=DepartmentFactory(), assigned_by=self.admin_user)
+        self.service_client.get(reverse('dashboard'))
+        self.assertEqual(cache_stats()['dashboard'], {'hits': 2, 'misses': 1})
+
+        # До коммита поколение не меняется
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskFactory(assigned_to=self.department, assigned_by=self.admin_user)
+            self.service_client.get(reverse('dashboard'))
+            self.assertEqual(cache_stats()['dashboard'], {'hits': 3, 'misses': 1})
+        response = self.service_client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_tasks'], 2)
+        self.assertEqual(cache_stats()['dashboard'], {'hits': 3, 'misses': 2})
+
     def test_dashboard_view_unauthenticated(self):
         response = self.client.get(reverse('dashboard'))
         self.assertRedirects(response, f"{reverse('login')}?next={reverse('dashboard')}")
@@ -129,6 +198,23 @@ class TaskListViewTest(ViewsTestCase):
         self.assertTemplateUsed(response, 'tasks/task_list.html')
         self.assertIn('tasks', response.context)
 
+    def test_task_list_cache_invalidated_by_comment(self):
+        self.service_client.get(reverse('task_list'))
+        self.service_client.get(reverse('task_list'))
+        self.assertEqual(cache_stats()['task_list'], {'hits': 1, 'misses': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CommentFactory(task=self.task, user=self.service_user)
+        self.service_client.get(reverse('task_list'))
+        self.assertEqual(cache_stats()['task_list'], {'hits': 1, 'misses': 2})
+
+    def test_task_list_search(self):
+        TaskFactory(title='Анализ устойчивости бортов', assigned_to=self.department)
+        response = self.service_client.get(reverse('task_list'), {'q': 'устойчивость'})
+        self.assertEqual(
+            [task.title for task in response.context['tasks']], ['Анализ устойчивости бортов']
+        )
+
     def test_task_list_view_filter(self):
         # Создаем задачи с разными статусами
         TaskFactory(status=Task.Status.NEW, assigned_to=self.department)
@@ -143,6 +229,176 @@ class TaskListViewTest(ViewsTestCase):
             self.assertEqual(task.status, Task.Status.NEW)
 
 
+class TaskListPaginationTest(ViewsTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(6):
+            TaskFactory(status=Task.Status.NEW, assigned_to=self.department)
+        TaskFactory(status=Task.Status.COMPLETED, assigned_to=self.department)
+        self.expected = list(
+            Task.objects.filter(status=Task.Status.NEW).values_list('id', flat=True)
+        )
+
+    def get_page(self, **params):
+        response = self.service_client.get(reverse('task_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page']
+
+    def test_walk_forward_and_back(self):
+        seen = []
+        page = self.get_page(status='new', page_size=3)
+        self.assertFalse(page.has_previous)
+        pages = [page]
+        while page.has_next:
+            page = self.get_page(status='new', page_size=3, after=page.next_token)
+            pages.append(page)
+        for page in pages:
+            seen.extend(task.id for task in page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+
+        previous = self.get_page(status='new', page_size=3, before=pages[-1].prev_token)
+        self.assertEqual([task.id for task in previous], [task.id for task in pages[-2]])
+
+    def test_query_count_independent_of_depth(self):
+        first = self.get_page(page_size=2)
+        with CaptureQueriesContext(connection) as shallow:
+            self.service_client.get(
+                reverse('task_list'), {'page_size': 2, 'after': first.next_token}
+            )
+        shallow_queries = len(shallow)
+        cache.clear()
+        page = first
+        while page.has_next:
+            last_token = page.next_token
+            page = self.get_page(page_size=2, after=last_token)
+        cache.clear()
+        with self.assertNumQueries(shallow_queries):
+            self.service_client.get(reverse('task_list'), {'page_size': 2, 'after': last_token})
+
+    def test_search_results_paginate_by_rank(self):
+        TaskFactory(title='Отчет', description='Отчет об отчетах', assigned_to=self.department)
+        TaskFactory(title='Отчет', description='Сводка', assigned_to=self.department)
+        TaskFactory(title='Сводка', description='Отчет', assigned_to=self.department)
+        seen = []
+        page = self.get_page(q='отчет', page_size=1)
+        while True:
+            seen.extend(task.rank for task in page)
+            if not page.has_next:
+                break
+            page = self.get_page(q='отчет', page_size=1, after=page.next_token)
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_invalid_cursor_returns_first_page(self):
+        page = self.get_page(page_size=3, after='garbage')
+        self.assertEqual(len(page), 3)
+        self.assertFalse(page.has_previous)
+
+
+class TaskAdminTest(ViewsTestCase):
+    def test_changelist_overdue_filter_and_ordering(self):
+        TaskFactory(
+            assigned_to=self.department,
+            due_date=timezone.now() - timedelta(days=1),
+            status=Task.Status.NEW,
+        )
+        url = reverse('admin:tasks_task_changelist')
+        response = self.admin_client.get(url, {'overdue': '1', 'o': '-6'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_changelist_full_text_search(self):
+        CommentFactory(task=self.task, content='Проверить буровые скважины')
+        response = self.admin_client.get(
+            reverse('admin:tasks_task_changelist'), {'q': 'скважина'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [self.task])
+
+        response = self.admin_client.get(
+            reverse('admin:tasks_comment_changelist'), {'q': 'скважина'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_changelist_autocomplete_filter(self):
+        other = DepartmentFactory(name='Буровая служба')
+        TaskFactory(assigned_to=other, assigned_by=self.admin_user)
+        response = self.admin_client.get(
+            reverse('admin:tasks_task_changelist'), {'assigned_to__id__exact': other.id}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        # В фильтре выводится только выбранная служба, а не весь список
+        self.assertContains(response, 'Буровая служба')
+        self.assertNotContains(response, 'Тестовая служба')
+        self.assertContains(response, 'admin/js/autocomplete.js')
+
+    def test_task_autocomplete_searches_titles(self):
+        TaskFactory(title='Ремонт конвейера', assigned_to=self.department)
+        response = self.admin_client.get(reverse('admin:autocomplete'), {
+            'app_label': 'tasks',
+            'model_name': 'comment',
+            'field_name': 'task',
+            'term': 'конвей',
+        })
+        self.assertEqual(
+            [result['text'] for result in response.json()['results']], ['Ремонт конвейера']
+        )
+
+
+class AutocompleteViewTest(ViewsTestCase):
+    def test_departments_ranked_by_similarity(self):
+        DepartmentFactory(name='Механический цех главного корпуса')
+        DepartmentFactory(name='Служба механика')
+        response = self.admin_client.get(
+            reverse('autocomplete', args=['departments']), {'q': 'механи'}
+        )
+        self.assertEqual(
+            [result['text'] for result in response.json()['results']],
+            ['Служба механика', 'Механический цех главного корпуса'],
+        )
+
+    def test_departments_and_users_admin_only(self):
+        for kind in ('departments', 'users'):
+            response = self.service_client.get(reverse('autocomplete', args=[kind]))
+            self.assertEqual(response.status_code, 403)
+        response = self.admin_client.get(reverse('autocomplete', args=['unknown']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_tasks_scoped_to_department(self):
+        TaskFactory(title='Тестовая задача другой службы', assigned_to=DepartmentFactory())
+        response = self.service_client.get(reverse('autocomplete', args=['tasks']), {'q': 'тестов'})
+        self.assertEqual(
+            response.json()['results'], [{'id': self.task.id, 'text': self.task.title}]
+        )
+
+    def test_widget_served_from_static(self):
+        response = self.admin_client.get(reverse('task_list'))
+        self.assertContains(response, '/static/tasks/vendor/tom-select/tom-select.complete.min.js')
+        self.assertNotContains(response, 'cdn.jsdelivr.net/npm/tom-select')
+
+    def test_fetch_vendor_assets_pinned(self):
+        with tempfile.TemporaryDirectory() as vendor_dir, mock.patch.object(
+            fetch_vendor_assets, 'VENDOR_DIR', Path(vendor_dir)
+        ), mock.patch('urllib.request.urlopen') as urlopen:
+            urlopen.return_value.__enter__.return_value.read.return_value = b'asset'
+            call_command('fetch_vendor_assets', stdout=io.StringIO())
+            call_command('fetch_vendor_assets', stdout=io.StringIO())
+            self.assertEqual(
+                (Path(vendor_dir) / 'tom-select' / 'tom-select.complete.min.js').read_bytes(),
+                b'asset',
+            )
+        urls = [call.args[0] for call in urlopen.call_args_list]
+        self.assertEqual(len(urls), 2)
+        self.assertTrue(all('tom-select@2.3.1/' in url for url in urls))
+
+    def test_task_form_renders_only_selected_department(self):
+        DepartmentFactory(name='Служба, которой нет в форме')
+        response = self.admin_client.get(reverse('task_edit', args=[self.task.id]))
+        self.assertContains(response, 'Тестовая служба')
+        self.assertNotContains(response, 'Служба, которой нет в форме')
+        self.assertContains(response, reverse('autocomplete', args=['departments']))
+
+
 class TaskDetailViewTest(ViewsTestCase):
     def test_task_detail_view(self):
         response = self.admin_client.get(reverse('task_detail', args=[self.task.id]))
@@ -171,6 +427,34 @@ class TaskDetailViewTest(ViewsTestCase):
         self.assertEqual(self.task.comments.first().content, 'Тестовый комментарий')
 
 
+class QueryBudgetTest(ViewsTestCase):
+    # Сессия, пользователь, задача со службой и автором, комментарии с авторами
+    TASK_DETAIL_BUDGET = 4
+    # Сессия, пользователь, страница задач со службами и служба пользователя
+    TASK_LIST_BUDGET = 4
+    # Службы в фильтре подгружаются автодополнением, служба пользователя не нужна
+    ADMIN_TASK_LIST_BUDGET = 3
+
+    def test_task_detail_with_many_comments(self):
+        Comment.objects.bulk_create(
+            Comment(task=self.task, user=self.service_user, content=f'Комментарий {number}')
+            for number in range(500)
+        )
+        with self.assertNumQueries(self.TASK_DETAIL_BUDGET):
+            response = self.service_client.get(reverse('task_detail', args=[self.task.id]))
+        self.assertContains(response, 'Комментарий 499')
+
+    def test_task_list_with_many_departments(self):
+        for _ in range(10):
+            TaskFactory(assigned_to=DepartmentFactory(), assigned_by=self.admin_user)
+        with self.assertNumQueries(self.ADMIN_TASK_LIST_BUDGET):
+            response = self.admin_client.get(reverse('task_list'))
+        self.assertEqual(len(response.context['tasks']), 11)
+
+        with self.assertNumQueries(self.TASK_LIST_BUDGET):
+            self.service_client.get(reverse('task_list'))
+
+
 class TaskCreateViewTest(ViewsTestCase):
     def test_task_create_view_admin_get(self):
         response = self.admin_client.get(reverse('task_create'))
@@ -199,6 +483,221 @@ class TaskCreateViewTest(ViewsTestCase):
         self.assertRedirects(response, reverse('task_detail', args=[new_task.id]))
 
 
+class TaskBulkCreateViewTest(ViewsTestCase):
+    def setUp(self):
+        super().setUp()
+        # Релей публикует задачи, которые выполняются сразу же в процессе теста
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', eager)
+
+    def post(self, **data):
+        return self.admin_client.post(reverse('task_bulk_create'), {
+            'title': 'Проверка огнетушителей',
+            'description': 'Проверить сроки поверки',
+            'status': Task.Status.NEW,
+            'due_date': '2030-12-31T12:00',
+            **data,
+        })
+
+    def test_service_user_forbidden(self):
+        response = self.service_client.get(reverse('task_bulk_create'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_creates_task_per_department_with_one_notification(self):
+        departments = DepartmentFactory.create_batch(3)
+        OutboxMessage.objects.all().delete()
+        response = self.post(departments=[department.id for department in departments])
+        self.assertRedirects(response, reverse('task_list'))
+        tasks = Task.objects.filter(title='Проверка огнетушителей')
+        self.assertEqual(
+            sorted(tasks.values_list('assigned_to', flat=True)),
+            sorted(department.id for department in departments),
+        )
+        self.assertEqual(
+            DepartmentTaskStats.objects.get(
+                department=departments[0], status=Task.Status.NEW
+            ).count,
+            1,
+        )
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task_name, 'tasks.tasks.send_task_notifications')
+        self.assertEqual(sorted(message.args[0]), sorted(tasks.values_list('id', flat=True)))
+
+        outbox.relay_all()
+        self.assertEqual(
+            sorted(email.to[0] for email in mail.outbox),
+            sorted(department.email for department in departments),
+        )
+
+    def test_query_count_independent_of_department_count(self):
+        def create_for_all(count):
+            DepartmentFactory.create_batch(count)
+            with CaptureQueriesContext(connection) as queries:
+                self.post(all_departments='on')
+            return len(queries)
+
+        self.assertEqual(create_for_all(5), create_for_all(50))
+        self.assertEqual(Task.objects.filter(title='Проверка огнетушителей').count(), 6 + 56)
+
+    def test_requires_departments(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('departments', response.context['form'].errors)
+
+    def test_admin_action_preselects_departments(self):
+        departments = DepartmentFactory.create_batch(2)
+        response = self.admin_client.post(reverse('admin:tasks_department_changelist'), {
+            'action': 'assign_task',
+            '_selected_action': [department.id for department in departments],
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.admin_client.get(response.url)
+        self.assertContains(response, departments[0].name)
+        self.assertContains(response, departments[1].name)
+
+
+class TaskBulkUpdateViewTest(ViewsTestCase):
+    def counts(self, department):
+        return dict(
+            DepartmentTaskStats.objects.filter(department=department)
+            .values_list('status', 'count')
+        )
+
+    def test_service_user_updates_own_tasks_only(self):
+        other = TaskFactory(status=Task.Status.NEW)
+        tasks = TaskFactory.create_batch(2, assigned_to=self.department)
+        updated_at = self.task.updated_at
+        response = self.service_client.post(reverse('task_bulk_update'), {
+            'tasks': [self.task.id, other.id, *(task.id for task in tasks)],
+            'action': 'status',
+            'status': Task.Status.COMPLETED,
+            'next': reverse('task_list') + '?status=new',
+        })
+        self.assertRedirects(response, reverse('task_list') + '?status=new')
+        self.assertEqual(
+            Task.objects.filter(status=Task.Status.COMPLETED).count(), 3
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.status, Task.Status.NEW)
+        self.task.refresh_from_db()
+        self.assertGreater(self.task.updated_at, updated_at)
+        self.assertEqual(
+            self.counts(self.department),
+            {Task.Status.NEW: 0, Task.Status.COMPLETED: 3},
+        )
+
+    def test_service_user_cannot_reassign(self):
+        other_department = DepartmentFactory()
+        self.service_client.post(reverse('task_bulk_update'), {
+            'tasks': [self.task.id],
+            'action': 'reassign',
+            'assigned_to': other_department.id,
+        })
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.assigned_to, self.department)
+
+    def test_admin_reassigns_and_shifts_due_date(self):
+        other_department = DepartmentFactory()
+        self.task.refresh_from_db()
+        due_date = self.task.due_date
+        self.admin_client.post(reverse('task_bulk_update'), {
+            'tasks': [self.task.id], 'action': 'reassign', 'assigned_to': other_department.id,
+        })
+        self.admin_client.post(reverse('task_bulk_update'), {
+            'tasks': [self.task.id], 'action': 'shift', 'days': 7,
+        })
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.assigned_to, other_department)
+        self.assertEqual(self.task.due_date, due_date + timedelta(days=7))
+        self.assertEqual(self.counts(self.department)[Task.Status.NEW], 0)
+        self.assertEqual(self.counts(other_department)[Task.Status.NEW], 1)
+
+    def test_shift_out_of_range_rejected(self):
+        self.task.refresh_from_db()
+        due_date = self.task.due_date
+        response = self.admin_client.post(reverse('task_bulk_update'), {
+            'tasks': [self.task.id], 'action': 'shift', 'days': 10**9,
+        })
+        self.assertRedirects(response, reverse('task_list'), fetch_redirect_response=False)
+        response = self.admin_client.post(reverse('admin:tasks_task_changelist'), {
+            'action': 'shift_due_date',
+            'days': 10**9,
+            '_selected_action': [self.task.id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.due_date, due_date)
+
+    def test_query_count_independent_of_task_count(self):
+        def postpone(count):
+            tasks = TaskFactory.create_batch(count, assigned_to=self.department)
+            with CaptureQueriesContext(connection) as queries:
+                self.service_client.post(reverse('task_bulk_update'), {
+                    'tasks': [task.id for task in tasks], 'action': 'postpone',
+                })
+            return len(queries)
+
+        self.assertEqual(postpone(3), postpone(30))
+        self.assertEqual(self.counts(self.department)[Task.Status.POSTPONED], 33)
+
+    def test_admin_changelist_action(self):
+        response = self.admin_client.post(reverse('admin:tasks_task_changelist'), {
+            'action': 'set_status',
+            'status': Task.Status.IN_PROGRESS,
+            '_selected_action': [self.task.id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, Task.Status.IN_PROGRESS)
+
+
+class TaskExportViewTest(ViewsTestCase):
+    def export(self, client, **params):
+        response = client.get(reverse('task_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_scoped_to_department(self):
+        CommentFactory.create_batch(2, task=self.task)
+        TaskFactory(title='Чужая задача')
+        TaskFactory(
+            title='Просроченная задача',
+            assigned_to=self.department,
+            due_date=timezone.now() - timedelta(days=1),
+        )
+        content = self.export(self.service_client, format='csv').decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][:4], ['№', 'Название', 'Статус', 'Служба'])
+        by_title = {row[1]: row for row in rows[1:]}
+        self.assertEqual(set(by_title), {'Тестовая задача', 'Просроченная задача'})
+        self.assertEqual(by_title['Тестовая задача'][3:5], ['Тестовая служба', 'admin'])
+        self.assertEqual(by_title['Тестовая задача'][8], '2')
+        self.assertEqual(by_title['Просроченная задача'][7], 'да')
+
+    def test_filters_applied(self):
+        TaskFactory(title='Выполненная', assigned_to=self.department, status=Task.Status.COMPLETED)
+        content = self.export(self.admin_client, format='csv', status='completed')
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual([row[1] for row in rows[1:]], ['Выполненная'])
+
+    def test_xlsx_is_valid_workbook(self):
+        TaskFactory(title='Задача <с разметкой> & \x07символами', assigned_to=self.department)
+        archive = zipfile.ZipFile(io.BytesIO(self.export(self.admin_client, format='xlsx')))
+        self.assertIsNone(archive.testzip())
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('s:sheetData/s:row', namespace)
+        self.assertEqual(len(rows), 3)
+        titles = [row.findall('s:c', namespace)[1].findtext('.//s:t', namespaces=namespace)
+                  for row in rows[1:]]
+        self.assertIn('Задача <с разметкой> & символами', titles)
+
+    def test_unknown_format(self):
+        response = self.admin_client.get(reverse('task_export'), {'format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+
 class DepartmentListViewTest(ViewsTestCase):
     def test_department_list_view_admin(self):
         response = self.admin_client.get(reverse('department_list'))
@@ -233,4 +732,27 @@ class DepartmentCreateViewTest(ViewsTestCase):
         self.assertEqual(Department.objects.count(), department_count + 1)
         new_department = Department.objects.latest('id')
         self.assertEqual(new_department.name, 'Новая служба')
-        self.assertRedirects(response, reverse('department_list'))
\ No newline at end of file
+        self.assertRedirects(response, reverse('department_list'))
+
+class EmailConfigViewTest(ViewsTestCase):
+    def test_new_server_keeps_existing_active(self):
+        data = {
+            'smtp_host': 'smtp.kgok.ru',
+            'smtp_port': 587,
+            'smtp_user': 'robot',
+            'smtp_password': 'secret',
+            'use_tls': 'on',
+            'from_email': 'robot@kgok.ru',
+            'weight': 2,
+            'is_active': 'on',
+        }
+        self.admin_client.post(reverse('email_config') + '?server=new', data)
+        data['smtp_host'] = 'relay.kgok.ru'
+        response = self.admin_client.post(reverse('email_config') + '?server=new', data)
+        config = EmailConfiguration.objects.get(smtp_host='relay.kgok.ru')
+        self.assertRedirects(response, reverse('email_config') + f'?server={config.pk}')
+        self.assertEqual(EmailConfiguration.objects.filter(is_active=True).count(), 2)
+
+    def test_email_config_service_forbidden(self):
+        response = self.service_client.get(reverse('email_config'))
+        self.assertEqual(response.status_code, 403)
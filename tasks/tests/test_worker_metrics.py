@@ -0,0 +1,105 @@
+import os
+import time
+from io import StringIO
+from types import SimpleNamespace
+from urllib.request import urlopen
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from tasks import metrics, worker_metrics
+from tasks.models import DeliveryAttempt
+from tasks.tasks import send_task_notification
+from tasks.tests.test_mail import free_port
+from tasks.tests.test_metrics import sample
+from tasks.tests.test_models import DepartmentFactory, TaskFactory
+
+
+class WorkerMetricsTest(TestCase):
+    def test_task_phases_recorded(self):
+        task = TaskFactory(assigned_to=DepartmentFactory(email='service@kgok.ru'))
+        name = send_task_notification.name
+        before = metrics.REGISTRY.render()
+        send_task_notification.apply(args=[task.id]).get()
+        text = metrics.REGISTRY.render()
+
+        def delta(metric, **labels):
+            return sample(text, metric, **labels) - (sample(before, metric, **labels) or 0)
+
+        self.assertEqual(delta('kapantask_celery_tasks_total', task=name, outcome='success'), 1)
+        self.assertEqual(delta('kapantask_celery_task_duration_seconds_count', task=name), 1)
+        for phase in ('db', 'render', 'smtp'):
+            self.assertEqual(
+                delta('kapantask_celery_task_phase_seconds_count', task=name, phase=phase), 1
+            )
+        attempt = DeliveryAttempt.objects.get()
+        self.assertGreater(attempt.db_ms, 0)
+        self.assertGreater(attempt.render_ms, 0)
+        self.assertIsNotNone(attempt.smtp_ms)
+        # Eager-выполнение не публикует сообщение, ожидания в очереди нет
+        self.assertIsNone(attempt.queue_wait_ms)
+
+    def test_queue_wait(self):
+        headers = {}
+        worker_metrics.stamp_enqueued_at(headers=headers)
+        enqueued_at = headers[worker_metrics.ENQUEUED_HEADER]
+        request = SimpleNamespace(eta=None, **{worker_metrics.ENQUEUED_HEADER: enqueued_at - 5})
+        self.assertAlmostEqual(worker_metrics._queue_wait(request), 5, delta=1)
+        # Повтор с задержкой ждёт от своего eta
+        request.eta = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(enqueued_at - 2))
+        self.assertAlmostEqual(worker_metrics._queue_wait(request), 2, delta=1)
+
+    def test_snapshots_merged(self):
+        histogram = metrics.Histogram('test_seconds', 'Тест', ('task',), buckets=(1.0,))
+        counter = metrics.Counter('test_total', 'Тест', ('task',))
+        registry = metrics.Registry()
+        registry.register(histogram)
+        registry.register(counter)
+        histogram.observe(('a',), 0.5)
+        counter.inc(('a',))
+        first = registry.snapshot()
+        histogram.observe(('a',), 2.0)
+        counter.inc(('b',))
+        text = registry.render([first, registry.snapshot()])
+        self.assertEqual(sample(text, 'test_seconds_bucket', task='a', le='1.0'), 2)
+        self.assertEqual(sample(text, 'test_seconds_count', task='a'), 3)
+        self.assertEqual(sample(text, 'test_seconds_sum', task='a'), 3.0)
+        self.assertEqual(sample(text, 'test_total', task='a'), 2)
+        self.assertEqual(sample(text, 'test_total', task='b'), 1)
+
+    def test_exporter_on_localhost_removes_snapshots(self):
+        port = free_port()
+        with override_settings(CELERY_METRICS_PORT=port):
+            worker_metrics.start_exporter()
+        self.addCleanup(worker_metrics.stop_exporter)
+        directory = worker_metrics._snapshot_dir
+        self.assertEqual(worker_metrics._server.server_address[0], '127.0.0.1')
+        with urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            self.assertEqual(response.status, 200)
+        worker_metrics.stop_exporter()
+        self.assertFalse(os.path.exists(directory))
+
+
+class NotificationStatsTest(TestCase):
+    def test_percentiles(self):
+        for index in range(1, 101):
+            DeliveryAttempt.objects.create(
+                task_name='tasks.tasks.send_task_notification',
+                task_id=str(index),
+                attempt=1,
+                outcome='sent' if index % 10 else 'retry',
+                duration_ms=index,
+                smtp_ms=index / 2,
+            )
+        out = StringIO()
+        call_command('notification_stats', '--hours=1', stdout=out)
+        output = out.getvalue()
+        self.assertIn('tasks.tasks.send_task_notification: попыток 100', output)
+        self.assertIn('отправлено 90, повтор 10, ошибка 0', output)
+        self.assertIn('всего (p50, p95, p99), мс: 50.5 / 95.0 / 99.0', output)
+        self.assertIn('SMTP (p50, p95, p99), мс: 25.2 / 47.5 / 49.5', output)
+        self.assertNotIn('очередь', output)
+
+        out = StringIO()
+        call_command('notification_stats', '--task-name=other', stdout=out)
+        self.assertIn('Попыток доставки за период нет', out.getvalue())
@@ -17,6 +17,9 @@ urlpatterns = [
     # Задачи
     path('tasks/', views.task_list, name='task_list'),
     path('tasks/create/', views.task_create, name='task_create'),
+    path('tasks/bulk-create/', views.task_bulk_create, name='task_bulk_create'),
+    path('tasks/bulk-update/', views.task_bulk_update, name='task_bulk_update'),
+    path('tasks/export/', views.task_export, name='task_export'),
     path('tasks/<int:pk>/', views.task_detail, name='task_detail'),
     path('tasks/<int:pk>/edit/', views.task_edit, name='task_edit'),
     
@@ -25,6 +28,12 @@ urlpatterns = [
     path('departments/create/', views.department_create, name='department_create'),
     path('departments/<int:pk>/edit/', views.department_edit, name='department_edit'),
     
+    # Автодополнение
+    path('autocomplete/<slug:kind>/', views.autocomplete, name='autocomplete'),
+    
     # Настройки Email
     path('email-config/', views.email_config, name='email_config'),
+
+    # Метрики Prometheus
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,18 +1,31 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from django.http import HttpResponseForbidden
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 
+from . import autocomplete as autocomplete_sources
+from . import bulk, cache, export, metrics
 from .forms import (
     CommentForm,
     DepartmentForm,
     EmailConfigurationForm,
+    TaskBulkActionForm,
+    TaskBulkForm,
     TaskForm,
     TaskStatusForm,
 )
-from .models import Department, EmailConfiguration, Task
+from .models import Department, DepartmentTaskStats, EmailConfiguration, Task
+from .pagination import get_page_size, paginate
 
 
 @login_required
@@ -20,37 +33,15 @@ def dashboard(request):
     """Главная страница с аналитикой."""
     if request.user.is_admin:
         # Для администратора показываем статистику по всем службам
-        total_tasks = Task.objects.count()
-        completed_tasks = Task.objects.filter(status=Task.Status.COMPLETED).count()
-        in_progress_tasks = Task.objects.filter(status=Task.Status.IN_PROGRESS).count()
-        overdue_tasks = Task.objects.filter(
-            ~Q(status=Task.Status.COMPLETED),
-            due_date__lt=timezone.now()
-        ).count()
-        
-        # Статистика по службам
-        departments = Department.objects.all()
-        department_stats = []
-        
-        for department in departments:
-            department_tasks = Task.objects.filter(assigned_to=department)
-            stats = {
-                'department': department,
-                'total': department_tasks.count(),
-                'completed': department_tasks.filter(status=Task.Status.COMPLETED).count(),
-                'in_progress': department_tasks.filter(status=Task.Status.IN_PROGRESS).count(),
-                'overdue': department_tasks.filter(
-                    ~Q(status=Task.Status.COMPLETED),
-                    due_date__lt=timezone.now()
-                ).count(),
-            }
-            department_stats.append(stats)
-        
+        totals, department_stats = cache.get_or_compute(
+            'dashboard', None, DepartmentTaskStats.objects.dashboard_stats
+        )
+
         context = {
-            'total_tasks': total_tasks,
-            'completed_tasks': completed_tasks,
-            'in_progress_tasks': in_progress_tasks,
-            'overdue_tasks': overdue_tasks,
+            'total_tasks': totals['total'],
+            'completed_tasks': totals['completed'],
+            'in_progress_tasks': totals['in_progress'],
+            'overdue_tasks': totals['overdue'],
             'department_stats': department_stats,
         }
         return render(request, 'tasks/admin_dashboard.html', context)
@@ -61,67 +52,157 @@ def dashboard(request):
             messages.error(request, 'У вас нет привязки к службе. Обратитесь к администратору.')
             return redirect('login')
         
-        tasks = Task.objects.filter(assigned_to=department)
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(status=Task.Status.COMPLETED).count()
-        in_progress_tasks = tasks.filter(status=Task.Status.IN_PROGRESS).count()
-        overdue_tasks = tasks.filter(
-            ~Q(status=Task.Status.COMPLETED),
-            due_date__lt=timezone.now()
-        ).count()
+        def compute():
+            return (
+                DepartmentTaskStats.objects.department_stats(department),
+                list(Task.objects.filter(assigned_to=department).with_overdue()[:5]),
+            )
+
+        stats, tasks = cache.get_or_compute('dashboard', department.id, compute)
         
         context = {
-            'total_tasks': total_tasks,
-            'completed_tasks': completed_tasks,
-            'in_progress_tasks': in_progress_tasks,
-            'overdue_tasks': overdue_tasks,
+            'total_tasks': stats['total'],
+            'completed_tasks': stats['completed'],
+            'in_progress_tasks': stats['in_progress'],
+            'overdue_tasks': stats['overdue'],
             'tasks': tasks,
         }
         return render(request, 'tasks/user_dashboard.html', context)
 
 
-@login_required
-def task_list(request):
-    """Список всех задач."""
+def _filter_tasks(request, tasks, now):
+    """Применяет к задачам права доступа и фильтры списка; возвращает (задачи, ключ сортировки)."""
     status_filter = request.GET.get('status', '')
+    department_filter = request.GET.get('department', '')
+    overdue_filter = request.GET.get('overdue', '')
+    search_query = request.GET.get('q', '').strip()
     
     if request.user.is_admin:
-        tasks = Task.objects.all()
+        if department_filter.isdigit():
+            tasks = tasks.filter(assigned_to_id=department_filter)
     else:
-        department = request.user.department
-        if not department:
-            messages.error(request, 'У вас нет привязки к службе. Обратитесь к администратору.')
-            return redirect('login')
-        tasks = Task.objects.filter(assigned_to=department)
+        tasks = tasks.filter(assigned_to_id=request.user.department_id)
     
     # Применяем фильтр по статусу
-    if status_filter == 'completed':
-        tasks = tasks.filter(status=Task.Status.COMPLETED)
-    elif status_filter == 'in_progress':
-        tasks = tasks.filter(status=Task.Status.IN_PROGRESS)
-    elif status_filter == 'overdue':
-        tasks = tasks.filter(
-            ~Q(status=Task.Status.COMPLETED),
-            due_date__lt=timezone.now()
-        )
+    if status_filter in Task.Status.values:
+        tasks = tasks.filter(status=status_filter)
+    if status_filter == 'overdue' or overdue_filter == '1':
+        tasks = tasks.overdue(now)
+    
+    # Полнотекстовый поиск: результаты упорядочены по рангу
+    if search_query:
+        return tasks.search(search_query), 'rank'
+    return tasks, 'created_at'
+
+
+@login_required
+def task_list(request):
+    """Список всех задач."""
+    status_filter = request.GET.get('status', '')
+    department_filter = request.GET.get('department', '')
+    now = timezone.now()
+    
+    department = None if request.user.is_admin else request.user.department
+    if not request.user.is_admin and not department:
+        messages.error(request, 'У вас нет привязки к службе. Обратитесь к администратору.')
+        return redirect('login')
+    tasks, sort_key = _filter_tasks(request, Task.objects.for_list(now), now)
+    
+    # Курсорная пагинация: параметры фильтров сохраняются в ссылках на страницы
+    params = {
+        key: request.GET.get(key, '')
+        for key in ('status', 'department', 'overdue', 'q', 'page_size', 'after', 'before')
+    }
+    page = cache.get_or_compute(
+        'task_list',
+        department.id if department else None,
+        lambda: paginate(
+            tasks,
+            after=params['after'],
+            before=params['before'],
+            page_size=get_page_size(params['page_size']),
+            key=sort_key,
+        ),
+        params,
+    )
+    filter_query = request.GET.copy()
+    for key in ('after', 'before'):
+        filter_query.pop(key, None)
     
     context = {
-        'tasks': tasks,
+        'tasks': page.items,
+        'page': page,
+        'bulk_form': TaskBulkActionForm(user=request.user),
+        'filter_query': filter_query.urlencode(),
         'status_filter': status_filter,
+        'selected_department': (
+            Department.objects.filter(pk=department_filter).first()
+            if request.user.is_admin and department_filter.isdigit() else None
+        ),
     }
     return render(request, 'tasks/task_list.html', context)
 
 
+@login_required
+def task_export(request):
+    """Потоковая выгрузка отфильтрованного списка задач в CSV или XLSX."""
+    if not request.user.is_admin and not request.user.department_id:
+        return HttpResponseForbidden("У вас нет привязки к службе.")
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in export.FORMATS:
+        return HttpResponseBadRequest("Неизвестный формат выгрузки.")
+    
+    now = timezone.now()
+    tasks, sort_key = _filter_tasks(request, Task.objects.all(), now)
+    order = ('-rank', '-id') if sort_key == 'rank' else ('-created_at', '-id')
+    content_type, stream = export.FORMATS[export_format]
+    response = StreamingHttpResponse(
+        stream(export.export_rows(tasks.order_by(*order), now)), content_type=content_type
+    )
+    filename = f'tasks-{timezone.localdate(now):%Y-%m-%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@require_POST
+def task_bulk_update(request):
+    """Массовое изменение задач, отмеченных в списке."""
+    next_url = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('task_list')
+    
+    form = TaskBulkActionForm(request.POST, user=request.user)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            messages.error(request, errors[0])
+        return redirect(next_url)
+    
+    # Служба видит и меняет только свои задачи
+    tasks = Task.objects.filter(id__in=form.cleaned_data['tasks'])
+    if not request.user.is_admin:
+        tasks = tasks.filter(assigned_to_id=request.user.department_id)
+    updated = bulk.update_tasks(tasks, **form.changes())
+    messages.success(request, f'Изменено задач: {updated}.')
+    return redirect(next_url)
+
+
 @login_required
 def task_detail(request, pk):
     """Детальная информация о задаче."""
-    task = get_object_or_404(Task, pk=pk)
+    task = get_object_or_404(
+        Task.objects.select_related('assigned_to', 'assigned_by').with_overdue(), pk=pk
+    )
     
     # Проверяем доступ к задаче
-    if not request.user.is_admin and request.user.department != task.assigned_to:
+    if not request.user.is_admin and request.user.department_id != task.assigned_to_id:
         return HttpResponseForbidden("У вас нет доступа к этой задаче.")
     
-    comments = task.comments.all()
+    # Комментарии с авторами одним запросом; шаблон дважды обходит один и тот же
+    # queryset, поэтому он вычисляется один раз
+    comments = task.comments.select_related('user').only(
+        'content', 'created_at', 'task_id', 'user__first_name', 'user__last_name'
+    )
     
     if request.method == 'POST':
         comment_form = CommentForm(request.POST)
@@ -176,6 +257,30 @@ def task_create(request):
     return render(request, 'tasks/task_form.html', context)
 
 
+@login_required
+def task_bulk_create(request):
+    """Создание одной и той же задачи для нескольких служб."""
+    if not request.user.is_admin:
+        return HttpResponseForbidden("Только администраторы могут создавать задачи.")
+    
+    if request.method == 'POST':
+        form = TaskBulkForm(request.POST)
+        if form.is_valid():
+            tasks = bulk.assign_to_departments(
+                form.cleaned_data['departments'], request.user, **form.task_fields()
+            )
+            messages.success(request, f'Создано задач: {len(tasks)}.')
+            return redirect('task_list')
+    else:
+        form = TaskBulkForm(initial={'departments': request.GET.getlist('departments')})
+    
+    context = {
+        'form': form,
+        'title': 'Назначить задачу нескольким службам',
+    }
+    return render(request, 'tasks/task_bulk_form.html', context)
+
+
 @login_required
 def task_edit(request, pk):
     """Редактирование задачи."""
@@ -261,36 +366,49 @@ def department_edit(request, pk):
 
 @login_required
 def email_config(request):
-    """Настройка параметров SMTP для отправки email."""
+    """Настройка пула SMTP-серверов для отправки email."""
     if not request.user.is_admin:
         return HttpResponseForbidden("Только администраторы имеют доступ к настройкам Email.")
     
-    config = EmailConfiguration.objects.first()
+    # Все активные серверы работают вместе: письма распределяются по весам
+    servers = EmailConfiguration.objects.order_by('id')
+    server_id = request.GET.get('server', '')
+    if server_id == 'new':
+        config = None
+    elif server_id.isdigit():
+        config = get_object_or_404(EmailConfiguration, pk=server_id)
+    else:
+        config = servers.first()
     
     if request.method == 'POST':
-        if config:
-            form = EmailConfigurationForm(request.POST, instance=config)
-        else:
-            form = EmailConfigurationForm(request.POST)
+        form = EmailConfigurationForm(request.POST, instance=config)
         
         if form.is_valid():
-            # Деактивируем все существующие конфигурации
-            EmailConfiguration.objects.update(is_active=False)
-            
-            # Сохраняем новую конфигурацию как активную
-            email_config = form.save(commit=False)
-            email_config.is_active = True
-            email_config.save()
-            
+            config = form.save()
             messages.success(request, 'Настройки Email успешно сохранены.')
-            return redirect('email_config')
+            return redirect(f"{reverse('email_config')}?server={config.pk}")
     else:
-        if config:
-            form = EmailConfigurationForm(instance=config)
-        else:
-            form = EmailConfigurationForm()
+        form = EmailConfigurationForm(instance=config)
     
     context = {
         'form': form,
+        'servers': servers,
+        'current': config,
     }
-    return render(request, 'tasks/email_config.html', context)
\ No newline at end of file
+    return render(request, 'tasks/email_config.html', context)
+
+
+@login_required
+def autocomplete(request, kind):
+    """Варианты для полей с автодополнением (формат Tom Select/Select2)."""
+    results = autocomplete_sources.lookup(kind, request.user, request.GET.get('q', ''))
+    if results is None:
+        return HttpResponseForbidden('Нет доступа к списку.')
+    return JsonResponse({'results': results})
+
+
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    if not metrics.authorized(request.META.get('REMOTE_ADDR', ''), request.headers):
+        return HttpResponseForbidden('Нет доступа к метрикам.')
+    return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,185 @@
+"""Метрики задач Celery, собираемые через сигналы.
+
+before_task_publish ставит в заголовок сообщения время постановки в очередь,
+task_prerun по нему считает ожидание в очереди и начинает учёт SQL,
+task_postrun записывает длительность, этапы (БД, рендеринг, SMTP), итог
+и повторы. Дочерние процессы prefork-пула после каждой задачи сохраняют
+снимок своих метрик в файл, а HTTP-сервер основного процесса воркера
+(CELERY_METRICS_PORT) отдаёт их сумму в формате Prometheus.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from celery import states
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_shutdown,
+)
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ENQUEUED_HEADER = 'kapantask_enqueued_at'
+# Этапы StageTimings уведомлений, соответствующие фазам метрик
+STAGE_PHASES = {'render': 'render', 'send': 'smtp'}
+OUTCOMES = {states.SUCCESS: 'success', states.RETRY: 'retry', states.FAILURE: 'failure'}
+
+queue_wait = metrics.REGISTRY.register(metrics.Histogram(
+    'kapantask_celery_task_queue_wait_seconds',
+    'Время от постановки задачи в очередь до начала выполнения', ('task',),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+))
+duration = metrics.REGISTRY.register(metrics.Histogram(
+    'kapantask_celery_task_duration_seconds', 'Время выполнения задачи', ('task',),
+))
+phase_duration = metrics.REGISTRY.register(metrics.Histogram(
+    'kapantask_celery_task_phase_seconds', 'Время этапа выполнения задачи', ('task', 'phase'),
+))
+outcomes = metrics.REGISTRY.register(metrics.Counter(
+    'kapantask_celery_tasks_total', 'Выполнения задач по итогу', ('task', 'outcome'),
+))
+retries = metrics.REGISTRY.register(metrics.Counter(
+    'kapantask_celery_task_retries_total', 'Повторы задач', ('task',),
+))
+
+# Каталог снимков метрик процессов пула; задаётся в основном процессе воркера
+_snapshot_dir = None
+_server = None
+
+
+def _queue_wait(request):
+    enqueued_at = getattr(request, ENQUEUED_HEADER, None)
+    if enqueued_at is None:
+        # Сообщение опубликовано без заголовка или задача выполняется eager
+        return None
+    ready_at = enqueued_at
+    if request.eta:
+        # Отложенная задача (повтор с задержкой) ждёт не раньше своего eta
+        ready_at = max(ready_at, datetime.fromisoformat(request.eta).timestamp())
+    return max(time.time() - ready_at, 0.0)
+
+
+def phases(request):
+    """Длительность этапов текущего выполнения задачи в секундах."""
+    stats = getattr(request, 'kapantask_stats', None)
+    result = {'db': stats.sql_seconds} if stats else {}
+    timings = getattr(request, 'stage_timings', None)
+    for stage, phase in STAGE_PHASES.items():
+        if timings and stage in timings.stages:
+            result[phase] = timings.stages[stage] / 1000
+    return result
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers[ENQUEUED_HEADER] = time.time()
+
+
+@task_prerun.connect
+def start_task(task=None, **kwargs):
+    request = task.request
+    request.kapantask_queue_wait = _queue_wait(request)
+    request.kapantask_started = time.perf_counter()
+    request.kapantask_stats = metrics.RequestStats()
+    request.kapantask_stack = ExitStack()
+    request.kapantask_stack.enter_context(
+        connection.execute_wrapper(request.kapantask_stats.execute_wrapper)
+    )
+
+
+@task_postrun.connect
+def finish_task(task=None, state=None, **kwargs):
+    request = task.request
+    started = getattr(request, 'kapantask_started', None)
+    if started is None:
+        return
+    request.kapantask_stack.close()
+    name = (task.name,)
+    duration.observe(name, time.perf_counter() - started)
+    if request.kapantask_queue_wait is not None:
+        queue_wait.observe(name, request.kapantask_queue_wait)
+    for phase, seconds in phases(request).items():
+        phase_duration.observe((task.name, phase), seconds)
+    outcomes.inc((task.name, OUTCOMES.get(state, str(state).lower())))
+    if state == states.RETRY:
+        retries.inc(name)
+    if _snapshot_dir:
+        _write_snapshot()
+
+
+def _write_snapshot():
+    path = Path(_snapshot_dir) / f'{os.getpid()}.json'
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(metrics.REGISTRY.snapshot()))
+    # Атомарная замена: сервер не прочитает недописанный файл
+    os.replace(temporary, path)
+
+
+def read_snapshots(directory):
+    """Снимки всех процессов пула, включая завершившиеся (счётчики не убывают)."""
+    snapshots = []
+    for path in Path(directory).glob('*.json'):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not metrics.authorized(self.client_address[0], self.headers):
+            self.send_error(403)
+            return
+        body = metrics.REGISTRY.render(read_snapshots(_snapshot_dir)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@worker_init.connect
+def start_exporter(**kwargs):
+    """Запускает в основном процессе воркера HTTP-сервер метрик."""
+    global _snapshot_dir, _server
+    port = settings.CELERY_METRICS_PORT
+    if not port:
+        return
+    # Каталог создаётся до запуска пула: дочерние процессы наследуют его путь
+    _snapshot_dir = tempfile.mkdtemp(prefix='kapantask-celery-metrics-')
+    _server = ThreadingHTTPServer((settings.CELERY_METRICS_HOST, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logger.info('Метрики Celery: http://%s:%s/metrics', *_server.server_address[:2])
+
+
+@worker_shutdown.connect
+def stop_exporter(**kwargs):
+    """Останавливает сервер метрик и удаляет каталог снимков."""
+    global _snapshot_dir, _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+    if _snapshot_dir:
+        shutil.rmtree(_snapshot_dir, ignore_errors=True)
+        _snapshot_dir = None